@@ -14,9 +14,13 @@
 
 from abc import abstractmethod
 import json
+import time
 import random
 import asyncio
 import logging
+from database import connector
+from database.workers_version import \
+    WORKERS_VERSION_TABLE, WORKERS_VERSION_KEY
 from connector_common.connector_interface \
     import BlockchainConnectorInterface
 from avalon_sdk.connector.direct.jrpc.jrpc_worker_registry \
@@ -27,12 +31,22 @@ from connector_common.worker_delegate import \
     WorkerDelegate
 from connector_common.work_order_delegate import \
     WorkOrderDelegate
+from connector_common.work_order_relay import \
+    WorkOrderRelay, DEFAULT_MAX_CONCURRENT_WORK_ORDERS
 
 logging.basicConfig(
     format="%(asctime)s - %(levelname)s - %(message)s", level=logging.INFO)
 
-# Poll interval to update workers on chain with those in kv store
+# Poll interval to update workers on chain with those in kv store, if the
+# connector has no access to the kv store to be notified of changes or the
+# last update failed
 WORKER_REFRESH_INTERVAL = 30
+# Interval to check the version of the workers in the kv store, bumped by
+# the enclave managers whenever they change a worker
+WORKER_VERSION_POLL_INTERVAL = 2
+# Interval to read the workers on chain again, in case they were changed
+# by someone else
+FULL_WORKER_SYNC_INTERVAL = 600
 
 
 class BaseConnector(BlockchainConnectorInterface):
@@ -45,6 +59,12 @@ class BaseConnector(BlockchainConnectorInterface):
     invokes smart contract API (eg: workOrderComplete).
     """
 
+    # Number of threads writing work order results to the blockchain at
+    # once, as many as work orders relayed if None, 0 to write them on the
+    # event loop thread. Set by connectors whose blockchain client is not
+    # thread safe.
+    write_back_threads = None
+
     def __init__(self, config, registry_instance, worker_instance,
                  work_order_instance, wo_receipt_instance):
         """
@@ -74,8 +94,21 @@ class BaseConnector(BlockchainConnectorInterface):
             jrpc_work_order_instance,
             work_order_instance
         )
+        # Work orders submitted on the blockchain are relayed concurrently
+        self._work_order_relay = WorkOrderRelay(
+            self._work_order_delegate,
+            config.get("connector", {}).get(
+                "max_concurrent_work_orders",
+                DEFAULT_MAX_CONCURRENT_WORK_ORDERS),
+            self.write_back_threads)
         # List of active available worker ids in Avalon
         self._active_worker_ids = []
+        # KV storage, to be notified of changes of the workers and to keep
+        # the progress of event listeners, if configured
+        self._kv_helper = None
+        kv_url = config.get("KvStorage", {}).get("remote_storage_url")
+        if kv_url:
+            self._kv_helper = connector.open(kv_url)
 
     def sync_registries(self):
         """
@@ -86,28 +119,72 @@ class BaseConnector(BlockchainConnectorInterface):
 
     async def sync_workers(self):
         """
-        Sync up workers between blockchain and avalon
+        Sync up workers between blockchain and avalon. Workers are synced
+        again whenever their version in the kv store changes, or every
+        WORKER_REFRESH_INTERVAL seconds without access to the kv store or
+        after a failed sync. Only the workers changed since they were last
+        synced generate chain traffic.
         """
         # Fetch first worker details from shared KV (via direct API)
         # and add the worker to block chain.
         # TODO: Fetch all workers from blockchain and update kv store
         # That will be a 2-way sync. As of now, only one way.
+        loop = asyncio.get_event_loop()
+        next_full_sync = 0
         while True:
+            version = None
+            synced = False
             try:
-                self._active_worker_ids = \
-                    self._worker_delegate.lookup_workers_in_kv_storage()
-                # Lookup worker ids from blockchain
-                chain_worker_ids = self._worker_delegate.\
-                    lookup_workers_onchain()
+                # Read before the workers, not to miss a change meanwhile
+                version = await self._get_workers_version()
+                full_sync = time.time() >= next_full_sync
+                if full_sync:
+                    next_full_sync = time.time() + FULL_WORKER_SYNC_INTERVAL
+                self._active_worker_ids = await loop.run_in_executor(
+                    None, self._worker_delegate.lookup_workers_in_kv_storage)
                 # Add/Update workers to chain
-                self._worker_delegate.add_update_worker_to_chain(
-                    self._active_worker_ids,
-                    chain_worker_ids)
-                # Sleep for 30 seconds and poll again
-                await asyncio.sleep(WORKER_REFRESH_INTERVAL)
+                synced = await loop.run_in_executor(
+                    None, self._worker_delegate.sync_workers_to_chain,
+                    self._active_worker_ids, full_sync)
             except Exception as ex:
                 logging.exception("Exception occurred during worker sync-up {}"
                                   .format(ex))
+            if synced:
+                await self._wait_for_workers_change(version, next_full_sync)
+            else:
+                # Workers not synced are tried again, whether or not they
+                # changed
+                logging.warning("Worker sync-up failed, retrying in {}s"
+                                .format(WORKER_REFRESH_INTERVAL))
+                await asyncio.sleep(WORKER_REFRESH_INTERVAL)
+
+    async def _get_workers_version(self):
+        """
+        Get the version of the workers in the kv store, None without
+        access to it
+        """
+        if self._kv_helper is None:
+            return None
+        return await asyncio.get_event_loop().run_in_executor(
+            None, self._kv_helper.get,
+            WORKERS_VERSION_TABLE, WORKERS_VERSION_KEY)
+
+    async def _wait_for_workers_change(self, version, next_full_sync):
+        """
+        Wait for the workers in the kv store to change from version, or
+        until the next full sync is due
+        """
+        if self._kv_helper is None:
+            await asyncio.sleep(WORKER_REFRESH_INTERVAL)
+            return
+        while time.time() < next_full_sync:
+            await asyncio.sleep(WORKER_VERSION_POLL_INTERVAL)
+            try:
+                if await self._get_workers_version() != version:
+                    return
+            except Exception as ex:
+                logging.error("Failed to get workers version {}"
+                              .format(ex))
 
     async def sync_work_orders(self):
         """
@@ -123,13 +200,16 @@ class BaseConnector(BlockchainConnectorInterface):
         # TODO need to be implemented receipt
         logging.info("Not implemented yet!!")
 
-    def work_order_submitted_event_handler(self, work_order_id, worker_id,
-                                           requester_id, work_order_params):
+    async def work_order_submitted_event_handler(self, work_order_id,
+                                                 worker_id, requester_id,
+                                                 work_order_params):
         """
         Handler function to be called from event listener
         after getting an event.
-        This function submits work order to listener, gets
-        result and stores work order result to blockchain.
+        This function has the work order relayed to listener, which gets
+        result and stores work order result to blockchain. It returns
+        once the relay has started, which waits while the maximum number
+        of work orders are being relayed.
         @param work_order_id - id of work order got from the event
         @param worker_id - id of worker got from the event.
         @param requester_id - requester id who submitted request
@@ -141,15 +221,9 @@ class BaseConnector(BlockchainConnectorInterface):
         # Submit work order request if request has active
         # worker id
         if worker_id in self._active_worker_ids:
-            response = self._work_order_delegate.\
-                submit_work_order_and_get_result(
-                    work_order_id, worker_id,
-                    requester_id, work_order_params)
-            if response:
-                self._work_order_delegate.add_work_order_result_to_chain(
-                    work_order_id, response)
-            else:
-                logging.info("Work order processing failed!")
+            await self._work_order_relay.submit(
+                work_order_id, worker_id,
+                requester_id, work_order_params)
 
     def start(self):
         """
@@ -0,0 +1,57 @@
+# Copyright 2020 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+
+logging.basicConfig(
+    format="%(asctime)s - %(levelname)s - %(message)s", level=logging.INFO)
+
+# Table of the KV storage holding the last block processed per listener
+CHECKPOINT_TABLE = "connector-checkpoints"
+
+
+class KvBlockCheckpoint():
+
+    """
+    Keeps the number of the last block whose events were processed by a
+    blockchain event listener in the KV storage, for the listener to
+    resume from it after a restart.
+    """
+
+    def __init__(self, kv_helper, key):
+        """
+        @param kv_helper - LMDBHelperProxy of the KV storage
+        @param key - key of the listener in the checkpoint table, e.g. made
+        of its event and contract address
+        """
+        self._kv_helper = kv_helper
+        self._key = key
+
+    def load(self):
+        """
+        Returns the number of the last block saved, None if none was
+        """
+        value = self._kv_helper.get(CHECKPOINT_TABLE, self._key)
+        if value is None:
+            return None
+        return int(value)
+
+    def save(self, block_number):
+        """
+        Save the number of the last block processed
+        @param block_number - number of the block
+        """
+        if not self._kv_helper.set(
+                CHECKPOINT_TABLE, self._key, str(block_number)):
+            raise Exception("Failed to save checkpoint of " + self._key)
@@ -45,6 +45,17 @@ class WorkOrderDelegate():
                                          requester_id, work_order_params):
         """
         This function submits work order using work_order_submit direct API
+        and waits for its result
+        """
+        response = self.submit_work_order(work_order_id, worker_id,
+                                          requester_id, work_order_params)
+        return self.get_work_order_result(work_order_id, response)
+
+    def submit_work_order(self, work_order_id, worker_id,
+                          requester_id, work_order_params):
+        """
+        This function submits work order using work_order_submit direct API
+        Returns the work order submit response
         """
         logging.info("About to submit work order to listener")
         response = self._jrpc_work_order_instance\
@@ -52,6 +63,15 @@ class WorkOrderDelegate():
                                work_order_params, id=random.randint(0, 100000))
         logging.info("Work order submit response : {}".format(
             json.dumps(response, indent=4)))
+        return response
+
+    def get_work_order_result(self, work_order_id, response):
+        """
+        This function waits for the result of a submitted work order
+        @param work_order_id - id of the work order
+        @param response - work order submit response
+        Returns the work order result, None if submission failed
+        """
         if response and 'error' in response and \
                 response['error']['code'] == \
                 WorkOrderStatus.PENDING.value:
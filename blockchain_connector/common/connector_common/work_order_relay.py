@@ -0,0 +1,147 @@
+# Copyright 2020 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+logging.basicConfig(
+    format="%(asctime)s - %(levelname)s - %(message)s", level=logging.INFO)
+
+# Default maximum number of work orders relayed at once
+DEFAULT_MAX_CONCURRENT_WORK_ORDERS = 8
+# Number of ids of the last work orders relayed that are remembered, so that
+# the same work order got again from the blockchain is not relayed twice
+RELAYED_IDS = 10000
+
+
+class WorkOrderRelay():
+
+    """
+    Relays work orders submitted on the blockchain to Avalon and their
+    results back to the blockchain, several at a time.
+
+    Each work order is relayed by a task of the event loop, which hands
+    the blocking calls of its stages (submit, result wait and write back
+    to the blockchain) over to a thread pool. The event loop is thus free
+    to receive the next events while work orders are being processed.
+
+    Results are written back to the blockchain by write_back_threads
+    threads, for blockchain clients that cannot be called concurrently or
+    from other threads than the event loop's.
+    """
+
+    def __init__(self, work_order_delegate,
+                 max_concurrency=DEFAULT_MAX_CONCURRENT_WORK_ORDERS,
+                 write_back_threads=None):
+        """
+        Initialize the relay
+        @param work_order_delegate - WorkOrderDelegate of the connector
+        @param max_concurrency - maximum number of work orders relayed at
+        once. Further work orders wait for one of them to be done.
+        @param write_back_threads - number of threads writing results to
+        the blockchain, as many as max_concurrency if None. 0 writes them
+        one at a time on the event loop thread.
+        """
+        self._work_order_delegate = work_order_delegate
+        self._max_concurrency = max(1, int(max_concurrency))
+        self._executor = ThreadPoolExecutor(
+            max_workers=self._max_concurrency)
+        if write_back_threads is None:
+            self._write_back_executor = self._executor
+        elif int(write_back_threads) > 0:
+            self._write_back_executor = ThreadPoolExecutor(
+                max_workers=int(write_back_threads))
+        else:
+            self._write_back_executor = None
+        # Created on first use, to belong to the running event loop
+        self._slots = None
+        self._tasks = set()
+        # Ids of the last work orders relayed, oldest first
+        self._relayed = OrderedDict()
+
+    async def submit(self, work_order_id, worker_id, requester_id,
+                     work_order_params):
+        """
+        Start relaying a work order. This waits while max_concurrency work
+        orders are being relayed, so that an event handler awaiting it
+        stops taking events off its queue.
+        @param work_order_id - id of work order got from the event
+        @param worker_id - id of worker got from the event
+        @param requester_id - requester id who submitted request
+        @param work_order_params - work order parameters
+        Returns the task relaying the work order, None if the work order
+        was already relayed
+        """
+        if work_order_id in self._relayed:
+            logging.info("Work order {} already relayed, skipped"
+                         .format(work_order_id))
+            return None
+        self._relayed[work_order_id] = True
+        while len(self._relayed) > RELAYED_IDS:
+            self._relayed.popitem(last=False)
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self._max_concurrency)
+        await self._slots.acquire()
+        task = asyncio.ensure_future(self._relay(
+            work_order_id, worker_id, requester_id, work_order_params))
+        self._tasks.add(task)
+        task.add_done_callback(self._on_done)
+        return task
+
+    async def join(self):
+        """
+        Wait for the work orders being relayed when called to be done
+        """
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def _on_done(self, task):
+        self._tasks.discard(task)
+        self._slots.release()
+
+    async def _relay(self, work_order_id, worker_id, requester_id,
+                     work_order_params):
+        """
+        Relay a work order through its stages
+        """
+        loop = asyncio.get_event_loop()
+        try:
+            response = await loop.run_in_executor(
+                self._executor,
+                self._work_order_delegate.submit_work_order,
+                work_order_id, worker_id, requester_id, work_order_params)
+            response = await loop.run_in_executor(
+                self._executor,
+                self._work_order_delegate.get_work_order_result,
+                work_order_id, response)
+            if not response:
+                logging.info("Work order processing failed!")
+                return None
+            if self._write_back_executor is None:
+                # Blocks the event loop, the blockchain client is bound to
+                # it
+                return self._work_order_delegate.\
+                    add_work_order_result_to_chain(work_order_id, response)
+            return await loop.run_in_executor(
+                self._write_back_executor,
+                self._work_order_delegate.add_work_order_result_to_chain,
+                work_order_id, response)
+        except Exception as ex:
+            logging.exception("Exception occurred while relaying work " +
+                              "order {}: {}".format(work_order_id, ex))
+            # Relayed again if got again
+            self._relayed.pop(work_order_id, None)
+            return None
@@ -14,6 +14,7 @@
 
 import json
 import random
+import hashlib
 import logging
 from avalon_sdk.worker.worker_details import WorkerType, WorkerStatus
 import avalon_sdk.worker.worker_details as worker_details
@@ -48,6 +49,12 @@ class WorkerDelegate():
         # of the connector. Before setting status of a worker,
         # this map is looked up.
         self._worker_status_map = dict()
+        # Map to store worker id to hash of the worker record in kv storage
+        # as last synced to blockchain. Workers whose record has the same
+        # hash are not looked at again.
+        self._worker_hash_map = dict()
+        # Ids of the workers on chain, None until looked up
+        self._chain_worker_ids = None
 
     def lookup_workers_in_kv_storage(self):
         """
@@ -84,20 +91,48 @@ class WorkerDelegate():
 
         if "error" in worker_info:
             logging.error("Unable to retrieve worker details from kv storage")
-            None
+            return None
         return worker_info["result"]
 
+    def sync_workers_to_chain(self, wids_in_kv, full_sync=False):
+        """
+        This function adds/updates the workers changed since last synced
+        to the blockchain. Workers on chain are only looked up on the
+        first sync and on a full sync, they are tracked in between.
+        @param wids_in_kv - worker ids in shared KV
+        @param full_sync - True to look up the workers on chain again
+        Returns True if all workers were synced, False if any failed to
+        """
+        if full_sync or self._chain_worker_ids is None:
+            # Lookup worker ids from blockchain
+            self._chain_worker_ids = set(self.lookup_workers_onchain())
+        synced = self.add_update_worker_to_chain(
+            wids_in_kv, self._chain_worker_ids)
+        # Workers synced are on chain now
+        self._chain_worker_ids.update(
+            wid for wid in wids_in_kv if wid in self._worker_hash_map)
+        return synced
+
     def add_update_worker_to_chain(self, wids_in_kv, wids_onchain):
         """
         This function adds/updates a worker in the  blockchain
         @param wids_in_kv - worker ids in shared KV
         @param wids_onchain - worker ids in blockchain
+        Returns True if all workers were synced, False if any failed to
         """
 
+        synced = True
         for wid in wids_in_kv:
             worker_info = self._retrieve_worker_details_from_kv_storage(
                 wid)
             if worker_info is None:
+                synced = False
+                continue
+            worker_hash = hashlib.sha256(json.dumps(
+                worker_info, sort_keys=True).encode("utf-8")).hexdigest()
+            if wid in wids_onchain and \
+                    self._worker_hash_map.get(wid) == worker_hash:
+                # Unchanged since last synced
                 continue
             worker_type = WorkerType(worker_info["workerType"])
             org_id = worker_info["organizationId"]
@@ -106,11 +141,16 @@ class WorkerDelegate():
 
             result = None
             if wid in wids_onchain:
-                if wid not in self._worker_details_map or \
-                        self._worker_details_map[wid] != details:
+                if wid in self._worker_details_map and \
+                        self._worker_details_map[wid] == details and \
+                        self._worker_status_map.get(wid) == \
+                        WorkerStatus.ACTIVE:
+                    self._worker_hash_map[wid] = worker_hash
+                else:
                     result = self._worker_instance.worker_update(
                         wid, details)
                     if result != ContractResponse.SUCCESS:
+                        synced = False
                         logging.error("Error while updating worker {}"
                                       " to blockchain".format(wid))
                     else:
@@ -120,21 +160,25 @@ class WorkerDelegate():
                         # Update status of worker as active explicitly if a
                         # worker is updated, as worker status is not part of
                         # worker update.
-                        if wid is not self._worker_status_map or \
+                        if wid not in self._worker_status_map or \
                                 self._worker_status_map[wid] != \
                                 WorkerStatus.ACTIVE:
                             result = self._worker_instance.worker_set_status(
                                 wid, WorkerStatus.ACTIVE)
                             if result != ContractResponse.SUCCESS:
+                                synced = False
                                 logging.error("Error while setting worker "
                                               "status {} in blockchain"
-                                              .format(wida))
+                                              .format(wid))
                             else:
                                 logging.info("Marked worker " + wid +
                                              " as active "
                                              "in blockchain")
                                 self._worker_status_map[wid] = \
                                     WorkerStatus.ACTIVE
+                                self._worker_hash_map[wid] = worker_hash
+                        else:
+                            self._worker_hash_map[wid] = worker_hash
             else:
                 logging.info("Adding new worker {} to blockchain"
                              .format(wid))
@@ -142,6 +186,7 @@ class WorkerDelegate():
                     wid, worker_type, org_id, [app_type_id], details
                 )
                 if result != ContractResponse.SUCCESS:
+                    synced = False
                     logging.error("Error while registering worker "
                                   "{} to blockchain".format(wid))
                 else:
@@ -149,6 +194,7 @@ class WorkerDelegate():
                         "Registered worker {} to blockchain".format(wid))
                     self._worker_details_map[wid] = details
                     self._worker_status_map[wid] = WorkerStatus.ACTIVE
+                    self._worker_hash_map[wid] = worker_hash
 
         for wid in wids_onchain:
             # Mark all stale workers in blockchain as decommissioned
@@ -156,14 +202,18 @@ class WorkerDelegate():
                 if wid not in self._worker_status_map:
                     worker_status_onchain, _, _, _, _ = self._worker_instance\
                         .worker_retrieve(wid)
+                    decommissioned = worker_status_onchain == \
+                        WorkerStatus.DECOMMISSIONED.value
                 else:
-                    worker_status_onchain = self._worker_status_map[wid]
+                    decommissioned = self._worker_status_map[wid] == \
+                        WorkerStatus.DECOMMISSIONED
                 # If worker is not already decommissioned, mark it
                 # decommissioned as it is no longer available in the kv storage
-                if worker_status_onchain != WorkerStatus.DECOMMISSIONED.value:
+                if not decommissioned:
                     result = self._worker_instance.worker_set_status(
                         wid, WorkerStatus.DECOMMISSIONED)
                     if result != ContractResponse.SUCCESS:
+                        synced = False
                         logging.error("Error while setting worker status for "
                                       "{} in blockchain".format(wid))
                     else:
@@ -171,6 +221,8 @@ class WorkerDelegate():
                                      " as decommissioned in blockchain")
                         self._worker_status_map[wid] = \
                             WorkerStatus.DECOMMISSIONED
+                        self._worker_hash_map.pop(wid, None)
+        return synced
 
     def lookup_workers_onchain(self):
         """
@@ -75,6 +75,10 @@ def main(args=None):
         help="Direct API listener endpoint",
         default="http://avalon-listener:1947",
         type=str)
+    parser.add_argument(
+        "--lmdb_url",
+        help="KV storage url to keep the last block processed in",
+        type=str)
 
     options = parser.parse_args(args)
 
@@ -89,6 +93,9 @@ def main(args=None):
     uri = options.uri
     if uri:
         config["tcf"]["json_rpc_uri"] = uri
+    if options.lmdb_url:
+        config.setdefault("KvStorage", {})["remote_storage_url"] = \
+            options.lmdb_url
 
     logging.info("About to start Ethereum connector service")
     eth_client = EthereumWrapper(config)
@@ -19,6 +19,7 @@ import asyncio
 from avalon_sdk.connector.blockchains.ethereum.ethereum_listener \
     import BlockchainInterface, EventProcessor
 from connector_common.base_connector import BaseConnector
+from connector_common.block_checkpoint import KvBlockCheckpoint
 
 
 logging.basicConfig(
@@ -71,7 +72,9 @@ class EthereumConnector(BaseConnector):
         def workorder_event_handler_func(event, account, contract):
             """
             The function retrieves pertinent information
-            from the event received and makes call to handler_func
+            from the event received and makes call to handler_func.
+            It returns the coroutine of handler_func for the event
+            processor to await.
             """
             try:
                 work_order_request = json.loads(
@@ -83,14 +86,23 @@ class EthereumConnector(BaseConnector):
             worker_id = work_order_request["workerId"]
             requester_id = work_order_request["requesterId"]
             work_order_params = event["args"]["workOrderRequest"]
-            handler_func(work_order_id, worker_id, requester_id,
-                         work_order_params)
+            return handler_func(work_order_id, worker_id, requester_id,
+                                work_order_params)
 
         w3 = BlockchainInterface(self._config)
 
         contract = self._wo_evt
-        # Listening only for workOrderSubmitted event now
-        listener = w3.newListener(contract, "workOrderSubmitted")
+        # Listening only for workOrderSubmitted event now. The last block
+        # whose work orders were all relayed is kept in the KV storage if
+        # there is one, so that events emitted while the connector is down
+        # are not missed.
+        checkpoint = None
+        if self._kv_helper is not None:
+            checkpoint = KvBlockCheckpoint(
+                self._kv_helper,
+                "ethereum-workOrderSubmitted-" + contract.address)
+        listener = w3.newLogListener(contract, "workOrderSubmitted",
+                                     checkpoint, self._work_order_relay.join)
 
         try:
             daemon = EventProcessor(self._config)
@@ -69,9 +69,12 @@ class FabricConnector(BaseConnector):
             requester_id = work_order_req["requesterId"]
             work_order_params = work_order_req["workOrderRequest"]
             logging.info("Received event from fabric blockchain")
-            handler_func(work_order_id, worker_id,
-                         requester_id,
-                         work_order_params)
+            # The event hub calls this synchronously. Wait for the relay
+            # to take the work order, the loop keeps running the ones
+            # being relayed meanwhile
+            asyncio.get_event_loop().run_until_complete(
+                handler_func(work_order_id, worker_id, requester_id,
+                             work_order_params))
 
         logging.info("Creating work order submit event handler")
         event_handler = self._fabric_work_order.\
@@ -72,6 +72,10 @@ def main(args=None):
         help="Direct API listener endpoint",
         default="http://avalon-listener:1947",
         type=str)
+    parser.add_argument(
+        "--lmdb_url",
+        help="KV storage url to be notified of changes of the workers",
+        type=str)
 
     options = parser.parse_args(args)
 
@@ -86,6 +90,9 @@ def main(args=None):
     uri = options.uri
     if uri:
         config["tcf"]["json_rpc_uri"] = uri
+    if options.lmdb_url:
+        config.setdefault("KvStorage", {})["remote_storage_url"] = \
+            options.lmdb_url
 
     fabric_worker = FabricWorkerRegistryImpl(config)
     fabric_work_order = FabricWorkOrderImpl(config)
@@ -0,0 +1,89 @@
+# Copyright 2020 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Length-prefixed binary framing used between LMDBHelperProxy and
+LMDBRequestHandler. A request or response body is a list of messages and
+every message is a list of UTF-8 fields:
+
+    <message count> { <field count> { <field length> <field bytes> }... }...
+
+All counts and lengths are 4 byte unsigned big-endian integers. The
+shared KV storage imports this module as well, so that both sides always
+speak the same format.
+"""
+
+import struct
+
+# Content type announcing a binary framed request/response
+FRAME_CONTENT_TYPE = "application/octet-stream"
+
+_LENGTH = struct.Struct(">I")
+
+
+def encode_frames(messages):
+    """
+    Serialize messages into a binary framed body
+
+    Parameters:
+       - messages is a list of messages, each being a list of str fields
+    Returns:
+       - bytes holding the framed messages
+    """
+    out = [_LENGTH.pack(len(messages))]
+    for fields in messages:
+        out.append(_LENGTH.pack(len(fields)))
+        for field in fields:
+            data = field.encode("utf-8")
+            out.append(_LENGTH.pack(len(data)))
+            out.append(data)
+    return b"".join(out)
+
+
+def decode_frames(data):
+    """
+    Deserialize a binary framed body
+
+    Parameters:
+       - data is the bytes received on the wire
+    Returns:
+       - list of messages, each being a list of str fields
+    Raises:
+       - ValueError if the body is truncated or has trailing bytes
+    """
+    view = memoryview(data)
+    offset = 0
+
+    def read_length():
+        nonlocal offset
+        if offset + _LENGTH.size > len(view):
+            raise ValueError("Truncated frame header")
+        (length,) = _LENGTH.unpack_from(view, offset)
+        offset += _LENGTH.size
+        return length
+
+    messages = []
+    for _ in range(read_length()):
+        fields = []
+        for _ in range(read_length()):
+            length = read_length()
+            if offset + length > len(view):
+                raise ValueError("Truncated frame field")
+            fields.append(str(view[offset:offset + length], "utf-8"))
+            offset += length
+        messages.append(fields)
+
+    if offset != len(view):
+        raise ValueError("Unexpected trailing bytes in frame")
+    return messages
@@ -20,10 +20,13 @@ from database.lmdb_helper_proxy import LMDBHelperProxy
 logger = logging.getLogger(__name__)
 
 
-def open(uri):
+def open(uri, pool_size=None):
     """
     @dev open implements a generic API for opening connections to a LMDB
         database where it's local or remote
+    @param uri is the address of the remote LMDB listener
+    @param pool_size is the maximum number of persistent connections
+        kept to the listener, a default is used if it is None
     @return (conn, type), where
         - conn is the connection helper to interact with db
         - type is 1 for the local LMDB, 2 for the remote LMDB
@@ -34,4 +37,6 @@ def open(uri):
 
     # employ the remote version if remote_url is set
     logger.info(f"connect to remote LMDB @{uri}")
-    return LMDBHelperProxy(uri)
+    if pool_size is None:
+        return LMDBHelperProxy(uri)
+    return LMDBHelperProxy(uri, pool_size=pool_size)
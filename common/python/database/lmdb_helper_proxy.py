@@ -12,11 +12,24 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import time
 import logging
-import urllib.request
-import urllib.error
+import http.client
+import queue
+import select
+import threading
+from urllib.parse import urlsplit
+
+from database.binary_frame import \
+    FRAME_CONTENT_TYPE, encode_frames, decode_frames
 
 logger = logging.getLogger(__name__)
+
+# Default number of persistent connections to the LMDB listener
+DEFAULT_POOL_SIZE = 4
+# Seconds a blocking pop request leaves before the request timeout, so
+# that the listener always responds before the client gives up
+WAIT_MARGIN = 2
 # ------------------------------------------------------------------------------
 
 
@@ -30,18 +43,44 @@ class MessageException(Exception):
 
 class LMDBHelperProxy():
     """
-    LMDBHelperProxy passes commands serialized as strings
-    to the LMDB remote listener.
+    LMDBHelperProxy passes commands to the LMDB remote listener.
+    Commands are sent with the length-prefixed binary framing by default,
+    which lets several of them travel in a single request (see batch()).
+    The legacy newline separated text protocol is used if use_binary is
+    False. Connections to the listener are pooled and kept alive, so a
+    single instance can be shared by all threads of a process.
     """
 
-    def __init__(self, uri):
+    def __init__(self, uri, use_binary=True, pool_size=DEFAULT_POOL_SIZE):
+        self.__use_binary = use_binary
+        self.__pool_size = pool_size
         self.set_remote_uri(uri)
 
     def set_remote_uri(self, uri):
-        self.__uri_client = TextServiceClient(uri)
+        self.__uri_client = TextServiceClient(uri, self.__pool_size)
+
+# ------------------------------------------------------------------------------
+    def batch(self):
+        """
+        Create a batch to send several commands in one request
+        Returns:
+           - LMDBBatch instance bound to this proxy
+        """
+        return LMDBBatch(self)
+
+# ------------------------------------------------------------------------------
+    def transaction(self):
+        """
+        Create a batch whose commands are applied atomically by the
+        listener in a single LMDB write transaction. Commands see the
+        writes of the ones before them in the same transaction.
+        Returns:
+           - LMDBBatch instance bound to this proxy in transactional mode
+        """
+        return LMDBBatch(self, atomic=True)
 
 # ------------------------------------------------------------------------------
-    # Requests are serialized as: <cmd>\n<arg1>\n<arg2>...
+    # Commands are serialized as: [<cmd>, <arg1>, <arg2>...]
 
     def set(self, table, key, value):
         """
@@ -52,11 +91,22 @@ class LMDBHelperProxy():
            - key is the primary key of the table.
            - value is the value that needs to be inserted in the table.
         """
-        # Set, table, key, value
-        request = "S\n" + self.__escape(table) + "\n" + self.__escape(key) + \
-            "\n" + self.__escape(value)
+        return self.batch().set(table, key, value).execute()[0]
 
-        return self.__set_update(request)
+# ------------------------------------------------------------------------------
+    def set_new(self, table, key, value):
+        """
+        Function to set a key-value pair in a lmdb table only if the key
+        is not set yet. In a transaction, the key being set already
+        aborts the transaction.
+        Parameters:
+           - table is the name of lmdb table in which
+             the key-value pair needs to be inserted.
+           - key is the primary key of the table.
+           - value is the value that needs to be inserted in the table.
+        Returns True if set, False if the key is already set.
+        """
+        return self.batch().set_new(table, key, value).execute()[0]
 
 # ------------------------------------------------------------------------------
     def get(self, table, key):
@@ -67,10 +117,7 @@ class LMDBHelperProxy():
              the key-value pair needs to be retrieved.
            - key is the primary key of the table.
         """
-        # Get, table, key
-        request = "G\n" + self.__escape(table) + "\n" + self.__escape(key)
-
-        return self.__get_update(request)
+        return self.batch().get(table, key).execute()[0]
 
 # ------------------------------------------------------------------------------
     def remove(self, table, key, value=None):
@@ -87,26 +134,7 @@ class LMDBHelperProxy():
              for the key will be deleted. Otherwise, if the data parameter is
              non-NULL only the matching data item will be deleted.
         """
-        # Remove, table, key
-        request = "R\n" + self.__escape(table) + "\n" + self.__escape(key)
-        if value is not None:
-            request = "\n" + request + value.replace("\n", "\\n")
-        response = self.__uri_client._postmsg(request).decode("utf-8")
-        args = response.split("\n")
-        # Remove successful (returned True)
-        if args[0] == "t" and len(args) == 1:
-            return True
-        # Remove unsuccessful (returned False)
-        elif args[0] == "f" and len(args) == 1:
-            return False
-        # Error
-        elif args[0] == "e":
-            if len(args) != 2:
-                logger.error("Unknown error format")
-            else:
-                logger.error("Request error: %s", args[1])
-        else:
-            logger.error("Unknown response format")
+        return self.batch().remove(table, key, value).execute()[0]
 
 # ------------------------------------------------------------------------------
     def lookup(self, table):
@@ -115,30 +143,7 @@ class LMDBHelperProxy():
         Parameters:
            - table is the name of the lmdb table.
         """
-        result = []
-        # Lookup, table
-        request = "L\n" + self.__escape(table)
-        response = self.__uri_client._postmsg(request).decode("utf-8")
-        args = response.split("\n")
-        # Lookup result found
-        if args[0] == "l":
-            if len(args) == 2:
-                # Result is a list of keys separated by commas
-                result = self.__unescape(args[1]).split(",")
-            else:
-                logger.error("Unknown response format")
-        # Lookup result not found
-        elif args[0] == "n" and len(args) == 1:
-            return result
-        # Error
-        elif args[0] == "e":
-            if len(args) != 2:
-                logger.error("Unknown error format")
-            else:
-                logger.error("Request error: %s", args[1])
-        else:
-            logger.error("Unknown response format")
-        return result
+        return self.batch().lookup(table).execute()[0]
 
 # ------------------------------------------------------------------------------
     def csv_append(self, table, key, value):
@@ -154,12 +159,7 @@ class LMDBHelperProxy():
            @param value - The value that needs to be appended to the existing
                           value(comma-separated) corresponding to the key.
         """
-        # csv_append, table, key, value
-        # CA corresponding to Csv Append
-        request = "CA\n" + self.__escape(table) + "\n" + self.__escape(key) + \
-            "\n" + self.__escape(value)
-
-        return self.__set_update(request)
+        return self.batch().csv_append(table, key, value).execute()[0]
 
 # ------------------------------------------------------------------------------
     def csv_prepend(self, table, key, value):
@@ -175,12 +175,7 @@ class LMDBHelperProxy():
            @param value - The value that needs to be prepended to the existing
                           value(comma-separated) corresponding to the key.
         """
-        # csv_prepend, table, key, value
-        # CP corresponding to Csv Prepend
-        request = "CP\n" + self.__escape(table) + "\n" + self.__escape(key) + \
-            "\n" + self.__escape(value)
-
-        return self.__set_update(request)
+        return self.batch().csv_prepend(table, key, value).execute()[0]
 
 # ------------------------------------------------------------------------------
     def csv_pop(self, table, key):
@@ -199,12 +194,7 @@ class LMDBHelperProxy():
            @returns value - First element from comma-separated value for key
                             passed in.
         """
-        # csv_pop, table, key
-        # CR corresponding to Csv Pop where the 1st element from the csv is
-        # retrieved and the rest left intact.
-        request = "CR\n" + self.__escape(table) + "\n" + self.__escape(key)
-
-        return self.__get_update(request)
+        return self.batch().csv_pop(table, key).execute()[0]
 
 # ------------------------------------------------------------------------------
     def csv_match_pop(self, table, key, value):
@@ -225,13 +215,7 @@ class LMDBHelperProxy():
            @returns value - value if the first string of the comma-separated
                             strings matches. None, otherwise.
         """
-        # csv_pop, table, key, value
-        # CM corresponding to Csv match and pop where the 1st element from the
-        # csv is conditionally(if matches) retrieved and the rest left intact.
-        request = "CM\n" + self.__escape(table) + "\n" + self.__escape(key) + \
-            "\n" + self.__escape(value)
-
-        return self.__get_update(request)
+        return self.batch().csv_match_pop(table, key, value).execute()[0]
 
 # ------------------------------------------------------------------------------
     def csv_search_delete(self, table, key, value):
@@ -248,68 +232,305 @@ class LMDBHelperProxy():
            @param key - The primary key of the table.
            @param value - Value to be compared against and deleted.
         """
-        # csv_search_delete, table, key, value
-        # CD corresponding to Csv Search Delete
-        request = "CD\n" + self.__escape(table) + "\n" + self.__escape(key) + \
-            "\n" + self.__escape(value)
+        return self.batch().csv_search_delete(table, key, value).execute()[0]
+
+# ------------------------------------------------------------------------------
+    def queue_push(self, table, key, value):
+        """
+        Function to add a value to the tail of a queue. Queues hold unique
+        values and are updated without rewriting them as a whole.
 
-        return self.__set_update(request)
+        Parameters:
+           @param table - Name of the lmdb table holding the queue.
+           @param key - The key of the queue in the table.
+           @param value - The value to be added.
+        Returns:
+           @returns True if added, False if the value is already queued.
+        """
+        return self.batch().queue_push(table, key, value).execute()[0]
 
 # ------------------------------------------------------------------------------
-    def __set_update(self, request):
+    def queue_pop(self, table, key):
         """
-        Helper method to post request to remote uri and process
-        response for set/update methods.
+        Function to remove the value at the head of a queue.
 
         Parameters:
-            @param request - Prepared request string to send to remote uri
+           @param table - Name of the lmdb table holding the queue.
+           @param key - The key of the queue in the table.
         Returns:
-            @returns True - If operation is successful. False, otherwise.
-        """
-        response = self.__uri_client._postmsg(request).decode("utf-8")
-        args = response.split("\n")
-        # Set/Update successful (returned True)
-        if args[0] == "t" and len(args) == 1:
-            return True
-        # Set/Update unsuccessful (returned False)
-        elif args[0] == "f" and len(args) == 1:
-            return False
-        # Error
-        elif args[0] == "e":
-            if len(args) != 2:
-                logger.error("Unknown error format")
-            else:
-                logger.error("Request error: %s", args[1])
-        else:
-            logger.error("Unknown response format")
+           @returns value - Value removed, None if the queue is empty.
+        """
+        return self.batch().queue_pop(table, key).execute()[0]
 
 # ------------------------------------------------------------------------------
-    def __get_update(self, request):
+    def queue_wait_pop(self, table, key, wait):
         """
-        Helper method to post request to remote uri and process
-        response for get/retrieve(get and remove) methods.
+        Function to remove the value at the head of a queue, waiting for
+        a value to be pushed if the queue is empty.
 
         Parameters:
-            @param request - Prepared request string to send to remote uri
+           @param table - Name of the lmdb table holding the queue.
+           @param key - The key of the queue in the table.
+           @param wait - Maximum number of seconds to wait.
         Returns:
-            @returns value - If operation is successful. None, otherwise.
-        """
-        response = self.__uri_client._postmsg(request).decode("utf-8")
-        args = response.split("\n")
-        # Value found
-        if args[0] == "v" and len(args) == 2:
-            return self.__unescape(args[1])
-        # Value not found or could not be retrieved
-        elif args[0] == "n" and len(args) == 1:
-            return None
-        # Error
-        elif args[0] == "e":
-            if len(args) != 2:
-                logger.error("Unknown error format")
-            else:
-                logger.error("Request error: %s", args[1])
+           @returns value - Value removed, None if none was pushed in time
+                            or if the listener cannot wait, in which case
+                            None is returned right away.
+        """
+        # QW corresponding to Queue Wait and retrieve
+        return self.__wait("QW", table, key, wait)
+
+# ------------------------------------------------------------------------------
+    def get_wait(self, table, key, wait):
+        """
+        Function to get the value of a key, waiting for the key to be set
+        if it is not present.
+
+        Parameters:
+           @param table - Name of the lmdb table.
+           @param key - Key of the table.
+           @param wait - Maximum number of seconds to wait.
+        Returns:
+           @returns value - Value of the key, None if it was not set in time
+                            or if the listener cannot wait, in which case
+                            None is returned right away.
+        """
+        # GW corresponding to Get Wait
+        return self.__wait("GW", table, key, wait)
+
+# ------------------------------------------------------------------------------
+    def __wait(self, cmd, table, key, wait):
+        """
+        Helper method to send a command the listener holds until there is
+        a value to respond with, as [<cmd>, <table>, <key>, <wait msecs>].
+        Waits longer than the request timeout are split into several
+        requests.
+        """
+        deadline = time.time() + wait
+        max_wait = max(0, self.__uri_client.timeout - WAIT_MARGIN)
+        while True:
+            wait_msecs = int(max(0, min(deadline - time.time(), max_wait))
+                             * 1000)
+            # The command travels alone in a binary framed request so that
+            # the listener can hold the response
+            response = self._execute(
+                [([cmd, table, key, str(wait_msecs)], lambda args: args)],
+                atomic=True)[0]
+            if response[0] == "v":
+                return response[1]
+            if response[0] != "n":
+                _log_error(response)
+                return None
+            if time.time() >= deadline:
+                return None
+
+# ------------------------------------------------------------------------------
+    def queue_match_pop(self, table, key, value):
+        """
+        Function to remove the value at the head of a queue if it matches
+        the value passed in.
+
+        Parameters:
+           @param table - Name of the lmdb table holding the queue.
+           @param key - The key of the queue in the table.
+           @param value - Value to be compared against.
+        Returns:
+           @returns value - value if the head of the queue matches.
+                            None, otherwise.
+        """
+        return self.batch().queue_match_pop(table, key, value).execute()[0]
+
+# ------------------------------------------------------------------------------
+    def queue_remove(self, table, key, value):
+        """
+        Function to remove a value anywhere in a queue.
+
+        Parameters:
+           @param table - Name of the lmdb table holding the queue.
+           @param key - The key of the queue in the table.
+           @param value - Value to be removed.
+        Returns:
+           @returns True if the value was found, False otherwise.
+        """
+        return self.batch().queue_remove(table, key, value).execute()[0]
+
+# ------------------------------------------------------------------------------
+    def queue_list(self, table, key, limit=0):
+        """
+        Function to get the values of a queue from head to tail.
+
+        Parameters:
+           @param table - Name of the lmdb table holding the queue.
+           @param key - The key of the queue in the table.
+           @param limit - Maximum number of values, 0 for no limit.
+        Returns:
+           @returns list of values, empty if the queue is empty.
+        """
+        return self.batch().queue_list(table, key, limit).execute()[0]
+
+# ------------------------------------------------------------------------------
+    def queue_entries(self, table, key, limit=0, after=""):
+        """
+        Function to get the values of a queue with their position, from
+        head to tail.
+
+        Parameters:
+           @param table - Name of the lmdb table holding the queue.
+           @param key - The key of the queue in the table.
+           @param limit - Maximum number of values, 0 for no limit.
+           @param after - Position returned by an earlier call, only the
+                          values queued after it are returned. "" to start
+                          at the head.
+        Returns:
+           @returns list of (position, value) tuples, empty if there are
+                    none.
+        """
+        return self.batch().queue_entries(table, key, limit, after) \
+            .execute()[0]
+
+# ------------------------------------------------------------------------------
+    def queue_size(self, table, key):
+        """
+        Function to get the number of values in a queue.
+
+        Parameters:
+           @param table - Name of the lmdb table holding the queue.
+           @param key - The key of the queue in the table.
+        Returns:
+           @returns size - Number of values, None on error.
+        """
+        return self.batch().queue_size(table, key).execute()[0]
+
+# ------------------------------------------------------------------------------
+    def queue_clear(self, table, key):
+        """
+        Function to remove all the values of a queue.
+
+        Parameters:
+           @param table - Name of the lmdb table holding the queue.
+           @param key - The key of the queue in the table.
+        Returns:
+           @returns True if the queue had any value, False otherwise.
+        """
+        return self.batch().queue_clear(table, key).execute()[0]
+
+# ------------------------------------------------------------------------------
+    def queue_claim(self, table, key, count, claim_table, claim_key,
+                    value_table):
+        """
+        Function to remove up to count values from the head of a queue,
+        append them to a comma-separated value and read the value each of
+        them is the key of in another table, all atomically and in a
+        single round trip.
+
+        Parameters:
+           @param table - Name of the lmdb table holding the queue.
+           @param key - The key of the queue in the table.
+           @param count - Maximum number of values to remove, at least 1.
+           @param claim_table - Name of the lmdb table to record them in.
+           @param claim_key - Key of the comma-separated value they are
+                              appended to.
+           @param value_table - Name of the lmdb table to read from.
+        Returns:
+           @returns list of (value removed, value read or None) tuples,
+                    empty if the queue is empty or on error.
+        """
+        return self.batch().queue_claim(
+            table, key, count, claim_table, claim_key,
+            value_table).execute()[0]
+
+# ------------------------------------------------------------------------------
+    def counter_add(self, table, key, delta):
+        """
+        Function to add a number to the integer counter held by a key.
+        The listener applies it atomically, so processes sharing the
+        storage can keep a count together. An absent counter counts as 0.
+
+        Parameters:
+           @param table - Name of the lmdb table.
+           @param key - The key of the counter in the table.
+           @param delta - Number to be added, may be negative.
+        Returns:
+           @returns value - New value of the counter, None on error.
+        """
+        return self.batch().counter_add(table, key, delta).execute()[0]
+
+# ------------------------------------------------------------------------------
+    def close(self):
+        """
+        Close the idle connections to the listener
+        """
+        self.__uri_client.close()
+
+# ------------------------------------------------------------------------------
+    def _execute(self, commands, atomic=False):
+        """
+        Send commands to the remote uri and parse their responses.
+
+        Parameters:
+            @param commands - List of (fields, parser) tuples where fields
+                              is the serialized command and parser turns
+                              the response fields into the result
+            @param atomic - True if the commands must travel in a single
+                            request, which requires the binary framing
+        Returns:
+            @returns results - List of parsed results, in command order
+        """
+        if len(commands) == 0:
+            return []
+
+        if self.__use_binary or atomic:
+            responses = self.__post_frames(
+                [fields for fields, _ in commands])
         else:
-            logger.error("Unknown response format")
+            responses = [self.__post_text(fields) for fields, _ in commands]
+
+        return [parser(response) for (_, parser), response
+                in zip(commands, responses)]
+
+# ------------------------------------------------------------------------------
+    def __post_frames(self, requests):
+        """
+        Helper method to post a batch of commands in a single binary
+        framed request.
+
+        Parameters:
+            @param requests - List of commands, each a list of str fields
+        Returns:
+            @returns responses - List of response fields, one per command
+        """
+        response = self.__uri_client._post(
+            encode_frames(requests), FRAME_CONTENT_TYPE)
+        try:
+            responses = decode_frames(response)
+        except (TypeError, ValueError) as err:
+            logger.error("Invalid binary response: %s", str(err))
+            responses = []
+
+        if len(responses) != len(requests):
+            logger.error("Expected %d responses, received %d",
+                         len(requests), len(responses))
+            return [["e", "Missing response"]] * len(requests)
+        return responses
+
+# ------------------------------------------------------------------------------
+    def __post_text(self, request):
+        """
+        Helper method to post a single command with the text protocol.
+        Requests are serialized as: <cmd>\n<arg1>\n<arg2>...
+
+        Parameters:
+            @param request - Command as a list of str fields
+        Returns:
+            @returns fields - Unescaped response fields
+        """
+        request = "\n".join([self.__escape(field) for field in request])
+        response = self.__uri_client._postmsg(request)
+        if response is None:
+            return ["e", "Missing response"]
+
+        args = response.decode("utf-8").split("\n")
+        return [args[0]] + [self.__unescape(arg) for arg in args[1:]]
 
 # ------------------------------------------------------------------------------
     def __escape(self, string):
@@ -320,58 +541,412 @@ class LMDBHelperProxy():
         return string.encode("utf-8").decode("unicode_escape")
 
 
+# ------------------------------------------------------------------------------
+def _log_error(args):
+    """
+    Log an error or unexpected response received from the remote uri
+    """
+    # Error
+    if args[0] == "e":
+        if len(args) != 2:
+            logger.error("Unknown error format")
+        else:
+            logger.error("Request error: %s", args[1])
+    else:
+        logger.error("Unknown response format")
+
+
+def _parse_set_update(args):
+    """
+    Parse response for set/update/remove commands.
+    Returns True if operation is successful, False if not and None on error
+    """
+    # Set/Update successful (returned True)
+    if args[0] == "t" and len(args) == 1:
+        return True
+    # Set/Update unsuccessful (returned False)
+    elif args[0] == "f" and len(args) == 1:
+        return False
+    _log_error(args)
+
+
+def _parse_get_update(args):
+    """
+    Parse response for get/retrieve(get and remove) commands.
+    Returns value if operation is successful. None, otherwise.
+    """
+    # Value found
+    if args[0] == "v" and len(args) == 2:
+        return args[1]
+    # Value not found or could not be retrieved
+    elif args[0] == "n" and len(args) == 1:
+        return None
+    _log_error(args)
+
+
+def _parse_lookup(args):
+    """
+    Parse response for lookup command.
+    Returns list of keys, which is empty if none found or on error.
+    """
+    # Lookup result found
+    if args[0] == "l" and len(args) == 2:
+        # Result is a list of keys separated by commas
+        return args[1].split(",")
+    # Lookup result not found
+    elif args[0] == "n" and len(args) == 1:
+        return []
+    _log_error(args)
+    return []
+
+
+def _parse_list(args):
+    """
+    Parse response for queue list command.
+    Returns list of values, which is empty if none found or on error.
+    """
+    # Array of values, possibly empty
+    if args[0] == "a":
+        return args[1:]
+    _log_error(args)
+    return []
+
+
+def _parse_claim(args):
+    """
+    Parse response for queue claim command.
+    Returns list of (value, value read or None) tuples, which is empty if
+    none claimed or on error.
+    """
+    # Array of values, each followed by the value read, "" for none
+    if args[0] == "a" and len(args) % 2 == 1:
+        return [(value, read or None)
+                for value, read in zip(args[1::2], args[2::2])]
+    _log_error(args)
+    return []
+
+
+def _parse_entries(args):
+    """
+    Parse response for queue entries command.
+    Returns list of (position, value) tuples, which is empty if none found
+    or on error.
+    """
+    # Array of positions, each followed by the value queued at it
+    if args[0] == "a" and len(args) % 2 == 1:
+        return list(zip(args[1::2], args[2::2]))
+    _log_error(args)
+    return []
+
+
+def _parse_size(args):
+    """
+    Parse response for queue size command.
+    Returns the size if operation is successful. None, otherwise.
+    """
+    # Size found
+    if args[0] == "v" and len(args) == 2 and args[1].isdigit():
+        return int(args[1])
+    _log_error(args)
+
+
+def _parse_counter(args):
+    """
+    Parse response for counter add command.
+    Returns the new value if operation is successful. None, otherwise.
+    """
+    # New value of the counter
+    if args[0] == "v" and len(args) == 2 and args[1].lstrip("-").isdigit():
+        return int(args[1])
+    _log_error(args)
+
+
+class LMDBBatch():
+    """
+    LMDBBatch collects commands and sends them to the LMDB remote listener
+    in a single request once execute() is called. Every command method
+    returns the batch so that calls can be chained. Results are returned
+    in the order commands were added and have the same types as the
+    corresponding LMDBHelperProxy methods. An atomic batch is run by the
+    listener as one transaction, see LMDBHelperProxy.transaction().
+    """
+
+    def __init__(self, proxy, atomic=False):
+        self.__proxy = proxy
+        self.__atomic = atomic
+        self.__commands = []
+
+    def __add(self, fields, parser):
+        self.__commands.append((fields, parser))
+        return self
+
+    def __len__(self):
+        return len(self.__commands)
+
+    def set(self, table, key, value):
+        # Set, table, key, value
+        return self.__add(["S", table, key, value], _parse_set_update)
+
+    def set_new(self, table, key, value):
+        # SN corresponding to Set New, table, key, value
+        return self.__add(["SN", table, key, value], _parse_set_update)
+
+    def get(self, table, key):
+        # Get, table, key
+        return self.__add(["G", table, key], _parse_get_update)
+
+    def remove(self, table, key, value=None):
+        # Remove, table, key[, value]
+        fields = ["R", table, key]
+        if value is not None:
+            fields.append(value)
+        return self.__add(fields, _parse_set_update)
+
+    def lookup(self, table):
+        # Lookup, table
+        return self.__add(["L", table], _parse_lookup)
+
+    def csv_append(self, table, key, value):
+        # CA corresponding to Csv Append
+        return self.__add(["CA", table, key, value], _parse_set_update)
+
+    def csv_prepend(self, table, key, value):
+        # CP corresponding to Csv Prepend
+        return self.__add(["CP", table, key, value], _parse_set_update)
+
+    def csv_pop(self, table, key):
+        # CR corresponding to Csv Pop where the 1st element from the csv is
+        # retrieved and the rest left intact.
+        return self.__add(["CR", table, key], _parse_get_update)
+
+    def csv_match_pop(self, table, key, value):
+        # CM corresponding to Csv match and pop where the 1st element from the
+        # csv is conditionally(if matches) retrieved and the rest left intact.
+        return self.__add(["CM", table, key, value], _parse_get_update)
+
+    def csv_search_delete(self, table, key, value):
+        # CD corresponding to Csv Search Delete
+        return self.__add(["CD", table, key, value], _parse_set_update)
+
+    def queue_push(self, table, key, value):
+        # QA corresponding to Queue Add to the tail
+        return self.__add(["QA", table, key, value], _parse_set_update)
+
+    def queue_pop(self, table, key):
+        # QR corresponding to Queue Retrieve where the value at the head of
+        # the queue is removed and returned.
+        return self.__add(["QR", table, key], _parse_get_update)
+
+    def queue_match_pop(self, table, key, value):
+        # QM corresponding to Queue match and pop where the value at the head
+        # of the queue is conditionally(if matches) removed and returned.
+        return self.__add(["QM", table, key, value], _parse_get_update)
+
+    def queue_remove(self, table, key, value):
+        # QD corresponding to Queue Delete of a value anywhere in the queue
+        return self.__add(["QD", table, key, value], _parse_set_update)
+
+    def queue_list(self, table, key, limit=0):
+        # QL corresponding to Queue List, table, key[, limit]
+        fields = ["QL", table, key]
+        if limit:
+            fields.append(str(limit))
+        return self.__add(fields, _parse_list)
+
+    def queue_entries(self, table, key, limit=0, after=""):
+        # QE corresponding to Queue Entries, table, key[, limit[, after]]
+        fields = ["QE", table, key]
+        if limit or after:
+            fields.append(str(limit))
+        if after:
+            fields.append(after)
+        return self.__add(fields, _parse_entries)
+
+    def queue_size(self, table, key):
+        # QS corresponding to Queue Size
+        return self.__add(["QS", table, key], _parse_size)
+
+    def queue_clear(self, table, key):
+        # QC corresponding to Queue Clear
+        return self.__add(["QC", table, key], _parse_set_update)
+
+    def queue_claim(self, table, key, count, claim_table, claim_key,
+                    value_table):
+        # QK corresponding to Queue claim, table, key, count, claim table,
+        # claim key, value table
+        return self.__add(["QK", table, key, str(count), claim_table,
+                           claim_key, value_table], _parse_claim)
+
+    def counter_add(self, table, key, delta):
+        # IC corresponding to Integer Counter add
+        return self.__add(["IC", table, key, str(delta)], _parse_counter)
+
+    def execute(self):
+        """
+        Send all collected commands and clear the batch.
+        Returns:
+           - List of results, one per command in the order added.
+             For a transaction None is returned instead if it was not
+             committed, in which case none of its writes took effect.
+        """
+        commands = self.__commands
+        self.__commands = []
+        if not self.__atomic:
+            return self.__proxy._execute(commands)
+
+        # TB and TC corresponding to Transaction Begin and Commit
+        results = self.__proxy._execute(
+            [(["TB"], _parse_set_update)] + commands +
+            [(["TC"], _parse_set_update)], atomic=True)
+        if results[-1] is not True:
+            logger.error("Transaction was not committed")
+            return None
+        return results[1:-1]
+
+
 class TextServiceClient(object):
     """
-    Class similar to HTTP client that handles UTF8 text instead
-    of JSONs
+    Class similar to HTTP client that handles UTF8 text and binary frames
+    instead of JSONs. Requests go over a pool of persistent HTTP/1.1
+    keep-alive connections that is safe to share between threads.
     """
 
-    def __init__(self, url):
+    def __init__(self, url, pool_size=DEFAULT_POOL_SIZE, timeout=10):
+        """
+        Parameters:
+           - url is the uri of the LMDB remote listener
+           - pool_size is the maximum number of connections open at once.
+             Callers wait for a free connection once it is reached.
+           - timeout is the socket timeout in seconds for each request
+        """
         self.ServiceURL = url
-        self.ProxyHandler = urllib.request.ProxyHandler({})
+        parsed_url = urlsplit(url)
+        if parsed_url.scheme == "https":
+            self.__connection_class = http.client.HTTPSConnection
+        else:
+            self.__connection_class = http.client.HTTPConnection
+        self.__host = parsed_url.hostname
+        self.__port = parsed_url.port
+        self.__path = parsed_url.path or "/"
+        self.__timeout = timeout
+        # Idle connections, most recently used first
+        self.__idle = queue.LifoQueue()
+        self.__slots = threading.BoundedSemaphore(pool_size)
+
+    @property
+    def timeout(self):
+        """Socket timeout in seconds for each request"""
+        return self.__timeout
 
     def _postmsg(self, request):
         """
         Post a request UTF8 text listener and return the response.
         """
+        return self._post(request.encode('utf-8'),
+                          'text/plain; charset=utf-8')
 
-        data = request.encode('utf-8')
-        datalen = len(data)
+    def _post(self, data, content_type):
+        """
+        Post a request body of the given content type to the listener and
+        return the response body. None is returned if the response is of a
+        different content type.
+        """
 
-        url = self.ServiceURL
+        datalen = len(data)
 
         logger.debug('post request to %s with DATALEN=%d, DATA=<%s>',
-                     url, datalen, data)
-
-        try:
-            request = urllib.request.Request(
-                url, data,
-                {'Content-Type': 'text/plain; charset=utf-8',
-                 'Content-Length': datalen})
-            opener = urllib.request.build_opener(self.ProxyHandler)
-            response = opener.open(request, timeout=10)
-
-        except urllib.error.HTTPError as err:
-            logger.warn('operation failed with response: %s', err.code)
-            raise MessageException(
-                'operation failed with response: {0}'.format(err.code))
+                     self.ServiceURL, datalen, data)
 
-        except urllib.error.URLError as err:
-            logger.warn('operation failed: %s', err.reason)
-            raise MessageException('operation failed: {0}'.format(err.reason))
+        headers = {'Content-Type': content_type,
+                   'Content-Length': str(datalen)}
+        with self.__slots:
+            status, encoding, content = self.__request(data, headers)
 
-        except Exception as err:
-            logger.exception('no response from server: %s', str(err))
-            raise MessageException('no response from server: {0}'.format(err))
-
-        content = response.read()
-        headers = response.info()
-        response.close()
+        if status != http.client.OK:
+            logger.warn('operation failed with response: %s', status)
+            raise MessageException(
+                'operation failed with response: {0}'.format(status))
 
-        encoding = headers.get('Content-Type')
-        if encoding != 'text/plain; charset=utf-8':
+        if encoding != content_type:
             logger.info('server responds with message %s of type %s',
                         content, encoding)
             return None
 
         return content
+
+    def __request(self, data, headers):
+        """
+        Send a request over a pooled connection. A reused connection that
+        turns out to be closed by the server is discarded and the request
+        is sent once more over a fresh connection.
+        """
+        conn, reused = self.__acquire()
+        while True:
+            try:
+                conn.request("POST", self.__path, data, headers)
+                response = conn.getresponse()
+                content = response.read()
+                break
+            except (BrokenPipeError, ConnectionResetError,
+                    http.client.RemoteDisconnected) as err:
+                conn.close()
+                if not reused:
+                    logger.warn('operation failed: %s', str(err))
+                    raise MessageException(
+                        'operation failed: {0}'.format(err))
+                logger.debug('stale connection dropped: %s', str(err))
+                conn, reused = self.__new_connection(), False
+            except Exception as err:
+                conn.close()
+                logger.exception('no response from server: %s', str(err))
+                raise MessageException(
+                    'no response from server: {0}'.format(err))
+
+        if response.will_close:
+            conn.close()
+        else:
+            self.__idle.put(conn)
+        return response.status, response.getheader('Content-Type'), content
+
+    def __acquire(self):
+        """
+        Get a healthy idle connection or open a new one.
+        Returns a tuple of the connection and whether it is being reused.
+        """
+        while True:
+            try:
+                conn = self.__idle.get_nowait()
+            except queue.Empty:
+                return self.__new_connection(), False
+            if self.__is_healthy(conn):
+                return conn, True
+            conn.close()
+
+    def __new_connection(self):
+        return self.__connection_class(
+            self.__host, self.__port, timeout=self.__timeout)
+
+    @staticmethod
+    def __is_healthy(conn):
+        """
+        An idle keep-alive connection must have an open socket with nothing
+        to read. A readable socket means the server closed it (EOF) or sent
+        unsolicited data, so it cannot be reused.
+        """
+        if conn.sock is None:
+            return False
+        try:
+            readable, _, _ = select.select([conn.sock], [], [], 0)
+        except (OSError, ValueError):
+            return False
+        return len(readable) == 0
+
+    def close(self):
+        """
+        Close all idle connections held by the pool.
+        """
+        while True:
+            try:
+                self.__idle.get_nowait().close()
+            except queue.Empty:
+                break
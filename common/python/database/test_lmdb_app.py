@@ -18,6 +18,7 @@ import argparse
 import json
 import unittest
 import time
+import threading
 
 from database.lmdb_helper_proxy import LMDBHelperProxy
 
@@ -39,6 +40,9 @@ class TestRemoteLMDB(unittest.TestCase):
         self.value2 = "dvalue2"
         self.value3 = "dval3"
         self.key3 = "key3"
+        self.queue_table = "dqueue"
+        self.queue_key = "dq\\k,ey"
+        self.claim_table = "dclaim"
 
     def test_set(self):
         set_result = self.proxy.set(self.table, self.key, self.value)
@@ -267,6 +271,208 @@ class TestRemoteLMDB(unittest.TestCase):
         self.assertEqual(get_value_result, None,
                          "csv_search_delete failed to delete value")
 
+    def test_queue_push_pop(self):
+        for value in ["v1", "v,2", "v3"]:
+            self.assertTrue(self.proxy.queue_push(
+                self.queue_table, self.queue_key, value), "queue_push failed")
+        self.assertFalse(self.proxy.queue_push(
+            self.queue_table, self.queue_key, "v1"),
+            "queue_push added a value already queued")
+        self.assertEqual(self.proxy.queue_size(
+            self.queue_table, self.queue_key), 3, "Incorrect queue size")
+        self.assertEqual(self.proxy.queue_list(
+            self.queue_table, self.queue_key), ["v1", "v,2", "v3"],
+            "queue_list returned values out of order")
+        self.assertEqual(self.proxy.queue_list(
+            self.queue_table, self.queue_key, 2), ["v1", "v,2"],
+            "queue_list ignored the limit")
+        self.assertEqual(self.proxy.queue_pop(
+            self.queue_table, self.queue_key), "v1", "Incorrect pop result")
+        self.assertIsNone(self.proxy.queue_match_pop(
+            self.queue_table, self.queue_key, "v3"),
+            "queue_match_pop popped a value not at the head")
+        self.assertEqual(self.proxy.queue_match_pop(
+            self.queue_table, self.queue_key, "v,2"), "v,2",
+            "Incorrect match pop result")
+        self.assertTrue(self.proxy.queue_remove(
+            self.queue_table, self.queue_key, "v3"), "queue_remove failed")
+        self.assertIsNone(self.proxy.queue_pop(
+            self.queue_table, self.queue_key), "Pop of empty queue")
+        self.assertEqual(self.proxy.queue_size(
+            self.queue_table, self.queue_key), 0, "Incorrect queue size")
+
+    def test_queue_clear(self):
+        for value in ["v1", "v2"]:
+            self.proxy.queue_push(self.queue_table, self.queue_key, value)
+        self.assertTrue(self.proxy.queue_clear(
+            self.queue_table, self.queue_key), "queue_clear failed")
+        self.assertEqual(self.proxy.queue_list(
+            self.queue_table, self.queue_key), [], "Queue not cleared")
+        self.assertFalse(self.proxy.queue_clear(
+            self.queue_table, self.queue_key),
+            "queue_clear of empty queue")
+
+    def test_queue_entries(self):
+        for value in ["v1", "v2", "v3"]:
+            self.proxy.queue_push(self.queue_table, self.queue_key, value)
+        entries = self.proxy.queue_entries(self.queue_table, self.queue_key)
+        self.assertEqual([value for _, value in entries], ["v1", "v2", "v3"],
+                         "queue_entries returned values out of order")
+        self.assertEqual(self.proxy.queue_entries(
+            self.queue_table, self.queue_key, 1, entries[0][0]),
+            entries[1:2], "queue_entries ignored the position or limit")
+        # Positions stay valid when the values before them are removed
+        self.proxy.queue_remove(self.queue_table, self.queue_key, "v2")
+        self.assertEqual(self.proxy.queue_entries(
+            self.queue_table, self.queue_key, 0, entries[1][0]),
+            entries[2:], "queue_entries lost its position")
+        self.assertTrue(self.proxy.queue_clear(
+            self.queue_table, self.queue_key))
+
+    def test_queue_entries_after_refill(self):
+        self.proxy.queue_push(self.queue_table, self.queue_key, "v1")
+        self.proxy.queue_push(self.queue_table, self.queue_key, "v2")
+        old = self.proxy.queue_entries(self.queue_table, self.queue_key)
+        # Emptied by removals, then by a clear, and refilled each time
+        self.proxy.queue_pop(self.queue_table, self.queue_key)
+        self.proxy.queue_pop(self.queue_table, self.queue_key)
+        self.proxy.queue_push(self.queue_table, self.queue_key, "v3")
+        self.assertTrue(self.proxy.queue_clear(
+            self.queue_table, self.queue_key))
+        self.assertFalse(self.proxy.queue_clear(
+            self.queue_table, self.queue_key),
+            "queue_clear of empty queue")
+        for value in ["v4", "v5"]:
+            self.proxy.queue_push(self.queue_table, self.queue_key, value)
+        self.assertEqual([value for _, value in self.proxy.queue_entries(
+            self.queue_table, self.queue_key, 0, old[-1][0])], ["v4", "v5"],
+            "queue_entries skipped values queued after a refill")
+        self.assertTrue(self.proxy.queue_clear(
+            self.queue_table, self.queue_key))
+
+    def test_counter_add(self):
+        self.assertEqual(self.proxy.counter_add(
+            self.table, "counter", 5), 5, "Incorrect counter value")
+        self.assertEqual(self.proxy.counter_add(
+            self.table, "counter", -2), 3, "Incorrect counter value")
+        self.assertEqual(self.proxy.get(self.table, "counter"), "3",
+                         "Incorrect stored counter")
+        self.assertTrue(self.proxy.remove(self.table, "counter"))
+
+    def test_transaction_commit(self):
+        transaction = self.proxy.transaction()
+        transaction.set(self.table, "key6", "value6")
+        transaction.get(self.table, "key6")
+        transaction.queue_push(self.queue_table, self.queue_key, "v1")
+        transaction.counter_add(self.table, "counter", 1)
+        results = transaction.execute()
+        logger.info("Transaction results : %s", results)
+        self.assertEqual(results, [True, "value6", True, 1],
+                         "Incorrect transaction results")
+        self.assertEqual(self.proxy.get(self.table, "key6"), "value6",
+                         "Transaction write not committed")
+        self.assertEqual(self.proxy.queue_pop(
+            self.queue_table, self.queue_key), "v1",
+            "Transaction push not committed")
+        self.assertTrue(self.proxy.remove(self.table, "key6"))
+        self.assertTrue(self.proxy.remove(self.table, "counter"))
+
+    def test_transaction_abort(self):
+        self.assertTrue(self.proxy.set(self.table, "counter", "notanumber"))
+        transaction = self.proxy.transaction()
+        transaction.set(self.table, "key6", "value6")
+        transaction.queue_push(self.queue_table, self.queue_key, "v1")
+        # Fails, the key holds no integer
+        transaction.counter_add(self.table, "counter", 1)
+        self.assertIsNone(transaction.execute(),
+                          "Failed transaction was committed")
+        self.assertIsNone(self.proxy.get(self.table, "key6"),
+                          "Aborted transaction write took effect")
+        self.assertEqual(self.proxy.queue_size(
+            self.queue_table, self.queue_key), 0,
+            "Aborted transaction push took effect")
+        self.assertTrue(self.proxy.remove(self.table, "counter"))
+
+    def test_set_new(self):
+        self.assertTrue(self.proxy.set_new(self.table, "key7", "value7"))
+        self.assertFalse(self.proxy.set_new(self.table, "key7", "other"),
+                         "set_new overwrote a key already set")
+        # A key already set aborts the transaction
+        transaction = self.proxy.transaction()
+        transaction.set(self.table, "key8", "value8")
+        transaction.set_new(self.table, "key7", "other")
+        self.assertIsNone(transaction.execute(),
+                          "Transaction of an existing key was committed")
+        self.assertIsNone(self.proxy.get(self.table, "key8"),
+                          "Aborted transaction write took effect")
+        self.assertEqual(self.proxy.get(self.table, "key7"), "value7")
+        self.assertTrue(self.proxy.remove(self.table, "key7"))
+
+    def test_queue_claim_exclusive(self):
+        values = ["wo{}".format(i) for i in range(20)]
+        for value in values:
+            self.proxy.set(self.table, value, "request " + value)
+            self.proxy.queue_push(self.queue_table, self.queue_key, value)
+        claimed = {}
+
+        def claim(claim_key):
+            claimed[claim_key] = []
+            while True:
+                pairs = self.proxy.queue_claim(
+                    self.queue_table, self.queue_key, 3,
+                    self.claim_table, claim_key, self.table)
+                if len(pairs) == 0:
+                    return
+                for value, request in pairs:
+                    self.assertEqual(request, "request " + value,
+                                     "Incorrect value read by claim")
+                claimed[claim_key] += [value for value, _ in pairs]
+
+        claimers = [threading.Thread(target=claim, args=(claim_key,))
+                    for claim_key in ["c1", "c2"]]
+        for claimer in claimers:
+            claimer.start()
+        for claimer in claimers:
+            claimer.join()
+        logger.info("Claimed : %s", claimed)
+        self.assertEqual(set(claimed["c1"]) & set(claimed["c2"]), set(),
+                         "A value was claimed twice")
+        self.assertEqual(sorted(claimed["c1"] + claimed["c2"]),
+                         sorted(values), "Values were not all claimed")
+        for claim_key in ["c1", "c2"]:
+            recorded = self.proxy.get(self.claim_table, claim_key)
+            self.assertEqual(recorded.split(",") if recorded else [],
+                             claimed[claim_key], "Incorrect claim record")
+            self.proxy.remove(self.claim_table, claim_key)
+        for value in values:
+            self.proxy.remove(self.table, value)
+
+    def test_queue_wait_pop(self):
+        pusher = threading.Timer(0.5, self.proxy.queue_push, args=(
+            self.queue_table, self.queue_key, "v1"))
+        pusher.start()
+        self.assertEqual(self.proxy.queue_wait_pop(
+            self.queue_table, self.queue_key, 5), "v1",
+            "queue_wait_pop missed the value pushed")
+        pusher.join()
+        start = time.time()
+        self.assertIsNone(self.proxy.queue_wait_pop(
+            self.queue_table, self.queue_key, 0.5),
+            "queue_wait_pop returned a value from an empty queue")
+        self.assertGreaterEqual(time.time() - start, 0.4,
+                                "queue_wait_pop did not wait")
+
+    def test_get_wait(self):
+        setter = threading.Timer(0.5, self.proxy.set, args=(
+            self.table, "key7", "value7"))
+        setter.start()
+        self.assertEqual(self.proxy.get_wait(self.table, "key7", 5),
+                         "value7", "get_wait missed the value set")
+        setter.join()
+        self.assertTrue(self.proxy.remove(self.table, "key7"))
+        self.assertIsNone(self.proxy.get_wait(self.table, "key7", 0.5),
+                          "get_wait returned a value for an absent key")
+
     def test_remove(self):
         remove_result = self.proxy.remove(self.table, self.key)
         logger.info(remove_result)
@@ -317,6 +523,17 @@ def local_main():
     test.test_csv_search_delete_notfound()
     test.test_csv_search_delete_inbetween()
     test.test_csv_search_delete_only()
+    test.test_queue_push_pop()
+    test.test_queue_clear()
+    test.test_queue_entries()
+    test.test_queue_entries_after_refill()
+    test.test_counter_add()
+    test.test_transaction_commit()
+    test.test_transaction_abort()
+    test.test_set_new()
+    test.test_queue_claim_exclusive()
+    test.test_queue_wait_pop()
+    test.test_get_wait()
     test.test_remove()
     test.test_get_none()
     test.test_remove2()
@@ -0,0 +1,24 @@
+# Copyright 2020 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Version of the workers table of the shared KV storage. The enclave
+managers bump the counter along with every change to the workers table,
+the listener and the blockchain connectors read it to know when the
+workers they hold in memory or on chain are out of date.
+"""
+
+# Table and key of the counter
+WORKERS_VERSION_TABLE = "workers-version"
+WORKERS_VERSION_KEY = "workers"
@@ -27,12 +27,20 @@
 import os
 import sys
 import json
+import time
+import signal
+import socket
 import logging
+import subprocess
 
 from urllib.parse import urlsplit
 from twisted.web import server, resource, http
-from twisted.internet import reactor, error as reactor_error
+from twisted.internet import defer, reactor, error as reactor_error
 from jsonrpc.dispatcher import Dispatcher
+from jsonrpc.jsonrpc import JSONRPCRequest
+from jsonrpc.jsonrpc2 import JSONRPC20Response
+from jsonrpc.exceptions import \
+    JSONRPCInvalidRequest, JSONRPCInvalidRequestException
 from jsonrpc import JSONRPCResponseManager
 from error_code.error_status import JRPCErrorCodes
 
@@ -45,6 +53,9 @@ logger = logging.getLogger(__name__)
 
 
 TCFHOME = os.environ.get("TCF_HOME", "../../")
+# Listener processes exiting sooner than this after they were started are
+# not started again, they are taken as failing to start
+MIN_PROCESS_UPTIME = 10
 
 
 class BaseJRPCListener(resource.Resource):
@@ -93,10 +104,29 @@ class BaseJRPCListener(resource.Resource):
             response["error"]["message"] = "{}".format(str(err))
             return response
 
-        # save the full json for WorkOrderSubmit
-        input_json["params"]["raw"] = input_json_str
-        data = json.dumps(input_json).encode('utf-8')
-        response = JSONRPCResponseManager.handle(data, self.dispatcher)
+        return self._dispatch(input_json, input_json_str)
+
+    def _dispatch(self, input_json, input_json_str):
+        """
+        Dispatch a decoded request to its rpc method. Besides the params
+        of the request, the method receives the request as received in
+        "raw" and as decoded in "json", so that it never parses it again.
+
+        Parameters :
+            input_json - Decoded request
+            input_json_str - JSON formatted str of the request
+        Returns :
+            response - data field from the response received which is a dict
+        """
+        request = dict(input_json)
+        request["params"] = dict(
+            input_json["params"], raw=input_json_str, json=input_json)
+        try:
+            request = JSONRPCRequest.from_data(request)
+        except JSONRPCInvalidRequestException:
+            return JSONRPC20Response(error=JSONRPCInvalidRequest()._data).data
+        response = JSONRPCResponseManager.handle_request(
+            request, self.dispatcher)
         return response.data
 
     def render_GET(self, request):
@@ -127,7 +157,8 @@ class BaseJRPCListener(resource.Resource):
         Parameters :
             request - Request coming in from a client
         Returns :
-            response - A dict type response
+            response - A dict type response. If _process_request returns a
+                       Deferred, the response is sent once it fires.
         """
         response = {}
 
@@ -164,6 +195,9 @@ class BaseJRPCListener(resource.Resource):
                 "UNKNOWN_ERROR: unable to decode incoming request")
             return response
 
+        if isinstance(response, defer.Deferred):
+            return self.__respond_later(request, encoding, response)
+
         # send back the results
         try:
             if encoding in ['application/json',
@@ -185,17 +219,62 @@ class BaseJRPCListener(resource.Resource):
                 "request {0}: {1}".format(request.path, str(err)))
             return response
 
-    def start(self, host_name, port):
+    def __respond_later(self, request, encoding, deferred):
+        """
+        Hold the HTTP request until deferred fires with the response
+
+        Parameters :
+            request - Request coming in from a client
+            encoding - Content type of the request
+            deferred - Deferred firing with the response dict
+        Returns :
+            NOT_DONE_YET
+        """
+        disconnected = []
+        request.notifyFinish().addErrback(
+            lambda _: disconnected.append(True))
+
+        def respond(response):
+            if disconnected:
+                logger.info("Client went away before its response")
+                return
+            logger.info('response[%s]: %s', encoding, response)
+            request.setHeader('content-type', encoding)
+            request.setResponseCode(http.OK)
+            request.write(json.dumps(response).encode('utf8'))
+            request.finish()
+
+        def fail(failure):
+            logger.error("exception while processing request %s: %s",
+                         request.path, failure.getErrorMessage())
+            return jrpc_utility.create_error_response(
+                JRPCErrorCodes.UNKNOWN_ERROR, 0,
+                "UNKNOWN_ERROR: unknown exception processing http " +
+                "request {0}".format(request.path))
+
+        deferred.addErrback(fail).addCallback(respond)
+        return server.NOT_DONE_YET
+
+    def start(self, host_name, port, listen_fd=None):
         """
         Start the listener instance on specified socket.
 
         Parameters :
             host_name - The hostname where this listener is reachable
             port - The port at which this listener needs to listen
+            listen_fd - Descriptor of a listening socket to accept
+                        connections from instead, see start_processes
         """
         root = self
         site = server.Site(root)
-        reactor.listenTCP(port, site, interface=host_name)
+        if listen_fd is None:
+            reactor.listenTCP(port, site, interface=host_name)
+        else:
+            # The socket is shared with the other listener processes,
+            # the kernel hands each connection to one of them
+            sock = socket.socket(fileno=listen_fd)
+            reactor.adoptStreamPort(sock.fileno(), sock.family, site)
+            sock.close()
 
         logger.info('%s started on port %s', type(self).__name__, port)
 
@@ -241,6 +320,76 @@ def parse_bind_url(url):
     return host_name, port
 
 
+def start_processes(host_name, port, processes, args):
+    """
+    Serve requests from several listener processes sharing one listening
+    socket, so that they can use as many CPU cores. The socket is bound
+    here and handed to each process, which gets started as
+    args --listen-fd <fd> --process-index <index>
+    and is expected to call start() with listen_fd. A process exiting is
+    started again, unless it failed right away. Returns once all the
+    processes exited, after SIGTERM or SIGINT is received.
+
+    Parameters :
+        host_name - The hostname where the listener is reachable
+        port - The port at which the listener needs to listen
+        processes - Number of listener processes
+        args - Command line starting a listener process
+    """
+    family, kind, proto, _, address = socket.getaddrinfo(
+        host_name, port, type=socket.SOCK_STREAM,
+        flags=socket.AI_PASSIVE)[0]
+    sock = socket.socket(family, kind, proto)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(address)
+    sock.listen(socket.SOMAXCONN)
+    # Processes that lose the race for a connection must not block
+    sock.setblocking(False)
+    listen_fd = sock.fileno()
+
+    # pid -> (index, start time) of the running listener processes
+    running = {}
+    stopping = []
+
+    def spawn(index):
+        child = subprocess.Popen(
+            args + ["--listen-fd", str(listen_fd),
+                    "--process-index", str(index)],
+            pass_fds=(listen_fd,))
+        running[child.pid] = (index, time.time())
+        logger.info("Started listener process %d, pid %d", index, child.pid)
+
+    def stop(signum, frame):
+        stopping.append(signum)
+        for pid in running:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except OSError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for index in range(processes):
+        spawn(index)
+    logger.info("%d listener processes started on port %s", processes, port)
+
+    while running:
+        pid, status = os.wait()
+        if pid not in running:
+            continue
+        index, started = running.pop(pid)
+        if stopping:
+            continue
+        logger.error("Listener process %d, pid %d exited with status %d",
+                     index, pid, status)
+        if time.time() - started < MIN_PROCESS_UPTIME:
+            logger.error("Quit : listener process %d failed to start", index)
+            stop(signal.SIGTERM, None)
+        else:
+            spawn(index)
+    sock.close()
+
+
 def get_config_dir(relative_path):
     """
     Returns the avalon configuration directory based on the
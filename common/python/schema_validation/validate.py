@@ -15,7 +15,41 @@
 
 import json
 import pkg_resources
-from jsonschema import validate, ValidationError, SchemaError
+from jsonschema import ValidationError, SchemaError
+from jsonschema.exceptions import best_match
+from jsonschema.validators import validator_for
+
+# Validators compiled from the schema files, by method
+_validators = {}
+
+
+def _get_validator(method):
+    """
+    Get the validator of a method, loading and compiling its schema file
+    on first use
+
+    Raises SchemaError if the schema is invalid
+    """
+    validator = _validators.get(method)
+    if validator is None:
+        file_name = "data/" + method + ".json"
+        schema = json.loads(
+            pkg_resources.resource_string(__name__, file_name))
+        cls = validator_for(schema)
+        cls.check_schema(schema)
+        validator = cls(schema)
+        _validators[method] = validator
+    return validator
+
+
+def load_schemas():
+    """
+    Compile the validators of all the schema files upfront, so that the
+    first request of each method does not pay for it
+    """
+    for file_name in pkg_resources.resource_listdir(__name__, "data"):
+        if file_name.endswith(".json"):
+            _get_validator(file_name[:-len(".json")])
 
 
 def schema_validation(method, params):
@@ -33,13 +67,16 @@ def schema_validation(method, params):
     if len(params) == 0:
         return False, "Empty params in the request"
 
-    schema = {}
-    file_name = "data/" + method + ".json"
+    try:
+        validator = _get_validator(method)
+    except SchemaError as err:
+        return False, err.message
 
-    data_file = pkg_resources.resource_string(__name__, file_name)
-    schema = json.loads(data_file)
     try:
-        validate(params, schema)
+        # Report the same error jsonschema.validate would
+        error = best_match(validator.iter_errors(params))
+        if error is not None:
+            raise error
     except ValidationError as e:
         if e.validator == 'additionalProperties' or \
                 e.validator == 'required':
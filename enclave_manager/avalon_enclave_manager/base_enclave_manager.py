@@ -95,7 +95,9 @@ class EnclaveManager(ABC):
             logger.error("Kv Storage path is missing")
             sys.exit(-1)
         try:
-            kv_helper = connector.open(self._config['KvStorage']['remote_url'])
+            kv_helper = connector.open(
+                self._config['KvStorage']['remote_url'],
+                self._config['KvStorage'].get('connection_pool_size'))
         except Exception as err:
             logger.error("Failed to open KV storage interface; " +
                          "exiting Intel SGX Enclave manager: {}".format(err))
@@ -78,6 +78,16 @@ class SingletonEnclaveManager(WOProcessorManager):
                                  self._worker_id,
                                  EnclaveType.SINGLETON)
 
+# -------------------------------------------------------------------------
+
+    def _supports_concurrent_execution(self):
+        """
+        The Singleton bridge releases the GIL and hands each call one of
+        the num_of_enclaves enclaves loaded, so up to that many work
+        orders can be executed at once from several threads.
+        """
+        return True
+
 # -------------------------------------------------------------------------
 
     def _execute_wo_in_trusted_enclave(self, input_json_str):
@@ -49,15 +49,19 @@ class WorkOrderKVDelegate:
         response cannot be verified. Hence they are stale and not useful.
         """
         # Get all work order ids that have been processed by this worker
-        # i.e.- Singleton or KME (WPEs using this KME). This list is a
-        # comma separated value string which needs to be split to obtain
-        # the actual work order ids.
+        # i.e.- Singleton or KME (WPEs using this KME) from its queue.
         logger.info("About to start removing stale work orders from database.")
-        wo_ids = self._kv_helper.get("wo-worker-processed", self._worker_id)
-        if wo_ids is None:
+        wo_id_list = self._kv_helper.queue_list(
+            "wo-worker-processed", self._worker_id)
+        # Older releases stored them as a comma separated value instead
+        legacy_wo_ids = self._kv_helper.get(
+            "wo-worker-processed", self._worker_id)
+        if legacy_wo_ids is not None:
+            wo_id_list.extend(legacy_wo_ids.split(","))
+            self._kv_helper.remove("wo-worker-processed", self._worker_id)
+        if len(wo_id_list) == 0:
             logger.info("No stale work order found. Cleanup not needed.")
             return
-        wo_id_list = wo_ids.split(",")
 
         count = 0
         for wo_id in wo_id_list:
@@ -66,7 +70,7 @@ class WorkOrderKVDelegate:
             self._kv_helper.remove("wo-receipts", wo_id)
             self._kv_helper.remove("wo-timestamps", wo_id)
             count += 1
-        self._kv_helper.remove("wo-worker-processed", self._worker_id)
+        self._kv_helper.queue_clear("wo-worker-processed", self._worker_id)
         logger.info("Purged %d work orders from database.", count)
 
     def update_receipt(self, wo_id, wo_json_resp):
@@ -19,14 +19,21 @@ import zmq
 import json
 import time
 import logging
+import collections
 import utility.jrpc_utility as jrpc_utility
 
 from abc import abstractmethod
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from error_code.error_status import WorkOrderStatus
 from avalon_enclave_manager.base_enclave_manager import EnclaveManager
 
 logger = logging.getLogger(__name__)
 
+# Default number of work orders executed at once in the enclave
+DEFAULT_WO_THREADS = 1
+# Default number of work orders popped and read ahead of their execution
+DEFAULT_WO_PREFETCH = 1
+
 
 class WOProcessorManager(EnclaveManager):
     """
@@ -37,6 +44,42 @@ class WOProcessorManager(EnclaveManager):
         super().__init__(config)
         self._identity = None
 
+        manager_config = config.get("EnclaveManager", {})
+        self._wo_threads = max(1, int(manager_config.get(
+            "work_order_threads", DEFAULT_WO_THREADS)))
+        if self._wo_threads > 1 and \
+                not self._supports_concurrent_execution():
+            logger.warning("Enclave cannot execute work orders " +
+                           "concurrently; work_order_threads ignored")
+            self._wo_threads = 1
+        # Each work order executing holds one of the enclaves loaded,
+        # further threads would only wait for one
+        num_of_enclaves = max(1, int(config.get("EnclaveModule", {}).get(
+            "num_of_enclaves", 1)))
+        if self._wo_threads > num_of_enclaves:
+            logger.warning("work_order_threads limited to num_of_enclaves " +
+                           "(%d), raise both to execute more work orders " +
+                           "at once", num_of_enclaves)
+            self._wo_threads = num_of_enclaves
+        self._wo_prefetch = max(1, int(manager_config.get(
+            "work_order_prefetch", DEFAULT_WO_PREFETCH)))
+        self.__executor = None
+        self.__writer = None
+
+# -------------------------------------------------------------------------
+
+    def _supports_concurrent_execution(self):
+        """
+        Tells whether _execute_wo_in_trusted_enclave can be called from
+        several threads at once. Enclave managers whose enclave has more
+        than one thread control structure override it.
+
+        Returns :
+            True if work orders can be executed concurrently,
+            False otherwise
+        """
+        return False
+
 # -------------------------------------------------------------------------
 
     def _process_work_order_sync(self, process_wo_id):
@@ -50,17 +93,11 @@ class WOProcessorManager(EnclaveManager):
         logger.info(
             "About to process work orders found in wo-worker-scheduled table.")
 
-        # csv_match_pop will peek into the deque and pop out the first
-        # work-order id if it matches the process_wo_id
-        wo_id = self._kv_helper.csv_match_pop(
-            "wo-worker-scheduled", self._worker_id, process_wo_id)
-        if process_wo_id == wo_id:
-            wo_process_result = self._process_work_order_by_id(wo_id)
-
-            # Cleanup wo-worker-processing that hold in-progress work orders
-            self._kv_helper.remove("wo-worker-processing", self._identity)
-
-            return wo_process_result
+        # queue_remove takes the work-order id out of the queue wherever
+        # it is, as listeners may have several work orders outstanding
+        if self._kv_helper.queue_remove(
+                "wo-worker-scheduled", self._worker_id, process_wo_id):
+            return self._process_work_order_by_id(process_wo_id)
         else:
             return None
 
@@ -68,25 +105,190 @@ class WOProcessorManager(EnclaveManager):
 
 # -------------------------------------------------------------------------
 
-    def _process_work_orders(self):
+    def _process_work_orders(self, wo_id=None):
         """
         Executes Run time flow of enclave manager
+
+        Parameters:
+            @param wo_id - Id of a work-order already popped from
+                           wo-worker-scheduled table, if any
         """
         logger.info(
             "About to process work orders found in wo-worker-scheduled table.")
 
-        wo_id = self._kv_helper.csv_pop("wo-worker-scheduled", self._worker_id)
+        if self._wo_threads > 1 or self._wo_prefetch > 1:
+            self.__process_work_orders_pipelined(wo_id)
+            return
+
+        if wo_id is None:
+            wo_id = self._kv_helper.queue_pop("wo-worker-scheduled",
+                                              self._worker_id)
         while wo_id is not None:
 
             self._process_work_order_by_id(wo_id)
-            # Cleanup wo-worker-processing that hold in-progress work orders
-            self._kv_helper.remove("wo-worker-processing", self._identity)
 
-            wo_id = self._kv_helper.csv_pop("wo-worker-scheduled",
-                                            self._worker_id)
+            wo_id = self._kv_helper.queue_pop("wo-worker-scheduled",
+                                              self._worker_id)
         # end of loop
         logger.info("No more worker orders in wo-worker-scheduled table.")
 
+# -------------------------------------------------------------------------
+
+    def __process_work_orders_pipelined(self, wo_id=None):
+        """
+        Executes Run time flow of enclave manager with work orders read
+        from the KV storage ahead of their execution. Up to
+        work_order_prefetch work orders are claimed along with their
+        requests in a single round trip, up to work_order_threads of them
+        are executed in the enclave at once and their responses are
+        persisted by another thread, so that KV storage I/O and enclave
+        execution overlap.
+
+        Parameters:
+            @param wo_id - Id of a work-order already popped from
+                           wo-worker-scheduled table, if any
+        """
+        if self.__executor is None:
+            self.__executor = ThreadPoolExecutor(
+                self._wo_threads, thread_name_prefix="wo-execute")
+            self.__writer = ThreadPoolExecutor(
+                1, thread_name_prefix="wo-persist")
+
+        popped_wo_id = wo_id
+        prefetched = collections.deque()
+        executing = set()
+        persisting = set()
+        while True:
+            if len(prefetched) == 0:
+                prefetched.extend(self.__claim_work_orders(popped_wo_id))
+                popped_wo_id = None
+            if len(prefetched) == 0 and len(executing) == 0:
+                break
+
+            while len(prefetched) != 0 and \
+                    len(executing) < self._wo_threads:
+                wo_id, wo_json_req = prefetched.popleft()
+                if wo_json_req is None:
+                    logger.error("Received empty work order corresponding " +
+                                 "to id %s from wo-requests table", wo_id)
+                    self._unmark_processing(wo_id)
+                    continue
+                logger.info("Validating JSON workorder request %s", wo_id)
+                if not self._validate_request(wo_id, wo_json_req):
+                    continue
+                logger.info("Execute workorder with id %s", wo_id)
+                executing.add(self.__executor.submit(
+                    self.__execute_prefetched, wo_id, wo_json_req))
+            if len(executing) == 0:
+                continue
+
+            done, executing = wait(executing, return_when=FIRST_COMPLETED)
+            for future in done:
+                persisting.add(self.__writer.submit(
+                    self.__persist_prefetched, *future.result()))
+            # Surface errors of responses persisted so far
+            for future in [f for f in persisting if f.done()]:
+                persisting.remove(future)
+                future.result()
+
+        for future in wait(persisting).done:
+            future.result()
+        logger.info("No more worker orders in wo-worker-scheduled table.")
+
+    def __claim_work_orders(self, wo_id=None):
+        """
+        Take up to work_order_prefetch work orders out of
+        wo-worker-scheduled table, record them in wo-worker-processing
+        and read their requests, in a single round trip
+
+        Parameters:
+            @param wo_id - Id of a work-order already popped from
+                           wo-worker-scheduled table, if any
+        Returns :
+            List of (work order id, JSON request or None) tuples
+        """
+        batch = self._kv_helper.batch()
+        if wo_id is not None:
+            batch.csv_append("wo-worker-processing", self._identity, wo_id)
+            batch.get("wo-requests", wo_id)
+        count = self._wo_prefetch - (1 if wo_id is not None else 0)
+        if count > 0:
+            batch.queue_claim("wo-worker-scheduled", self._worker_id, count,
+                              "wo-worker-processing", self._identity,
+                              "wo-requests")
+        results = batch.execute()
+
+        claimed = []
+        if wo_id is not None:
+            claimed.append((wo_id, results[1]))
+        if count > 0:
+            claimed.extend(results[-1])
+        return claimed
+
+    def __execute_prefetched(self, wo_id, wo_json_req):
+        """
+        Execute a prefetched work order, run in the execution threads
+        """
+        return wo_id, self._execute_work_order(wo_json_req)
+
+    def __persist_prefetched(self, wo_id, wo_json_resp):
+        """
+        Persist the response of a prefetched work order, run in the
+        persisting thread
+        """
+        self._store_work_order_result(wo_id, wo_json_resp)
+
+# -------------------------------------------------------------------------
+
+    def _mark_processing(self, wo_id):
+        """
+        Record a work order as being processed by this worker identity in
+        wo-worker-processing, so that it is not taken for an orphan.
+        wo-worker-processing holds a mapping of worker_identity->wo_ids as
+        a comma separated value.
+
+        Parameters:
+            @param wo_id - Id of the work order being processed
+        """
+        self._kv_helper.csv_append(
+            "wo-worker-processing", self._identity, wo_id)
+
+    def _unmark_processing(self, wo_id):
+        """
+        Remove a work order whose response is not persisted from the ones
+        being processed by this worker identity in wo-worker-processing.
+        Persisting a response does it already.
+
+        Parameters:
+            @param wo_id - Id of the work order done with
+        """
+        self._kv_helper.csv_search_delete(
+            "wo-worker-processing", self._identity, wo_id)
+
+    def _release_interrupted_work_orders(self, requeue):
+        """
+        Handle the work orders this worker identity was processing when it
+        last stopped, as left in wo-worker-processing
+
+        Parameters:
+            @param requeue - True to put them back in wo-worker-scheduled
+                             table to be executed, False to drop them
+        """
+        wo_ids = self._kv_helper.get("wo-worker-processing", self._identity)
+        if wo_ids is None:
+            return
+        transaction = self._kv_helper.transaction()
+        if requeue:
+            for wo_id in wo_ids.split(","):
+                transaction.queue_push(
+                    "wo-worker-scheduled", self._worker_id, wo_id)
+        transaction.remove("wo-worker-processing", self._identity)
+        if transaction.execute() is None:
+            logger.error("Failed to release interrupted work orders %s",
+                         wo_ids)
+        elif requeue:
+            logger.info("Scheduled interrupted work orders %s again", wo_ids)
+
 # -------------------------------------------------------------------------
 
     def _process_work_order_by_id(self, wo_id):
@@ -116,11 +318,11 @@ class WOProcessorManager(EnclaveManager):
         if not self._validate_request(wo_id, wo_json_req):
             return None
 
-        # wo-worker-processing holds a mapping of worker_identity->wo_id.
+        # wo-worker-processing holds a mapping of worker_identity->wo_ids.
         # The identity of a worker is the worker_id in case of Singleton
         # worker and it is the enclave id in case of a worker from a worker
         # pool(WPE).
-        self._kv_helper.set("wo-worker-processing", self._identity, wo_id)
+        self._mark_processing(wo_id)
         logger.info("Workorder %s picked up for processing by %s",
                     wo_id, self._identity)
 
@@ -128,6 +330,21 @@ class WOProcessorManager(EnclaveManager):
 
         logger.info("Execute workorder with id %s", wo_id)
         wo_json_resp = self._execute_work_order(wo_json_req)
+        return self._store_work_order_result(wo_id, wo_json_resp)
+
+    # -------------------------------------------------------------------------
+
+    def _store_work_order_result(self, wo_id, wo_json_resp):
+        """
+        Update the receipt of an executed work order and persist its
+        response
+        Parameters :
+            wo_id - Id of the work order executed
+            wo_json_resp - JSON formatted str of the response
+        Returns :
+            wo_resp - A JSON response of the executed work order, None if
+                      it failed
+        """
         wo_resp = json.loads(wo_json_resp)
 
         logger.info("Update workorder receipt for workorder %s", wo_id)
@@ -214,14 +431,20 @@ class WOProcessorManager(EnclaveManager):
                 WorkOrderStatus.FAILED, "0", msg)
             wo_response = json.dumps(err_response)
 
-        logger.info("Update response in wo-responses for workorder %s.", wo_id)
-        self._kv_helper.set("wo-responses", wo_id, wo_response)
-
-        logger.info(
-            "Persist work order id %s in wo-worker-processed map.", wo_id)
-        # Append wo_id to the list of work orders processed by this worker
-        self._kv_helper.csv_append("wo-worker-processed",
-                                   self._worker_id, wo_id)
+        logger.info("Update response in wo-responses and persist work " +
+                    "order id %s in wo-worker-processed map.", wo_id)
+        # Store the response, append wo_id to the list of work orders
+        # processed by this worker and remove it from the ones in progress
+        # in a single transaction, so that a response is never left out of
+        # the processed list.
+        if self._kv_helper.transaction() \
+                .set("wo-responses", wo_id, wo_response) \
+                .queue_push("wo-worker-processed", self._worker_id, wo_id) \
+                .csv_search_delete("wo-worker-processing", self._identity,
+                                   wo_id) \
+                .execute() is None:
+            logger.error("Failed to persist response of work order %s",
+                         wo_id)
 
     # -----------------------------------------------------------------
 
@@ -268,6 +491,9 @@ class WOProcessorManager(EnclaveManager):
         sync_workload_exec = int(
             self._config["WorkloadExecution"]["sync_workload_execution"])
 
+        # Work orders interrupted in sync mode were reported pending to
+        # the client already, they are only scheduled again in async mode
+        self._release_interrupted_work_orders(sync_workload_exec != 1)
         if sync_workload_exec == 1:
             self._start_zmq_listener()
         else:
@@ -278,9 +504,11 @@ class WOProcessorManager(EnclaveManager):
     def _start_polling_kvstore(self):
         """
         This function is runs indefinitely polling the KV Storage
-        for new work-order request and processing them. The poll
-        is interleaved with sleeps hence avoiding busy waits. It
-        terminates only when an exception occurs.
+        for new work-order request and processing them. Between two
+        polls it waits up to sleep_interval seconds on the KV Storage
+        for a work order to be scheduled, so that one is picked up as
+        soon as it is submitted. If the KV Storage cannot wait, it
+        sleeps instead. It terminates only when an exception occurs.
         """
         try:
             sleep_interval = \
@@ -291,12 +519,18 @@ class WOProcessorManager(EnclaveManager):
             sleep_interval = 10
 
         try:
+            wo_id = None
             while True:
                 # Poll KV storage for new work-order requests and process
-                self._process_work_orders()
-                logger.info("Enclave manager sleeping for %d secs",
-                            sleep_interval)
-                time.sleep(sleep_interval)
+                self._process_work_orders(wo_id)
+                logger.info("Enclave manager waiting up to %d secs for " +
+                            "work orders", sleep_interval)
+                deadline = time.time() + sleep_interval
+                wo_id = self._kv_helper.queue_wait_pop(
+                    "wo-worker-scheduled", self._worker_id, sleep_interval)
+                if wo_id is None and time.time() < deadline:
+                    # Fall back to sleeping between polls
+                    time.sleep(deadline - time.time())
         except Exception as inst:
             logger.error("Error while processing work-order; " +
                          "shutting down enclave manager")
@@ -309,14 +543,16 @@ class WOProcessorManager(EnclaveManager):
     def _bind_zmq_socket(self, zmq_port):
         """
         Function to bind to zmq port configured. ZMQ is used for
-        synchronous work order processing.
+        synchronous work order processing. The ROUTER socket serves both
+        listeners with a REQ socket and those with a DEALER socket, which
+        may send several requests before they get a reply.
 
         Returns :
             socket - An instance of a Socket bound to the configured
                      port.
         """
         context = zmq.Context()
-        socket = context.socket(zmq.REP)
+        socket = context.socket(zmq.ROUTER)
         socket.bind("tcp://0.0.0.0:"+zmq_port)
         return socket
 
@@ -334,6 +570,11 @@ class WOProcessorManager(EnclaveManager):
             socket = self._bind_zmq_socket(
                 self._config.get("EnclaveManager")["zmq_port"])
             logger.info("ZMQ Port hosted by Enclave")
+            # Let listeners find this enclave manager
+            zmq_url = self._config.get("EnclaveManager").get("zmq_url")
+            if zmq_url:
+                self._worker_kv_delegate.register_endpoint(
+                    self._identity, zmq_url)
         except Exception as ex:
             logger.exception("Failed to bind socket" +
                              "shutting down enclave manager")
@@ -344,15 +585,21 @@ class WOProcessorManager(EnclaveManager):
             while True:
                 # Wait for the next request
                 logger.info("Enclave Manager waiting for next request")
-                wo_id = socket.recv()
-                wo_id = wo_id.decode()
+                # [<peer>, b"", <request id>, <work order id>], listeners
+                # with a REQ socket send no request id
+                frames = socket.recv_multipart()
+                if len(frames) not in (3, 4) or frames[1] != b"":
+                    logger.error("Invalid request at enclave manager")
+                    continue
+                wo_id = frames[-1].decode()
                 logger.info("Received request at enclave manager: %s" % wo_id)
                 result = self._process_work_order_sync(wo_id)
                 if result is None:
-                    socket.send_string("Error while processing work order: " +
-                                       str(wo_id))
+                    reply = "Error while processing work order: " + \
+                        str(wo_id)
                 else:
-                    socket.send_string("Work order processed: " + str(wo_id))
+                    reply = "Work order processed: " + str(wo_id)
+                socket.send_multipart(frames[:-1] + [reply.encode()])
         except Exception as inst:
             logger.error("Error while processing work-order; " +
                          "shutting down enclave manager")
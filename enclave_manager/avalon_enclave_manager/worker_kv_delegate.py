@@ -19,6 +19,8 @@ import time
 import logging
 import hashlib
 import avalon_sdk.worker.worker_details as worker_details
+from database.workers_version import \
+    WORKERS_VERSION_TABLE, WORKERS_VERSION_KEY
 
 
 logger = logging.getLogger(__name__)
@@ -56,6 +58,8 @@ class WorkerKVDelegate:
             logger.info("Clearing entries in workers table")
             for worker in workers_list:
                 result &= self._kv_helper.remove("workers", worker)
+            self._kv_helper.counter_add(
+                WORKERS_VERSION_TABLE, WORKERS_VERSION_KEY, 1)
         return result
 
     def cleanup_pool(self, worker_id):
@@ -83,7 +87,11 @@ class WorkerKVDelegate:
         """
         logger.info("Adding enclave workers to workers table")
 
-        return self._kv_helper.set("workers", worker_id, worker_info)
+        results = self._kv_helper.transaction() \
+            .set("workers", worker_id, worker_info) \
+            .counter_add(WORKERS_VERSION_TABLE, WORKERS_VERSION_KEY, 1) \
+            .execute()
+        return results is not None and results[0]
 
     def get_worker_by_id(self, worker_id):
         """
@@ -123,3 +131,16 @@ class WorkerKVDelegate:
             @param identity - worker_id of Singleton or enclave_id of a WPE
         """
         self._kv_helper.csv_append("worker-pool", worker_id, identity)
+
+    def register_endpoint(self, identity, zmq_url):
+        """
+        Function to publish the url of the ZMQ socket an enclave manager
+        processes work orders on synchronously. Listeners find it through
+        the worker-pool mapping to send it work orders.
+
+        Parameters:
+            @param identity - worker_id of Singleton or enclave_id of a WPE
+            @param zmq_url - Url listeners reach the socket at
+        """
+        logger.info("Registering %s as endpoint of %s", zmq_url, identity)
+        return self._kv_helper.set("worker-endpoints", identity, zmq_url)
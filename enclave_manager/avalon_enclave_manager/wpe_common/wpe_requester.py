@@ -55,7 +55,9 @@ class WPERequester():
             logger.error("Kv Storage path is missing")
             sys.exit(-1)
         try:
-            kv_helper = connector.open(config['KvStorage']['remote_url'])
+            kv_helper = connector.open(
+                config['KvStorage']['remote_url'],
+                config['KvStorage'].get('connection_pool_size'))
         except Exception as err:
             logger.error("Failed to open KV storage interface; " +
                          "exiting Intel SGX Enclave manager: {}".format(err))
@@ -0,0 +1,195 @@
+# Copyright 2020 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import time
+import uuid
+import logging
+import itertools
+import threading
+
+import zmq
+
+logger = logging.getLogger(__name__)
+
+# Default number of milliseconds to wait for an enclave manager to
+# process a work order
+DEFAULT_ZMQ_TIMEOUT_MSECS = 60000
+# Number of seconds an enclave manager that did not reply in time is
+# passed over, unless no other one is left
+DOWN_SECS = 30
+
+# XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+# XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+
+
+class EnclaveManagerChannel():
+    """
+    EnclaveManagerChannel sends work orders to be processed synchronously
+    to enclave managers over long-lived ZMQ DEALER sockets, one per
+    enclave manager. Each request carries an id that the enclave manager
+    ROUTER socket sends back with the reply, so any number of work orders
+    can be outstanding at once, from any thread.
+
+    Each work order goes to the enclave manager with the fewest requests
+    outstanding among the ones it may be sent to. An enclave manager that
+    does not reply in time is passed over for a while, so that work
+    orders fail over to the others.
+
+    The DEALER sockets are only used by an I/O thread. Callers hand their
+    requests to it over an inproc socket of their own.
+    """
+
+    # ------------------------------------------------------------------------------------------------
+    def __init__(self, timeout_msecs=DEFAULT_ZMQ_TIMEOUT_MSECS):
+        """
+        Parameters:
+            - timeout_msecs is the maximum number of milliseconds to wait
+              for a reply
+        """
+        self.timeout_msecs = int(timeout_msecs)
+        self.__context = zmq.Context.instance()
+        # request id -> [event set on reply, reply, url]
+        self.__pending = {}
+        # url -> number of requests outstanding
+        self.__outstanding = {}
+        # url -> time until which it is passed over
+        self.__down_until = {}
+        self.__turn = itertools.count()
+        self.__lock = threading.Lock()
+        self.__local = threading.local()
+        self.__inproc_url = "inproc://enclave-manager-channel-" + \
+            uuid.uuid4().hex
+
+        requests = self.__context.socket(zmq.PULL)
+        requests.bind(self.__inproc_url)
+        thread = threading.Thread(
+            target=self.__run, args=(requests,),
+            name="EnclaveManagerChannel", daemon=True)
+        thread.start()
+
+    # ------------------------------------------------------------------------------------------------
+    def process(self, wo_id, zmq_urls, timeout_msecs=0):
+        """
+        Function to have an enclave manager process a work order and
+        wait for it to be done
+        Parameters:
+            - wo_id is the id of the work order, scheduled already
+            - zmq_urls is the list of urls of the enclave managers that
+              may process it
+            - timeout_msecs is the maximum number of milliseconds to wait,
+              capped by the channel's. 0 waits as long as the channel's.
+        Returns the reply of the enclave manager, None if it did not reply
+        in time
+        """
+        if timeout_msecs <= 0 or timeout_msecs > self.timeout_msecs:
+            timeout_msecs = self.timeout_msecs
+        request_id = uuid.uuid4().hex
+        with self.__lock:
+            url = self.__pick(zmq_urls)
+            waiter = [threading.Event(), None, url]
+            self.__pending[request_id] = waiter
+            self.__outstanding[url] = self.__outstanding.get(url, 0) + 1
+
+        self.__sender().send_multipart(
+            [request_id.encode(), url.encode(), wo_id.encode()])
+        replied = waiter[0].wait(timeout_msecs / 1000.0)
+        with self.__lock:
+            self.__pending.pop(request_id, None)
+            self.__outstanding[url] -= 1
+            if not replied:
+                self.__down_until[url] = time.time() + DOWN_SECS
+        if not replied:
+            logger.error("Enclave manager %s did not process work order " +
+                         "%s within %d msecs", url, wo_id, timeout_msecs)
+            return None
+        return waiter[1]
+
+    def __pick(self, zmq_urls):
+        """
+        Function to choose the enclave manager to send a work order to,
+        ties are broken in turn
+        """
+        now = time.time()
+        candidates = [url for url in zmq_urls
+                      if self.__down_until.get(url, 0) <= now] or zmq_urls
+        start = next(self.__turn) % len(candidates)
+        candidates = candidates[start:] + candidates[:start]
+        return min(candidates, key=lambda url: self.__outstanding.get(url, 0))
+
+    def __sender(self):
+        """
+        Function to get the socket of the calling thread to hand requests
+        to the I/O thread, ZMQ sockets are not to be shared by threads
+        """
+        sender = getattr(self.__local, "sender", None)
+        if sender is None:
+            sender = self.__context.socket(zmq.PUSH)
+            sender.setsockopt(zmq.LINGER, 0)
+            sender.connect(self.__inproc_url)
+            self.__local.sender = sender
+        return sender
+
+    # ------------------------------------------------------------------------------------------------
+    def __run(self, requests):
+        """
+        Function run by the I/O thread to forward requests to the enclave
+        managers and their replies to the waiting callers
+        """
+        # url -> DEALER socket connected to it
+        dealers = {}
+        poller = zmq.Poller()
+        poller.register(requests, zmq.POLLIN)
+        while True:
+            events = dict(poller.poll())
+            if requests in events:
+                request_id, url, wo_id = requests.recv_multipart()
+                dealer = dealers.get(url)
+                if dealer is None:
+                    dealer = self.__context.socket(zmq.DEALER)
+                    dealer.setsockopt(zmq.LINGER, 0)
+                    dealer.connect(url.decode())
+                    dealers[url] = dealer
+                    poller.register(dealer, zmq.POLLIN)
+                try:
+                    # Empty delimiter frame as sent by a REQ socket
+                    dealer.send_multipart(
+                        [b"", request_id, wo_id], flags=zmq.NOBLOCK)
+                except zmq.Again:
+                    logger.error("Enclave manager %s cannot take work " +
+                                 "order %s", url.decode(), wo_id.decode())
+            for dealer in dealers.values():
+                if dealer in events:
+                    self.__on_reply(dealer.recv_multipart())
+
+    def __on_reply(self, frames):
+        """
+        Function to hand a reply, [b"", request id, reply], to the caller
+        waiting for it
+        """
+        if len(frames) != 3:
+            logger.error("Invalid reply from enclave manager")
+            return
+        with self.__lock:
+            waiter = self.__pending.pop(frames[1].decode(), None)
+            if waiter is not None:
+                self.__down_until.pop(waiter[2], None)
+        if waiter is None:
+            # The caller stopped waiting
+            logger.warn("Late reply from enclave manager: %s",
+                        frames[2].decode())
+            return
+        waiter[1] = frames[2].decode()
+        waiter[0].set()
+
+# ------------------------------------------------------------------------------------------------
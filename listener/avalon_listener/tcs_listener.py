@@ -31,22 +31,37 @@ import argparse
 import schema_validation.validate as Validator
 
 from urllib.parse import urlparse
-from avalon_listener.tcs_work_order_handler import TCSWorkOrderHandler
+from twisted.internet import reactor, threads
+from twisted.python.threadpool import ThreadPool
+from avalon_listener.tcs_work_order_handler import \
+    TCSWorkOrderHandler, DEFAULT_PURGE_BATCH_SIZE
 from avalon_listener.tcs_work_order_handler_sync import TCSWorkOrderHandlerSync
+from avalon_listener.tcs_enclave_manager_channel import \
+    DEFAULT_ZMQ_TIMEOUT_MSECS
+from avalon_listener.tcs_work_order_retention import TCSWorkOrderRetention
+from avalon_listener.tcs_work_order_result_waiter import \
+    TCSWorkOrderResultWaiter, DEFAULT_MAX_RESULT_WAITERS, \
+    DEFAULT_MAX_RESULT_WAIT_MSECS
+from avalon_listener.tcs_worker_cache import WorkerCache, \
+    DEFAULT_WORKER_CACHE_SIZE, DEFAULT_WORKER_CACHE_TTL_SECS, \
+    DEFAULT_WORKER_REFRESH_SECS
 from avalon_listener.tcs_worker_registry_handler \
     import TCSWorkerRegistryHandler
 from avalon_listener.tcs_workorder_receipt_handler \
-    import TCSWorkOrderReceiptHandler
+    import TCSWorkOrderReceiptHandler, DEFAULT_RECEIPT_PAGE_SIZE
 from avalon_listener.tcs_worker_encryption_key_handler \
     import WorkerEncryptionKeyHandler
 from database import connector
-from listener.base_jrpc_listener \
-    import BaseJRPCListener, parse_bind_url, get_config_dir
-from jsonrpc import JSONRPCResponseManager
-from error_code.error_status import JRPCErrorCodes
+from listener.base_jrpc_listener import BaseJRPCListener, \
+    parse_bind_url, get_config_dir, start_processes
+from error_code.error_status import JRPCErrorCodes, WorkOrderStatus
 
 logger = logging.getLogger(__name__)
 
+# Default number of threads handling requests, 0 to handle them on the
+# reactor thread
+DEFAULT_REQUEST_THREADS = 8
+
 # XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
 # XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
 
@@ -64,29 +79,88 @@ class TCSListener(BaseJRPCListener):
     isLeaf = True
 
     # -----------------------------------------------------------------
-    def __init__(self, config):
+    def __init__(self, config, recover=True, retention=True):
+        """
+        Parameters :
+            config - Listener configuration
+            recover - False if the work orders stored were already
+                      recovered, by the process starting this one
+            retention - False if another listener process removes the
+                        processed work orders
+        """
         try:
-            self.kv_helper = \
-                connector.open(config['KvStorage']['remote_storage_url'])
+            self.kv_helper = connector.open(
+                config['KvStorage']['remote_storage_url'],
+                config['KvStorage'].get('connection_pool_size'))
         except Exception as err:
             logger.error(f"failed to open db: {err}")
             sys.exit(-1)
 
-        self.worker_registry_handler = TCSWorkerRegistryHandler(self.kv_helper)
+        # Compile the request schemas before serving the first request
+        Validator.load_schemas()
+
+        # Requests are handled on a bounded thread pool so that a slow
+        # call to the KV storage does not hold up the other clients
+        self.__pool = None
+        request_threads = int(config["Listener"].get(
+            "request_threads", DEFAULT_REQUEST_THREADS))
+        if request_threads > 0:
+            self.__pool = ThreadPool(
+                minthreads=0, maxthreads=request_threads,
+                name="TCSListener")
+            reactor.callWhenRunning(self.__pool.start)
+            reactor.addSystemEventTrigger(
+                "during", "shutdown", self.__pool.stop)
+
+        # Workers are cached for the handlers answering worker requests
+        self.worker_cache = WorkerCache(
+            self.kv_helper,
+            config["Listener"].get(
+                "worker_cache_size", DEFAULT_WORKER_CACHE_SIZE),
+            config["Listener"].get(
+                "worker_cache_ttl_secs", DEFAULT_WORKER_CACHE_TTL_SECS),
+            config["Listener"].get(
+                "worker_index_refresh_secs", DEFAULT_WORKER_REFRESH_SECS))
+        self.worker_registry_handler = TCSWorkerRegistryHandler(
+            self.kv_helper, self.worker_cache)
+        purge_batch_size = config["Listener"].get(
+            "work_order_purge_batch_size", DEFAULT_PURGE_BATCH_SIZE)
         if int(config["WorkloadExecution"]["sync_workload_execution"]) == 1:
             self.workorder_handler = TCSWorkOrderHandlerSync(
                 self.kv_helper,
                 config["Listener"]["max_work_order_count"],
-                config["Listener"]["zmq_url"])
+                config["Listener"]["zmq_url"],
+                purge_batch_size, recover,
+                config["Listener"].get(
+                    "zmq_timeout_msecs", DEFAULT_ZMQ_TIMEOUT_MSECS))
         else:
             self.workorder_handler = TCSWorkOrderHandler(
                 self.kv_helper,
-                config["Listener"]["max_work_order_count"])
+                config["Listener"]["max_work_order_count"],
+                purge_batch_size, recover)
+
+        # Processed work orders are removed in the background
+        self.workorder_retention = TCSWorkOrderRetention(
+            self.kv_helper, self.workorder_handler,
+            config.get("Retention", {}))
+        if retention:
+            self.workorder_retention.start()
+
+        # WorkOrderGetResult requests may wait for a pending result
+        self.workorder_result_waiter = TCSWorkOrderResultWaiter(
+            config['KvStorage']['remote_storage_url'],
+            config["Listener"].get(
+                "max_result_waiters", DEFAULT_MAX_RESULT_WAITERS),
+            config["Listener"].get(
+                "max_result_wait_msecs", DEFAULT_MAX_RESULT_WAIT_MSECS))
 
         self.workorder_receipt_handler = TCSWorkOrderReceiptHandler(
-            self.kv_helper)
+            self.kv_helper,
+            config["Listener"].get(
+                "receipt_lookup_page_size", DEFAULT_RECEIPT_PAGE_SIZE),
+            recover)
         self.worker_encryption_key_handler = WorkerEncryptionKeyHandler(
-            self.kv_helper)
+            self.kv_helper, self.worker_cache)
 
         rpc_methods = [
             self.worker_encryption_key_handler.EncryptionKeyGet,
@@ -110,12 +184,34 @@ class TCSListener(BaseJRPCListener):
     def _process_request(self, input_json_str):
         """
         Overridden method to dispatch to appropriate rpc method with
-        added schema and request validation
+        added schema and request validation. Requests are handled on the
+        thread pool if there is one.
+
+        Parameters :
+            input_json_str - JSON formatted str of the request
+        Returns :
+            response - data field from the response received which is a dict,
+                       or a Deferred firing with it
+        """
+        if self.__pool is None:
+            return self.__wait_if_pending(
+                *self.__handle_request(input_json_str))
+        deferred = threads.deferToThreadPool(
+            reactor, self.__pool, self.__handle_request, input_json_str)
+        return deferred.addCallback(
+            lambda result: self.__wait_if_pending(*result))
+
+# -----------------------------------------------------------------
+
+    def __handle_request(self, input_json_str):
+        """
+        Validate a request and dispatch it to its rpc method
 
         Parameters :
             input_json_str - JSON formatted str of the request
         Returns :
-            response - data field from the response received which is a dict
+            tuple of the decoded request, None if invalid, the request
+            str and the data field of the response
         """
         response = {}
         response['error'] = {}
@@ -138,13 +234,50 @@ class TCSListener(BaseJRPCListener):
             logger.error("Exception while processing Json: %s", str(err))
             response["error"]["message"] = \
                 "{}".format(str(err))
+            return None, input_json_str, response
+
+        return input_json, input_json_str, \
+            self._dispatch(input_json, input_json_str)
+
+# -----------------------------------------------------------------
+
+    def __wait_if_pending(self, input_json, input_json_str, response):
+        """
+        Hold the response to a WorkOrderGetResult willing to wait until
+        the result is in or the wait expired. Runs on the reactor thread.
+
+        Returns :
+            response - data field of the response, or a Deferred firing
+                       with the one to send after the wait
+        """
+        if input_json is None or \
+                not self.__is_pending_result(input_json, response):
             return response
 
-        # save the full json for WorkOrderSubmit
-        input_json["params"]["raw"] = input_json_str
-        data = json.dumps(input_json).encode('utf-8')
-        response = JSONRPCResponseManager.handle(data, self.dispatcher)
-        return response.data
+        deferred = self.workorder_result_waiter.wait(
+            input_json["params"]["workOrderId"],
+            input_json["params"]["waitMsecs"])
+        if deferred is None:
+            return response
+        # Answer again once the result is in or the wait expired
+        if self.__pool is None:
+            return deferred.addCallback(
+                lambda _: self._dispatch(input_json, input_json_str))
+        return deferred.addCallback(
+            lambda _: threads.deferToThreadPool(
+                reactor, self.__pool, self._dispatch,
+                input_json, input_json_str))
+
+# -----------------------------------------------------------------
+
+    def __is_pending_result(self, input_json, response):
+        """
+        Check if a response is to a WorkOrderGetResult willing to wait
+        whose work order is still pending
+        """
+        return input_json["method"] == "WorkOrderGetResult" and \
+            input_json["params"].get("waitMsecs", 0) > 0 and \
+            response.get("error", {}).get("code") == WorkOrderStatus.PENDING
 
 # -----------------------------------------------------------------
 # -----------------------------------------------------------------
@@ -212,10 +345,12 @@ def parse_command_line(config, args):
                 config["Listener"].get("zmq_url") is None:
             logger.error("Quit : no zmq_url config found for Listener")
             sys.exit(-1)
-        parse_res = urlparse(options.zmq_url)
-        if parse_res.scheme != "tcp" or parse_res.port == "":
-            logger.error("Invalid zmq url. It should be tcp://<host>:<port>")
-            sys.exit(-1)
+        for zmq_url in options.zmq_url.split(","):
+            parse_res = urlparse(zmq_url.strip())
+            if parse_res.scheme != "tcp" or parse_res.port == "":
+                logger.error(
+                    "Invalid zmq url. It should be tcp://<host>:<port>")
+                sys.exit(-1)
         config["Listener"]["zmq_url"] = options.zmq_url
 
     return host_name, port
@@ -224,6 +359,27 @@ def parse_command_line(config, args):
 # -----------------------------------------------------------------
 
 
+def recover_work_orders(config):
+    """
+    Recover the work orders and index the receipts stored before listener
+    processes are started, so that none of them serves requests while it
+    is being done
+    """
+    try:
+        kv_helper = connector.open(
+            config['KvStorage']['remote_storage_url'])
+    except Exception as err:
+        logger.error(f"failed to open db: {err}")
+        sys.exit(-1)
+    # The handlers recover the work orders and receipts when created
+    TCSWorkOrderHandler(kv_helper, config["Listener"]["max_work_order_count"])
+    TCSWorkOrderReceiptHandler(kv_helper)
+    kv_helper.close()
+
+# -----------------------------------------------------------------
+# -----------------------------------------------------------------
+
+
 def main(args=None):
     import config.config as pconfig
     import utility.logger as plogger
@@ -235,6 +391,10 @@ def main(args=None):
     parser = argparse.ArgumentParser()
     parser.add_argument('--config', help='configuration file', nargs='+')
     parser.add_argument('--config-dir', help='configuration folder', nargs='+')
+    # Set when started by start_processes
+    parser.add_argument('--listen-fd', type=int, help=argparse.SUPPRESS)
+    parser.add_argument(
+        '--process-index', type=int, default=0, help=argparse.SUPPRESS)
     (options, remainder) = parser.parse_known_args(args)
 
     if options.config:
@@ -256,8 +416,20 @@ def main(args=None):
         logging.getLogger('STDERR'), logging.WARN)
 
     host_name, port = parse_command_line(config, remainder)
-    tcs_listener = TCSListener(config)
-    tcs_listener.start(host_name, port)
+    processes = int(config["Listener"].get("processes", 1))
+    if options.listen_fd is not None:
+        # One of several listener processes, the first one removes the
+        # processed work orders
+        tcs_listener = TCSListener(
+            config, recover=False, retention=options.process_index == 0)
+        tcs_listener.start(host_name, port, options.listen_fd)
+    elif processes > 1:
+        recover_work_orders(config)
+        start_processes(host_name, port, processes,
+                        [sys.executable] + sys.argv)
+    else:
+        tcs_listener = TCSListener(config)
+        tcs_listener.start(host_name, port)
 
 
 main()
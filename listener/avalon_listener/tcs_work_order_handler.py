@@ -23,9 +23,67 @@ from avalon_sdk.connector.direct.jrpc.jrpc_util import JsonRpcErrorCode
 import schema_validation.validate as Validator
 
 from jsonrpc.exceptions import JSONRPCDispatchException
+from avalon_listener.tcs_workorder_receipt_index import remove_from_indexes
 
 logger = logging.getLogger(__name__)
 
+# Number of processed work orders removed at once when the work order
+# count reaches its maximum
+DEFAULT_PURGE_BATCH_SIZE = 10
+# Queue of work order ids whose result was fetched with WorkOrderGetResult
+FETCHED_TABLE = "wo-fetched"
+FETCHED_KEY = "work-orders"
+# Counter of the work orders stored, shared by all listener processes
+COUNTER_TABLE = "wo-counters"
+COUNTER_KEY = "work-orders"
+# Number of work orders left behind removed at once on boot
+RECOVERY_BATCH_SIZE = 100
+
+
+def remove_processed_work_orders(kv_helper, worker_id, wo_ids):
+    """
+    Remove processed work orders from all tables in a single transaction
+    Parameters:
+        - kv_helper is a object of lmdb database
+        - worker_id is the worker that processed the work orders
+        - wo_ids is a list of ids read from the wo-worker-processed queue
+          of the worker
+    Returns the number of work orders removed. Those no longer queued,
+    i.e.- removed meanwhile by someone else, are not counted.
+    """
+    if len(wo_ids) == 0:
+        return 0
+
+    receipts = _get_receipts(kv_helper, wo_ids)
+    transaction = kv_helper.transaction()
+    for wo_id in wo_ids:
+        transaction.queue_remove("wo-worker-processed", worker_id, wo_id) \
+            .queue_remove(FETCHED_TABLE, FETCHED_KEY, wo_id) \
+            .remove("wo-requests", wo_id) \
+            .remove("wo-responses", wo_id) \
+            .remove("wo-receipts", wo_id) \
+            .remove("wo-receipt-updates", wo_id) \
+            .remove("wo-timestamps", wo_id)
+    for wo_id, receipt in receipts:
+        remove_from_indexes(transaction, wo_id, receipt)
+    results = transaction.execute()
+    if results is None:
+        return 0
+    return results[0:7 * len(wo_ids):7].count(True)
+
+
+def _get_receipts(kv_helper, wo_ids):
+    """
+    Get the receipts of work orders, to remove their index entries
+    Returns the list of (work order id, receipt) of those having one
+    """
+    batch = kv_helper.batch()
+    for wo_id in wo_ids:
+        batch.get("wo-receipts", wo_id)
+    return [(wo_id, receipt) for wo_id, receipt
+            in zip(wo_ids, batch.execute()) if receipt is not None]
+
+
 # XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
 # XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
 
@@ -44,74 +102,264 @@ class TCSWorkOrderHandler:
     """
 # ------------------------------------------------------------------------------------------------
 
-    def __init__(self, kv_helper, max_wo_count):
+    def __init__(self, kv_helper, max_wo_count,
+                 purge_batch_size=DEFAULT_PURGE_BATCH_SIZE, recover=True):
         """
         Function to perform init activity
         Parameters:
             - kv_helper is a object of lmdb database
+            - max_wo_count is the maximum number of work orders stored
+            - purge_batch_size is the number of processed work orders
+              removed at once when max_wo_count is reached
+            - recover is False if the work orders stored were already
+              recovered, by another listener process
         """
 
         self.kv_helper = kv_helper
-        self.workorder_count = 0
         self.max_workorder_count = max_wo_count
-        self.workorder_list = []
-        self.__work_order_handler_on_boot()
+        self.purge_batch_size = max(1, int(purge_batch_size))
+        # Set when work orders are to be removed once their result is
+        # fetched, see TCSWorkOrderRetention
+        self.record_fetched = False
+        if recover:
+            self.__work_order_handler_on_boot()
 
 # ---------------------------------------------------------------------------------------------
     def __work_order_handler_on_boot(self):
         """
-        Function to perform on-boot process of work order handler
+        Function to perform on-boot process of work order handler. Work
+        orders that are neither scheduled, in processing nor processed are
+        removed and the others are counted. It takes a few requests to the
+        KV storage plus two per RECOVERY_BATCH_SIZE work orders removed.
         """
 
         work_orders = self.kv_helper.lookup("wo-timestamps")
         # Lookup all workers.
         workers = self.kv_helper.lookup("worker-pool")
-        pending_wo_ids = []
-        processed_wo_ids = []
-        processing_wo_ids = []
+        self.__migrate_csv_queues(workers)
+        known_wo_ids = self.__known_work_orders(workers)
+
+        orphans = [wo_id for wo_id in work_orders
+                   if wo_id not in known_wo_ids]
+        for i in range(0, len(orphans), RECOVERY_BATCH_SIZE):
+            wo_ids = orphans[i:i + RECOVERY_BATCH_SIZE]
+            receipts = _get_receipts(self.kv_helper, wo_ids)
+            batch = self.kv_helper.batch()
+            for wo_id in wo_ids:
+                batch.remove("wo-requests", wo_id) \
+                    .remove("wo-responses", wo_id) \
+                    .remove("wo-receipts", wo_id) \
+                    .remove("wo-receipt-updates", wo_id) \
+                    .remove("wo-timestamps", wo_id)
+            for wo_id, receipt in receipts:
+                remove_from_indexes(batch, wo_id, receipt)
+            batch.execute()
+        if len(orphans) != 0:
+            logger.info("Removed %d work orders left behind", len(orphans))
+
+        workorder_count = len(work_orders) - len(orphans)
+        self.kv_helper.set(COUNTER_TABLE, COUNTER_KEY, str(workorder_count))
 
-        # Get the pending/processed/processing list of work order for each
-        # worker and collate them into respective lists
+# ---------------------------------------------------------------------------------------------
+    def __known_work_orders(self, workers):
+        """
+        Function to get the ids of the work orders scheduled, in processing
+        or processed by any worker
+        Parameters:
+            - workers is the list of worker ids
+        Returns the set of work order ids
+        """
+        if len(workers) == 0:
+            return set()
+
+        # Get the pending/processed list of work orders and the processing
+        # identities of every worker at once. The identities could be WPE
+        # enclave_id or worker_id itself (for Singleton).
+        batch = self.kv_helper.batch()
         for worker in workers:
-            wo_ids_csv = self.kv_helper.get("wo-worker-scheduled", worker)
-            wo_ids = [] if wo_ids_csv is None else wo_ids_csv.split(",")
-            pending_wo_ids.extend(wo_ids)
+            batch.queue_list("wo-worker-scheduled", worker) \
+                .queue_list("wo-worker-processed", worker) \
+                .get("worker-pool", worker)
+        results = batch.execute()
+
+        known_wo_ids = set()
+        processors = []
+        for pending, processed, processors_csv in zip(
+                results[0::3], results[1::3], results[2::3]):
+            known_wo_ids.update(pending)
+            known_wo_ids.update(processed)
+            if processors_csv is not None:
+                processors.extend(processors_csv.split(","))
+
+        if len(processors) != 0:
+            batch = self.kv_helper.batch()
+            for processor in processors:
+                batch.get("wo-worker-processing", processor)
+            for processing_csv in batch.execute():
+                # Enclave managers executing several work orders at once
+                # store them as a comma separated value
+                if processing_csv is not None:
+                    known_wo_ids.update(processing_csv.split(","))
+        return known_wo_ids
 
-            wo_ids_csv = self.kv_helper.get("wo-worker-processed", worker)
-            wo_ids = [] if wo_ids_csv is None else wo_ids_csv.split(",")
-            processed_wo_ids.extend(wo_ids)
+# ---------------------------------------------------------------------------------------------
+    def __migrate_csv_queues(self, workers):
+        """
+        Function to move work order ids that older releases stored as a
+        comma separated value per worker into the queues now used for
+        wo-worker-scheduled and wo-worker-processed
+        Parameters:
+            - workers is the list of worker ids
+        """
+        for table in ["wo-worker-scheduled", "wo-worker-processed"]:
+            for worker in workers:
+                wo_ids_csv = self.kv_helper.get(table, worker)
+                if wo_ids_csv is None:
+                    continue
+                transaction = self.kv_helper.transaction()
+                transaction.remove(table, worker)
+                for wo_id in wo_ids_csv.split(","):
+                    transaction.queue_push(table, worker, wo_id)
+                if transaction.execute() is not None:
+                    logger.info("Migrated %s of worker %s to a queue",
+                                table, worker)
 
-            # Get all processing identities from worker-pool. The identities
-            # could be WPE enclave_id or worker_id itself (for Singleton).
-            processors_csv = self.kv_helper.get("worker-pool", worker)
-            if processors_csv is not None:
-                for processor in processors_csv.split(","):
-                    processing_wo_id = self.kv_helper.get(
-                        "wo-worker-processing", processor)
-                    if processing_wo_id is not None:
-                        processing_wo_ids.append(processing_wo_id)
+# ---------------------------------------------------------------------------------------------
+    def _purge_processed_work_orders(self, worker_id):
+        """
+        Function to make room for new work orders by removing the oldest
+        processed ones. wo-worker-processed queues hold work orders in
+        the order they completed, so the oldest are at their heads.
+        Work orders processed by the given worker are removed first and
+        those of other workers only if it has too few.
+        Parameters:
+            - worker_id is the worker the new work order is submitted to
+        Returns the number of work orders removed
+        """
+        purged = self.__purge_worker_processed(
+            worker_id, self.purge_batch_size)
+        if purged < self.purge_batch_size:
+            for worker in self.kv_helper.lookup("worker-pool"):
+                if worker == worker_id:
+                    continue
+                purged += self.__purge_worker_processed(
+                    worker, self.purge_batch_size - purged)
+                if purged >= self.purge_batch_size:
+                    break
+        logger.info("Purged %d processed work orders from database", purged)
+        return purged
 
-        for wo_id in work_orders:
+# ---------------------------------------------------------------------------------------------
+    def __purge_worker_processed(self, worker_id, count):
+        """
+        Function to remove up to count of the oldest work orders processed
+        by a worker, all in a single transaction
+        Returns the number of work orders removed
+        """
+        wo_ids = self.kv_helper.queue_list(
+            "wo-worker-processed", worker_id, count)
+        purged = remove_processed_work_orders(
+            self.kv_helper, worker_id, wo_ids)
+        if purged > 0:
+            self.update_workorder_count(-purged)
+        return purged
 
-            if wo_id not in pending_wo_ids and wo_id not in processed_wo_ids \
-                    and wo_id not in processing_wo_ids:
+# ---------------------------------------------------------------------------------------------
+    def get_workorder_count(self):
+        """
+        Function to read the number of work orders stored, including the
+        ones being submitted by any of the listener processes, from the
+        KV storage
+        Returns the count
+        """
+        value = self.kv_helper.get(COUNTER_TABLE, COUNTER_KEY)
+        try:
+            return int(value) if value is not None else 0
+        except ValueError:
+            return 0
 
-                if(self.kv_helper.get("wo-requests", wo_id) is not None):
-                    self.kv_helper.remove("wo-requests", wo_id)
+# ---------------------------------------------------------------------------------------------
+    def update_workorder_count(self, delta):
+        """
+        Function to add delta to the number of work orders stored. The
+        count lives in the KV storage so that it is shared by all the
+        listener processes.
+        Returns the new count, None on error
+        """
+        return self.kv_helper.counter_add(COUNTER_TABLE, COUNTER_KEY, delta)
 
-                if(self.kv_helper.get("wo-responses", wo_id) is not None):
-                    self.kv_helper.remove("wo-responses", wo_id)
+# ---------------------------------------------------------------------------------------------
+    def _store_work_order(self, wo_id, worker_id, input_json_str, data):
+        """
+        Function to store a new work order to be processed by a worker.
+        A slot in the work order count is reserved first, so that
+        max_workorder_count holds with several listener processes
+        accepting work orders at once.
+        Parameters:
+            - wo_id is the id of the new work order
+            - worker_id is the worker the work order is submitted to
+            - input_json_str is the work order request
+            - data is the data field of the errors raised
+        Raises JSONRPCDispatchException if the work order is not stored
+        """
+        count = self.update_workorder_count(1)
+        if count is None:
+            raise JSONRPCDispatchException(
+                WorkOrderStatus.UNKNOWN_ERROR,
+                "Failed to update the work order count",
+                data)
+        try:
+            if count > self.max_workorder_count:
+                # if max count reached clear a batch of processed entries
+                self._purge_processed_work_orders(worker_id)
+
+                # If no work order is processed then return busy
+                if self.get_workorder_count() > self.max_workorder_count:
+                    raise JSONRPCDispatchException(
+                        WorkOrderStatus.BUSY,
+                        "Work order handler is busy updating the result",
+                        data)
 
-                if(self.kv_helper.get("wo-receipts", wo_id) is not None):
-                    self.kv_helper.remove("wo-receipts", wo_id)
+            # Create a new work order entry.
+            # All tables are updated in a single transaction so that a
+            # restart of the TCS never sees a partially created entry.
+            # The transaction is aborted if the work order id already
+            # exists, which also holds for concurrent submissions of it.
+            # Add entry to wo-worker-scheduled which holds a queue of all
+            # the work order ids to be processed by corresponding worker.
+            # i.e. - <worker_id> -> <wo_id>,<wo_id>,<wo_id>...
+            epoch_time = str(time.time())
 
-                # TODO: uncomment after fixing lmbd error
-                self.kv_helper.remove("wo-timestamps", wo_id)
+            # Update the tables
+            if self.kv_helper.transaction() \
+                    .set_new("wo-timestamps", wo_id, epoch_time) \
+                    .set("wo-requests", wo_id, input_json_str) \
+                    .queue_push("wo-worker-scheduled", worker_id, wo_id) \
+                    .execute() is None:
+                if self.kv_helper.get("wo-timestamps", wo_id) is not None:
+                    # Workorder id already exists
+                    raise JSONRPCDispatchException(
+                        WorkOrderStatus.INVALID_PARAMETER_FORMAT_OR_VALUE,
+                        "Work order id already exists in the database. "
+                        + "Hence invalid parameter",
+                        data)
+                raise JSONRPCDispatchException(
+                    WorkOrderStatus.UNKNOWN_ERROR,
+                    "Failed to store the work order in the database",
+                    data)
+        except Exception:
+            # Give the slot reserved back, whatever went wrong
+            self.update_workorder_count(-1)
+            raise
 
-            else:
-                # Add to the internal FIFO
-                self.workorder_list.append(wo_id)
-                self.workorder_count += 1
+# ---------------------------------------------------------------------------------------------
+    def _record_fetched(self, wo_id):
+        """
+        Function to remember that the result of a work order was fetched,
+        if needed by the retention policy
+        """
+        if self.record_fetched:
+            self.kv_helper.queue_push(FETCHED_TABLE, FETCHED_KEY, wo_id)
 
 # ---------------------------------------------------------------------------------------------
     def _is_worker_exists(self, worker_id):
@@ -138,8 +386,7 @@ class TCSWorkOrderHandler:
         Returns jrpc response as defined in EEA spec 6.1.2
         """
 
-        input_json_str = params["raw"]
-        input_value_json = json.loads(input_json_str)
+        input_value_json = params["json"]
         valid, err_msg = \
             Validator.schema_validation(
                 "WorkOrderGetResult",
@@ -176,6 +423,7 @@ class TCSWorkOrderHandler:
                 data)
 
         # Worker order is processed and result is avalibale
+        self._record_fetched(wo_id)
         response = json.loads(value)
         if 'result' in response:
             return response['result']
@@ -211,7 +459,7 @@ class TCSWorkOrderHandler:
         """
         wo_id = params["workOrderId"]
         input_json_str = params["raw"]
-        input_value_json = json.loads(input_json_str)
+        input_value_json = params["json"]
         # Work order status payload should have
         # data filed with work order id as defined in EEA spec section 6.
         data = {
@@ -247,76 +495,11 @@ class TCSWorkOrderHandler:
                     "Invalid data format for requesterSignature",
                     data
                 )
-        if((self.workorder_count + 1) > self.max_workorder_count):
-            # Lookup all workers.
-            workers = self.kv_helper.lookup("worker-pool")
-            wo_worker_map = dict()
-            processed_wo_ids = []
-            for worker in workers:
-                # wo_ids_csv is a csv of work order ids retrieved from database
-                wo_ids_csv = self.kv_helper.get("wo-worker-processed", worker)
-                wo_ids = [] if wo_ids_csv is None else wo_ids_csv.split(",")
-                # Create a reverse map for search delete in wo-worker-processed
-                for w in wo_ids:
-                    wo_worker_map[w] = worker
-                processed_wo_ids.extend(wo_ids)
-
-            # if max count reached clear a processed entry
-            work_orders = self.kv_helper.lookup("wo-timestamps")
-            for id in work_orders:
-                # If work order is processed then remove from table
-                if id in processed_wo_ids:
-                    self.kv_helper.csv_search_delete(
-                        "wo-worker-processed", wo_worker_map[id], id)
-                    self.kv_helper.remove("wo-requests", id)
-                    self.kv_helper.remove("wo-responses", id)
-                    self.kv_helper.remove("wo-receipts", id)
-                    self.kv_helper.remove("wo-timestamps", id)
-
-                    self.workorder_list.remove(id)
-                    logger.info("Purged work order {} from database"
-                                .format(id))
-                    self.workorder_count -= 1
-                    # @TODO : Need to rethink if deleting just one entry
-                    # suffices as the operations performed are costly
-                    break
-
-            # If no work order is processed then return busy
-            if((self.workorder_count + 1) > self.max_workorder_count):
-                raise JSONRPCDispatchException(
-                    WorkOrderStatus.BUSY,
-                    "Work order handler is busy updating the result",
-                    data)
-
-        if(self.kv_helper.get("wo-timestamps", wo_id) is None):
-
-            # Create a new work order entry.
-            # Don't change the order of table updation.
-            # The order is important for clean up if the TCS is restarted in
-            # the middle.
-            # Add entry to wo-worker-scheduled which holds all the work order
-            # id separated by comma(csv) to be processed by corresponding
-            # worker. i.e. - <worker_id> -> <wo_id>,<wo_id>,<wo_id>...
-            epoch_time = str(time.time())
-
-            # Update the tables
-            self.kv_helper.set("wo-timestamps", wo_id, epoch_time)
-            self.kv_helper.set("wo-requests", wo_id, input_json_str)
-            self.kv_helper.csv_append("wo-worker-scheduled", worker_id, wo_id)
-            # Add to the internal FIFO
-            self.workorder_list.append(wo_id)
-            self.workorder_count += 1
-            raise JSONRPCDispatchException(
-                WorkOrderStatus.PENDING,
-                "Work order is computing. Please query for WorkOrderGetResult"
-                + " to view the result",
-                data)
-
-        # Workorder id already exists
+        self._store_work_order(wo_id, worker_id, input_json_str, data)
         raise JSONRPCDispatchException(
-            WorkOrderStatus.INVALID_PARAMETER_FORMAT_OR_VALUE,
-            "Work order id already exists in the database. "
-            + "Hence invalid parameter",
+            WorkOrderStatus.PENDING,
+            "Work order is computing. Please query for WorkOrderGetResult"
+            + " to view the result",
             data)
 
 # ---------------------------------------------------------------------------------------------
@@ -12,25 +12,27 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import time
 import json
+import time
 import logging
 
 import schema_validation.validate as Validator
 from error_code.error_status import WorkOrderStatus
 from error_code.enclave_error import EnclaveError
 from avalon_sdk.connector.direct.jrpc.jrpc_util import JsonRpcErrorCode
-from avalon_listener.tcs_work_order_handler import TCSWorkOrderHandler
+from avalon_listener.tcs_work_order_handler import \
+    TCSWorkOrderHandler, DEFAULT_PURGE_BATCH_SIZE
+from avalon_listener.tcs_enclave_manager_channel import \
+    EnclaveManagerChannel, DEFAULT_ZMQ_TIMEOUT_MSECS
 
 from jsonrpc.exceptions import JSONRPCDispatchException
 
-# ZeroMQ for sync workorder processing
-import zmq
-context = zmq.Context()
-# -------------------------------------------
-
 logger = logging.getLogger(__name__)
 
+# Number of seconds the enclave managers registered for a worker are
+# remembered before they are looked up again
+ENDPOINTS_REFRESH_SECS = 10
+
 # XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
 # XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
 
@@ -52,14 +54,31 @@ class TCSWorkOrderHandlerSync(TCSWorkOrderHandler):
     """
 # ------------------------------------------------------------------------------------------------
 
-    def __init__(self, kv_helper, max_wo_count, zmq_url):
+    def __init__(self, kv_helper, max_wo_count, zmq_url,
+                 purge_batch_size=DEFAULT_PURGE_BATCH_SIZE, recover=True,
+                 zmq_timeout_msecs=DEFAULT_ZMQ_TIMEOUT_MSECS):
         """
         Function to perform init activity
         Parameters:
             - kv_helper is a object of lmdb database
+            - max_wo_count is the maximum number of work orders stored
+            - zmq_url is the url of the enclave manager socket, or a
+              comma separated list of them, used for the workers whose
+              enclave managers registered no url
+            - purge_batch_size is the number of processed work orders
+              removed at once when max_wo_count is reached
+            - recover is False if the work orders stored were already
+              recovered, by another listener process
+            - zmq_timeout_msecs is the maximum number of milliseconds to
+              wait for an enclave manager to process a work order
         """
         self.zmq_url = zmq_url
-        super(TCSWorkOrderHandlerSync, self).__init__(kv_helper, max_wo_count)
+        self.__zmq_urls = [url.strip() for url in zmq_url.split(",")]
+        # worker id -> (time to look up again, urls of its enclave managers)
+        self.__endpoints = {}
+        self.__channel = EnclaveManagerChannel(zmq_timeout_msecs)
+        super(TCSWorkOrderHandlerSync, self).__init__(
+            kv_helper, max_wo_count, purge_batch_size, recover)
 
 # ---------------------------------------------------------------------------------------------
     def WorkOrderSubmit(self, **params):
@@ -72,7 +91,7 @@ class TCSWorkOrderHandlerSync(TCSWorkOrderHandler):
         """
         wo_id = params["workOrderId"]
         input_json_str = params["raw"]
-        input_value_json = json.loads(input_json_str)
+        input_value_json = params["json"]
 
         # Work order status payload should have
         # data filed with work order id as defined in EEA spec section 6.
@@ -100,90 +119,70 @@ class TCSWorkOrderHandlerSync(TCSWorkOrderHandler):
                 ),
                 data
             )
-        if((self.workorder_count + 1) > self.max_workorder_count):
-
-            # wo_ids is a csv of work order ids retrieved from database
-            wo_ids = self.kv_helper.get("wo-worker-processed", worker_id)
-            processed_wo_ids = [] if wo_ids is None else wo_ids.split(",")
-
-            # if max count reached clear a processed entry
-            work_orders = self.kv_helper.lookup("wo-timestamps")
-            for id in work_orders:
-                # If work order is processed then remove from table
-                if id in processed_wo_ids:
-                    self.kv_helper.csv_search_delete(
-                        "wo-worker-processed", worker_id, id)
-                    self.kv_helper.remove("wo-requests", id)
-                    self.kv_helper.remove("wo-responses", id)
-                    self.kv_helper.remove("wo-receipts", id)
-                    self.kv_helper.remove("wo-timestamps", id)
-
-                    self.workorder_list.remove(id)
-                    self.workorder_count -= 1
-                    break
-
-            # If no work order is processed then return busy
-            if((self.workorder_count + 1) > self.max_workorder_count):
-                raise JSONRPCDispatchException(
-                    WorkOrderStatus.BUSY,
-                    "Work order handler is busy updating the result",
-                    data)
-
-        if(self.kv_helper.get("wo-timestamps", wo_id) is None):
-            # Create a new work order entry.
-            # Don't change the order of table updates.
-            # The order is important for clean up if the TCS is restarted in
-            # the middle.
-            # Add entry to wo-worker-scheduled which holds all the work order
-            # id separated by comma(csv) to be processed by corresponding
-            # worker. i.e. - <worker_id> -> <wo_id>,<wo_id>,<wo_id>...
-            epoch_time = str(time.time())
-
-            # Update the tables
-            self.kv_helper.set("wo-timestamps", wo_id, epoch_time)
-            self.kv_helper.set("wo-requests", wo_id, input_json_str)
-            self.kv_helper.csv_append("wo-worker-scheduled", worker_id, wo_id)
-            # Add to the internal FIFO
-            self.workorder_list.append(wo_id)
-            self.workorder_count += 1
-            # ZeroMQ for sync workorder processing
-            try:
-                socket = context.socket(zmq.REQ)
-                socket.connect(self.zmq_url)
-                socket.send_string(wo_id, flags=0, encoding='utf-8')
-                replymessage = socket.recv()
-                logger.info(replymessage)
-                socket.disconnect(self.zmq_url)
-            except Exception as er:
-                raise JSONRPCDispatchException(
-                    WorkOrderStatus.UNKNOWN_ERROR,
-                    "Failed to connect with enclave-manager socket: " + er,
-                    data)
-            # Work order is processed. Fetch result from wo-response table
-            value = self.kv_helper.get("wo-responses", wo_id)
-            if value:
-                response = json.loads(value)
-                if 'result' in response:
-                    return response['result']
-
-                # response without result should have an error
-                # return error
-                err_code = response["error"]["code"]
-                err_msg = response["error"]["message"]
-                if err_code == EnclaveError.ENCLAVE_ERR_VALUE:
-                    err_code = \
-                            WorkOrderStatus.INVALID_PARAMETER_FORMAT_OR_VALUE
-                elif err_code == EnclaveError.ENCLAVE_ERR_UNKNOWN:
-                    err_code = WorkOrderStatus.UNKNOWN_ERROR
-                else:
-                    err_code = WorkOrderStatus.FAILED
-                raise JSONRPCDispatchException(err_code, err_msg, data)
-        else:
-            # Workorder id already exists
+        self._store_work_order(wo_id, worker_id, input_json_str, data)
+
+        # ZeroMQ for sync workorder processing
+        try:
+            replymessage = self.__channel.process(
+                wo_id, self.__manager_urls(worker_id),
+                input_value_json["params"].get("responseTimeoutMSecs", 0))
+            logger.info(replymessage)
+        except Exception as er:
+            raise JSONRPCDispatchException(
+                WorkOrderStatus.UNKNOWN_ERROR,
+                "Failed to connect with enclave-manager socket: " + str(er),
+                data)
+        if replymessage is None:
+            # The work order may still be processed, its result is then
+            # stored like that of an asynchronous one
             raise JSONRPCDispatchException(
-                WorkOrderStatus.INVALID_PARAMETER_FORMAT_OR_VALUE,
-                "Work order id already exists in the database. \
-                Hence invalid parameter",
+                WorkOrderStatus.PENDING,
+                "Work order is computing. Please query for WorkOrderGetResult"
+                + " to view the result",
                 data)
+        # Work order is processed. Fetch result from wo-response table
+        value = self.kv_helper.get("wo-responses", wo_id)
+        if value:
+            self._record_fetched(wo_id)
+            response = json.loads(value)
+            if 'result' in response:
+                return response['result']
+
+            # response without result should have an error
+            # return error
+            err_code = response["error"]["code"]
+            err_msg = response["error"]["message"]
+            if err_code == EnclaveError.ENCLAVE_ERR_VALUE:
+                err_code = \
+                    WorkOrderStatus.INVALID_PARAMETER_FORMAT_OR_VALUE
+            elif err_code == EnclaveError.ENCLAVE_ERR_UNKNOWN:
+                err_code = WorkOrderStatus.UNKNOWN_ERROR
+            else:
+                err_code = WorkOrderStatus.FAILED
+            raise JSONRPCDispatchException(err_code, err_msg, data)
+
+# ---------------------------------------------------------------------------------------------
+    def __manager_urls(self, worker_id):
+        """
+        Function to get the urls of the enclave managers processing the
+        work orders of a worker, as registered in worker-endpoints for
+        each member of its pool
+        """
+        cached = self.__endpoints.get(worker_id)
+        if cached is not None and cached[0] > time.time():
+            return cached[1]
+
+        urls = []
+        identities = self.kv_helper.get("worker-pool", worker_id)
+        if identities is not None:
+            batch = self.kv_helper.batch()
+            for identity in identities.split(","):
+                batch.get("worker-endpoints", identity)
+            urls = [url for url in batch.execute() if url is not None]
+        if len(urls) == 0:
+            urls = self.__zmq_urls
+        self.__endpoints[worker_id] = \
+            (time.time() + ENDPOINTS_REFRESH_SECS, urls)
+        return urls
 
 # ---------------------------------------------------------------------------------------------
@@ -0,0 +1,117 @@
+# Copyright 2020 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import time
+import logging
+
+from twisted.internet import reactor, threads
+from twisted.python.threadpool import ThreadPool
+from database import connector
+
+logger = logging.getLogger(__name__)
+
+# Default maximum number of WorkOrderGetResult requests waiting at once
+DEFAULT_MAX_RESULT_WAITERS = 16
+# Default maximum number of milliseconds a WorkOrderGetResult waits
+DEFAULT_MAX_RESULT_WAIT_MSECS = 30000
+
+# XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+# XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+
+
+class TCSWorkOrderResultWaiter():
+    """
+    TCSWorkOrderResultWaiter waits for the result of a pending work order
+    to be stored, on behalf of WorkOrderGetResult requests with waitMsecs.
+    Each wait is a long-poll on wo-responses in the KV storage, run in a
+    dedicated thread pool over dedicated connections so that neither the
+    reactor nor the other requests are held up. The number of waits at
+    once is bounded, requests beyond it are answered right away.
+    """
+
+    # ------------------------------------------------------------------------------------------------
+    def __init__(self, kv_url, max_waiters=DEFAULT_MAX_RESULT_WAITERS,
+                 max_wait_msecs=DEFAULT_MAX_RESULT_WAIT_MSECS):
+        """
+        Parameters:
+            - kv_url is the url of the KV storage
+            - max_waiters is the maximum number of waits at once,
+              0 disables waiting
+            - max_wait_msecs caps the waitMsecs of a request
+        """
+        self.max_waiters = max(0, int(max_waiters))
+        self.max_wait_msecs = max(0, int(max_wait_msecs))
+        self.__waiting = 0
+        if self.max_waiters == 0:
+            return
+
+        self.kv_helper = connector.open(kv_url, self.max_waiters)
+        self.__pool = ThreadPool(
+            minthreads=0, maxthreads=self.max_waiters,
+            name="TCSWorkOrderResultWaiter")
+        reactor.callWhenRunning(self.__pool.start)
+        reactor.addSystemEventTrigger("during", "shutdown", self.__pool.stop)
+
+    # ------------------------------------------------------------------------------------------------
+    def wait(self, wo_id, wait_msecs):
+        """
+        Function to wait for the result of a work order
+        Parameters:
+            - wo_id is the id of the pending work order
+            - wait_msecs is the waitMsecs of the request
+        Returns a Deferred firing once the result is stored or the wait
+        expired, None if the request is not to wait
+        """
+        wait_msecs = min(int(wait_msecs), self.max_wait_msecs)
+        if wait_msecs <= 0 or self.__waiting >= self.max_waiters:
+            return None
+
+        self.__waiting += 1
+        deferred = threads.deferToThreadPool(
+            reactor, self.__pool, self.__wait, wo_id, wait_msecs)
+        deferred.addBoth(self.__done)
+        return deferred
+
+    def __done(self, result):
+        self.__waiting -= 1
+        return result
+
+    # ------------------------------------------------------------------------------------------------
+    def __wait(self, wo_id, wait_msecs):
+        """
+        Function run in the thread pool to wait for the result. The wait
+        does not outlast the responseTimeoutMSecs of the work order.
+        """
+        request, timestamp = self.kv_helper.batch() \
+            .get("wo-requests", wo_id) \
+            .get("wo-timestamps", wo_id) \
+            .execute()
+        try:
+            timeout = int(json.loads(request)["params"].get(
+                "responseTimeoutMSecs", 0))
+            elapsed = (time.time() - float(timestamp)) * 1000
+        except (ValueError, KeyError, TypeError):
+            timeout = 0
+        if timeout > 0:
+            wait_msecs = min(wait_msecs, timeout - elapsed)
+        if wait_msecs <= 0:
+            return None
+
+        logger.debug("Waiting %d msecs for the result of work order %s",
+                     wait_msecs, wo_id)
+        return self.kv_helper.get_wait(
+            "wo-responses", wo_id, wait_msecs / 1000.0)
+
+# ------------------------------------------------------------------------------------------------
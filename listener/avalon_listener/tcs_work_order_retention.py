@@ -0,0 +1,262 @@
+# Copyright 2020 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import time
+import logging
+
+from twisted.internet import task, threads
+from avalon_listener.tcs_work_order_handler import \
+    remove_processed_work_orders, FETCHED_TABLE, FETCHED_KEY
+
+logger = logging.getLogger(__name__)
+
+# Default number of work orders removed in a single KV transaction
+DEFAULT_RETENTION_BATCH_SIZE = 100
+
+# XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+# XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+
+
+class TCSWorkOrderRetention():
+    """
+    TCSWorkOrderRetention periodically removes processed work orders from
+    the KV storage according to the retention policies configured. It runs
+    in the reactor thread pool so that request handling never waits for
+    it. Work orders still scheduled or in processing are never removed.
+    """
+
+    # ------------------------------------------------------------------------------------------------
+    def __init__(self, kv_helper, workorder_handler, config):
+        """
+        Parameters:
+            - kv_helper is a object of lmdb database
+            - workorder_handler is the work order handler whose work order
+              count is kept up to date
+            - config is the [Retention] section of the listener config:
+              interval (seconds between runs, 0 disables the task),
+              ttl (seconds a work order is kept after submission, 0 keeps
+              it forever), delete_fetched (remove work orders once their
+              result is fetched), max_stored_work_orders (remove the
+              oldest above this count, 0 disables) and batch_size
+        """
+        self.kv_helper = kv_helper
+        self.workorder_handler = workorder_handler
+        self.interval = int(config.get("interval", 0))
+        self.ttl = int(config.get("ttl", 0))
+        self.delete_fetched = bool(config.get("delete_fetched", False))
+        self.max_stored = int(config.get("max_stored_work_orders", 0))
+        self.batch_size = max(1, int(
+            config.get("batch_size", DEFAULT_RETENTION_BATCH_SIZE)))
+        self.__loop = None
+
+        # Work order handler records fetched results only when needed
+        workorder_handler.record_fetched = \
+            self.interval > 0 and self.delete_fetched
+
+    # ------------------------------------------------------------------------------------------------
+    def start(self):
+        """
+        Function to schedule the retention runs on the reactor
+        """
+        if self.interval <= 0:
+            logger.info("Work order retention is disabled")
+            return
+        self.__loop = task.LoopingCall(self._run)
+        # A run returns a deferred, the next one is not scheduled before
+        # it fires so runs never overlap
+        self.__loop.start(self.interval, now=False)
+        logger.info("Work order retention runs every %d seconds",
+                    self.interval)
+
+    # ------------------------------------------------------------------------------------------------
+    def stop(self):
+        """
+        Function to stop the retention runs
+        """
+        if self.__loop is not None and self.__loop.running:
+            self.__loop.stop()
+
+    # ------------------------------------------------------------------------------------------------
+    def _run(self):
+        """
+        Function to run the retention policies once in a worker thread
+        """
+        deferred = threads.deferToThread(self.collect)
+        deferred.addCallbacks(self.__on_collected, self.__on_error)
+        return deferred
+
+    def __on_collected(self, removed):
+        if removed > 0:
+            logger.info("Retention removed %d processed work orders",
+                        removed)
+
+    def __on_error(self, failure):
+        # Swallow the error so that the next run is still scheduled
+        logger.error("Work order retention run failed: %s",
+                     failure.getErrorMessage())
+
+    # ------------------------------------------------------------------------------------------------
+    def collect(self):
+        """
+        Function to apply the retention policies
+        Returns the number of work orders removed
+        """
+        # Number of work orders to remove, oldest first, on top of the
+        # ones removed by the other policies
+        excess = 0
+        if self.max_stored > 0:
+            excess = self.workorder_handler.get_workorder_count() - \
+                self.max_stored
+
+        removed = 0
+        if self.delete_fetched:
+            removed += self.__remove_fetched()
+
+        workers = self.kv_helper.lookup("worker-pool")
+        if self.ttl > 0:
+            cutoff = time.time() - self.ttl
+            for worker_id in workers:
+                removed += self.__remove_expired(worker_id, cutoff)
+
+        if excess - removed > 0:
+            removed += self.__remove_oldest(workers, excess - removed)
+        if removed > 0:
+            self.workorder_handler.update_workorder_count(-removed)
+        return removed
+
+    # ------------------------------------------------------------------------------------------------
+    def __remove_fetched(self):
+        """
+        Function to remove the work orders whose result was fetched
+        """
+        removed = 0
+        while True:
+            wo_ids = self.kv_helper.queue_list(
+                FETCHED_TABLE, FETCHED_KEY, self.batch_size)
+            if len(wo_ids) == 0:
+                return removed
+
+            # Find the worker of each work order from its request
+            batch = self.kv_helper.batch()
+            for wo_id in wo_ids:
+                batch.get("wo-requests", wo_id)
+            by_worker = {}
+            orphans = []
+            for wo_id, request in zip(wo_ids, batch.execute()):
+                worker_id = self.__worker_of(request)
+                if worker_id is None:
+                    orphans.append(wo_id)
+                else:
+                    by_worker.setdefault(worker_id, []).append(wo_id)
+
+            round_removed = 0
+            for worker_id, worker_wo_ids in by_worker.items():
+                round_removed += remove_processed_work_orders(
+                    self.kv_helper, worker_id, worker_wo_ids)
+            removed += round_removed
+            # Work orders removed by some other means leave their id behind
+            if len(orphans) != 0:
+                batch = self.kv_helper.batch()
+                for wo_id in orphans:
+                    batch.queue_remove(FETCHED_TABLE, FETCHED_KEY, wo_id)
+                batch.execute()
+            elif round_removed == 0:
+                # Nothing could be removed, try again on the next run
+                return removed
+
+    def __worker_of(self, request):
+        if request is None:
+            return None
+        try:
+            return json.loads(request)["params"]["workerId"]
+        except (ValueError, KeyError, TypeError):
+            return None
+
+    # ------------------------------------------------------------------------------------------------
+    def __remove_expired(self, worker_id, cutoff):
+        """
+        Function to remove the processed work orders of a worker submitted
+        before cutoff. Processed queues are in completion order, so the
+        queue is walked from its head until a work order is recent enough.
+        """
+        removed = 0
+        while True:
+            entries = self.__processed_heads(worker_id, self.batch_size)
+            expired = []
+            for wo_id, submitted in entries:
+                if submitted >= cutoff:
+                    break
+                expired.append(wo_id)
+            if len(expired) == 0:
+                return removed
+            count = remove_processed_work_orders(
+                self.kv_helper, worker_id, expired)
+            removed += count
+            if count == 0 or len(expired) < len(entries):
+                return removed
+
+    # ------------------------------------------------------------------------------------------------
+    def __remove_oldest(self, workers, count):
+        """
+        Function to remove the oldest count processed work orders across
+        all the workers
+        """
+        removed = 0
+        while removed < count:
+            limit = min(self.batch_size, count - removed)
+            candidates = []
+            for worker_id in workers:
+                candidates.extend(
+                    (submitted, worker_id, wo_id) for wo_id, submitted
+                    in self.__processed_heads(worker_id, limit))
+            if len(candidates) == 0:
+                return removed
+
+            by_worker = {}
+            for _, worker_id, wo_id in sorted(candidates)[:limit]:
+                by_worker.setdefault(worker_id, []).append(wo_id)
+            round_removed = 0
+            for worker_id, wo_ids in by_worker.items():
+                round_removed += remove_processed_work_orders(
+                    self.kv_helper, worker_id, wo_ids)
+            if round_removed == 0:
+                return removed
+            removed += round_removed
+        return removed
+
+    # ------------------------------------------------------------------------------------------------
+    def __processed_heads(self, worker_id, limit):
+        """
+        Function to get up to limit work orders at the head of the
+        processed queue of a worker along with their submission time.
+        Work orders without a timestamp are reported as oldest.
+        """
+        wo_ids = self.kv_helper.queue_list(
+            "wo-worker-processed", worker_id, limit)
+        if len(wo_ids) == 0:
+            return []
+        batch = self.kv_helper.batch()
+        for wo_id in wo_ids:
+            batch.get("wo-timestamps", wo_id)
+        entries = []
+        for wo_id, timestamp in zip(wo_ids, batch.execute()):
+            try:
+                submitted = float(timestamp)
+            except (TypeError, ValueError):
+                submitted = 0.0
+            entries.append((wo_id, submitted))
+        return entries
+
+# ------------------------------------------------------------------------------------------------
@@ -0,0 +1,132 @@
+# Copyright 2020 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+from database.workers_version import \
+    WORKERS_VERSION_TABLE, WORKERS_VERSION_KEY
+
+logger = logging.getLogger(__name__)
+
+# Default maximum number of workers cached
+DEFAULT_WORKER_CACHE_SIZE = 1024
+# Default number of seconds a worker is cached
+DEFAULT_WORKER_CACHE_TTL_SECS = 60
+# Default number of seconds between two checks of the version of the
+# workers table
+DEFAULT_WORKER_REFRESH_SECS = 1
+
+
+class WorkerCache():
+    """
+    WorkerCache keeps the most recently used workers of the workers table
+    decoded in memory, for the handlers answering worker requests not to
+    read and decode them on every call.
+
+    Workers are cached for ttl_secs seconds at most. All of them are
+    dropped as soon as the version of the workers table changes, which is
+    checked at most every refresh_secs seconds. The workers returned are
+    shared and must not be modified.
+    """
+
+    # ------------------------------------------------------------------------------------------------
+    def __init__(self, kv_helper, size=DEFAULT_WORKER_CACHE_SIZE,
+                 ttl_secs=DEFAULT_WORKER_CACHE_TTL_SECS,
+                 refresh_secs=DEFAULT_WORKER_REFRESH_SECS):
+        """
+        Parameters:
+            - kv_helper is a object of lmdb database
+            - size is the maximum number of workers cached, 0 disables
+              caching
+            - ttl_secs is the maximum number of seconds a worker is cached
+            - refresh_secs is the number of seconds between two checks of
+              the version of the workers table
+        """
+        self.kv_helper = kv_helper
+        self.size = int(size)
+        self.ttl_secs = float(ttl_secs)
+        self.refresh_secs = float(refresh_secs)
+        # worker id -> (expiry time, decoded worker), least recently used
+        # first
+        self.__entries = OrderedDict()
+        # Incremented whenever entries are invalidated, so that a worker
+        # read meanwhile is not cached
+        self.__generation = 0
+        self.__version = None
+        self.__checked_at = None
+        self.__lock = threading.Lock()
+
+    # ------------------------------------------------------------------------------------------------
+    def version(self):
+        """
+        Function to get the version of the workers table, read from the KV
+        storage at most every refresh_secs seconds. All cached workers are
+        invalidated when it changes.
+        Returns the version, None if the workers were never versioned
+        """
+        with self.__lock:
+            now = time.time()
+            if self.__checked_at is not None and \
+                    now - self.__checked_at < self.refresh_secs:
+                return self.__version
+            version = self.kv_helper.get(
+                WORKERS_VERSION_TABLE, WORKERS_VERSION_KEY)
+            if version != self.__version:
+                self.__invalidate()
+                self.__version = version
+            self.__checked_at = now
+            return self.__version
+
+    # ------------------------------------------------------------------------------------------------
+    def get(self, worker_id):
+        """
+        Function to get a worker, read from the KV storage unless cached
+        Parameters:
+            - worker_id is the id of the worker
+        Returns the decoded worker, None if it is not found
+        """
+        self.version()
+        with self.__lock:
+            now = time.time()
+            entry = self.__entries.get(worker_id)
+            if entry is not None and entry[0] > now:
+                self.__entries.move_to_end(worker_id)
+                return entry[1]
+            generation = self.__generation
+
+        value = self.kv_helper.get("workers", worker_id)
+        if value is None:
+            return None
+        worker = json.loads(value)
+
+        with self.__lock:
+            if self.size > 0 and generation == self.__generation:
+                self.__entries[worker_id] = (now + self.ttl_secs, worker)
+                self.__entries.move_to_end(worker_id)
+                while len(self.__entries) > self.size:
+                    self.__entries.popitem(last=False)
+        return worker
+
+    # ------------------------------------------------------------------------------------------------
+    def __invalidate(self):
+        """
+        Function to drop all workers, the lock is held by the caller
+        """
+        self.__entries.clear()
+        self.__generation += 1
+
+# ------------------------------------------------------------------------------------------------
@@ -12,13 +12,13 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import json
 import logging
 import avalon_crypto_utils.crypto_utility as crypto
 from error_code.error_status import WorkerError
 import avalon_crypto_utils.worker_hash as worker_hash
 
 from jsonrpc.exceptions import JSONRPCDispatchException
+from avalon_listener.tcs_worker_cache import WorkerCache
 
 logger = logging.getLogger(__name__)
 # No of bytes of encryptionKeyNonce to encrypt data
@@ -42,14 +42,18 @@ class WorkerEncryptionKeyHandler:
     """
 # ------------------------------------------------------------------------------------------------
 
-    def __init__(self, kv_helper):
+    def __init__(self, kv_helper, worker_cache=None):
         """
         Function to perform init activity
         Parameters:
             - kv_helper is a object of lmdb database
+            - worker_cache is the WorkerCache of the listener
         """
 
         self.kv_helper = kv_helper
+        if worker_cache is None:
+            worker_cache = WorkerCache(kv_helper)
+        self.worker_cache = worker_cache
 
 # ---------------------------------------------------------------------------------------------
     def EncryptionKeySet(self, **params):
@@ -74,15 +78,14 @@ class WorkerEncryptionKeyHandler:
         """
 
         worker_id = str(params['workerId'])
-        value = self.kv_helper.get("workers", worker_id)
+        worker = self.worker_cache.get(worker_id)
 
-        if value is None:
+        if worker is None:
             raise JSONRPCDispatchException(
                 WorkerError.INVALID_PARAMETER_FORMAT_OR_VALUE,
                 "Worker id not found in the database. Hence invalid parameter")
 
-        worker_type_data = json.loads(value).get(
-            "details").get("workerTypeData")
+        worker_type_data = worker.get("details").get("workerTypeData")
         encryptionKey = worker_type_data["encryptionKey"]
         try:
             encryptionKeyNonce = worker_type_data["encryptionKeyNonce"]
@@ -14,13 +14,19 @@
 
 import json
 import logging
+import threading
 from error_code.error_status import WorkerError
 from avalon_sdk.worker.worker_details import WorkerStatus
 import schema_validation.validate as Validator
 from jsonrpc.exceptions import JSONRPCDispatchException
+from avalon_listener.tcs_worker_cache import WorkerCache
 
 logger = logging.getLogger(__name__)
 
+# Lookup criteria the workers are indexed by
+WORKER_INDEX_CRITERIA = ["workerType", "organizationId",
+                         "applicationTypeId", "status"]
+
 
 class TCSWorkerRegistryHandler:
     """
@@ -35,15 +41,23 @@ class TCSWorkerRegistryHandler:
     """
 # ------------------------------------------------------------------------------------------------
 
-    def __init__(self, kv_helper):
+    def __init__(self, kv_helper, worker_cache=None):
         """
         Function to perform init activity
         Parameters:
             - kv_helper is a object of lmdb database
+            - worker_cache is the WorkerCache of the listener, which also
+              tells when the workers indexed are to be read again
         """
 
         self.kv_helper = kv_helper
-        self.worker_pool = []
+        if worker_cache is None:
+            worker_cache = WorkerCache(kv_helper)
+        self.worker_cache = worker_cache
+        # Index of the workers table, replaced as a whole on reload
+        self.__index = None
+        self.__version = None
+        self.__lock = threading.Lock()
         self.__worker_registry_handler_on_boot()
 # ------------------------------------------------------------------------------------------------
 
@@ -52,11 +66,8 @@ class TCSWorkerRegistryHandler:
         Function to perform on-boot process of worker registry handler
         """
 
-        worker_list = []
-        worker_list = self.kv_helper.lookup("workers")
-
         # Initial Worker details are loaded
-        self.worker_pool = worker_list
+        self.__worker_index()
         organisation_id = self.kv_helper.lookup("registries")
         for o_id in organisation_id:
             self.kv_helper.remove("registries", o_id)
@@ -88,43 +99,84 @@ class TCSWorkerRegistryHandler:
         return response
 
 # ------------------------------------------------------------------------------------------------
-    def __lookup_basic(self, is_lookup_next, params):
-        # sync the work pool to that of DB
-        self.worker_pool = self.kv_helper.lookup("workers")
+    def __worker_index(self):
+        """
+        Function to get the index of the workers table. The workers are
+        only read again once the version of the table, as checked by the
+        worker cache, has changed.
+        Returns a dict with the worker ids in table order under "ids",
+        their position under "positions" and, under "criteria", the set
+        of ids of the workers having each value of each lookup criterion
+        """
+        # The version is read before the workers, so that the index is
+        # never older than the version it is stamped with
+        version = self.worker_cache.version()
+        with self.__lock:
+            if self.__index is None or version != self.__version:
+                self.__index = self.__load_workers()
+                self.__version = version
+            return self.__index
 
-        total_count = 0
-        ids = []
-        lookupTag = ""
+    def __load_workers(self):
+        """
+        Function to read all workers in one request and index them
+        """
+        worker_ids = self.kv_helper.lookup("workers")
+        batch = self.kv_helper.batch()
+        for worker_id in worker_ids:
+            batch.get("workers", worker_id)
+        values = batch.execute() if worker_ids else []
 
-        for worker_id in self.worker_pool:
-            if is_lookup_next:
-                # loop until found the expected lookUpTag
-                is_lookup_next = (worker_id != params["lookupTag"])
+        index = {
+            "ids": [],
+            "positions": {},
+            "criteria": {c: {} for c in WORKER_INDEX_CRITERIA}
+        }
+        for worker_id, value in zip(worker_ids, values):
+            if value is None:
+                # Removed meanwhile
                 continue
-
-            matched = True
-            value = self.kv_helper.get("workers", worker_id)
-            if value:
+            try:
                 worker = json.loads(value)
-                criteria = ["workerType", "organizationId",
-                            "applicationTypeId"]
+            except ValueError:
+                logger.error("Invalid worker %s not indexed", worker_id)
+                continue
+            index["positions"][worker_id] = len(index["ids"])
+            index["ids"].append(worker_id)
+            for c in WORKER_INDEX_CRITERIA:
+                if c in worker:
+                    index["criteria"][c].setdefault(
+                        _index_value(worker[c]), set()).add(worker_id)
+        logger.info("Indexed %d workers", len(index["ids"]))
+        return index
 
-                for c in criteria:
-                    if params.get(c) is None:
-                        continue
+    def __lookup_basic(self, is_lookup_next, params):
+        index = self.__worker_index()
 
-                    matched = (worker[c] == params[c])
-                    if not matched:
-                        break
+        start = 0
+        if is_lookup_next:
+            # Resume after the expected lookUpTag
+            lookup_tag = params.get("lookUpTag", params.get("lookupTag"))
+            start = index["positions"].get(lookup_tag, len(index["ids"])) + 1
 
-            if matched:
-                total_count = total_count + 1
-                ids.append(worker_id)
-                lookupTag = worker_id
+        matched = None
+        for c in WORKER_INDEX_CRITERIA:
+            if params.get(c) is None:
+                continue
+            ids = index["criteria"][c].get(_index_value(params[c]), set())
+            matched = ids if matched is None else matched & ids
+
+        if matched is None:
+            ids = index["ids"][start:]
+        else:
+            positions = index["positions"]
+            ids = sorted((worker_id for worker_id in matched
+                          if positions[worker_id] >= start),
+                         key=positions.get)
 
         result = {
-            "totalCount": total_count,
-            "lookupTag": lookupTag,
+            "totalCount": len(ids),
+            "lookupTag": ids[-1] if ids else "",
             "ids": ids,
         }
 
@@ -139,8 +191,7 @@ class TCSWorkerRegistryHandler:
             - param is the 'param' object in the a worker request as per TCF
                 API 5.3.4 Worker Lookup JSON Payload
         """
-        input_json_str = params["raw"]
-        input_value_json = json.loads(input_json_str)
+        input_value_json = params["json"]
         valid, err_msg = \
             Validator.schema_validation(
                 "WorkerLookUp",
@@ -161,8 +212,7 @@ class TCSWorkerRegistryHandler:
             - param is the 'param' object in the a worker request as per TCF
                 API 5.3.5 Worker Lookup Next JSON Payload
         """
-        input_json_str = params["raw"]
-        input_value_json = json.loads(input_json_str)
+        input_value_json = params["json"]
         valid, err_msg = \
             Validator.schema_validation(
                 "WorkerLookUpNext",
@@ -183,8 +233,7 @@ class TCSWorkerRegistryHandler:
                 Trusted Compute EEA API 5.3.7 Worker Retrieve JSON Payload
         """
 
-        input_json_str = params["raw"]
-        input_value_json = json.loads(input_json_str)
+        input_value_json = params["json"]
         valid, err_msg = \
             Validator.schema_validation(
                 "WorkerRetrieve",
@@ -197,15 +246,13 @@ class TCSWorkerRegistryHandler:
         # value retrieved is 'result' field as per Spec 5.3.8 Worker Retrieve
         # Response Payload
         worker_id = str(params['workerId'])
-        value = self.kv_helper.get("workers", worker_id)
+        json_dict = self.worker_cache.get(worker_id)
 
-        if value is None:
+        if json_dict is None:
             raise JSONRPCDispatchException(
                 WorkerError.INVALID_PARAMETER_FORMAT_OR_VALUE,
                 "Worker Id not found in the database. Hence invalid parameter")
 
-        json_dict = json.loads(value)
-
         result = {
             "workerType": json_dict["workerType"],
             "organizationId": json_dict["organizationId"],
@@ -216,3 +263,11 @@ class TCSWorkerRegistryHandler:
 
         return result
 # ------------------------------------------------------------------------------------------------
+
+
+def _index_value(value):
+    """
+    Function to get the key a worker field value is indexed by, JSON
+    values such as lists are not hashable
+    """
+    return json.dumps(value, sort_keys=True)
@@ -22,9 +22,16 @@ import avalon_crypto_utils.worker_signing as worker_signing
 from error_code.error_status import ReceiptCreateStatus, SignatureStatus,\
     JRPCErrorCodes
 from jsonrpc.exceptions import JSONRPCDispatchException
+from avalon_listener.tcs_workorder_receipt_index import RECEIPT_INDEXES, \
+    RECEIPT_LIST_TABLE, RECEIPT_LIST_KEY, add_to_indexes, receipt_index_keys
 
 logger = logging.getLogger(__name__)
 
+# Default maximum number of work order ids returned by a receipt lookup
+DEFAULT_RECEIPT_PAGE_SIZE = 1000
+# Number of receipts indexed at once on boot
+INDEX_BATCH_SIZE = 100
+
 
 class TCSWorkOrderReceiptHandler:
     """
@@ -36,15 +43,22 @@ class TCSWorkOrderReceiptHandler:
     """
 # -----------------------------------------------------------------------------
 
-    def __init__(self, kv_helper):
+    def __init__(self, kv_helper, page_size=DEFAULT_RECEIPT_PAGE_SIZE,
+                 recover=True):
         """
         Function to perform init activity
         Parameters:
             - kv_helper is a object of lmdb database
+            - page_size is the maximum number of work order ids returned
+              by a lookup, the rest is returned by WorkOrderReceiptLookUpNext
+            - recover is False if the receipts stored were already
+              indexed, by another listener process
         """
 
         self.kv_helper = kv_helper
-        self.__workorder_receipt_on_boot()
+        self.page_size = max(1, int(page_size))
+        if recover:
+            self.__workorder_receipt_on_boot()
         # Special index 0xFFFFFFFF value to fetch last update to receipt
         self.LAST_RECEIPT_INDEX = 1 << 32
         # Supported hashing and signing algorithms
@@ -57,10 +71,29 @@ class TCSWorkOrderReceiptHandler:
 
     def __workorder_receipt_on_boot(self):
         """
-        Function to perform on-boot process of work order handler
+        Function to perform on-boot process of work order handler. Receipts
+        stored by older releases or missing from the indexes are indexed.
         """
-        # TODO: Boot time flow need to be implemented.
-        pass
+        receipt_ids = self.kv_helper.lookup("wo-receipts")
+        listed = self.kv_helper.queue_list(
+            RECEIPT_LIST_TABLE, RECEIPT_LIST_KEY)
+        if len(listed) == len(receipt_ids):
+            return
+
+        listed = set(listed)
+        missing = [wo_id for wo_id in receipt_ids if wo_id not in listed]
+        for i in range(0, len(missing), INDEX_BATCH_SIZE):
+            wo_ids = missing[i:i + INDEX_BATCH_SIZE]
+            batch = self.kv_helper.batch()
+            for wo_id in wo_ids:
+                batch.get("wo-receipts", wo_id)
+            receipts = batch.execute()
+            batch = self.kv_helper.batch()
+            for wo_id, receipt in zip(wo_ids, receipts):
+                if receipt is not None:
+                    add_to_indexes(batch, wo_id, receipt)
+            batch.execute()
+        logger.info("Indexed %d work order receipts", len(missing))
 
 # -----------------------------------------------------------------------------
 
@@ -74,7 +107,7 @@ class TCSWorkOrderReceiptHandler:
         """
         wo_id = params["workOrderId"]
         input_json_str = params["raw"]
-        input_value = json.loads(input_json_str)
+        input_value = params["json"]
 
         wo_request = self.kv_helper.get("wo-requests", wo_id)
         if wo_request is None:
@@ -90,7 +123,14 @@ class TCSWorkOrderReceiptHandler:
                     self.__validate_work_order_receipt_create_req(
                         input_value, wo_request)
                 if status is True:
-                    self.kv_helper.set("wo-receipts", wo_id, input_json_str)
+                    # Store the receipt along with its index entries
+                    transaction = self.kv_helper.transaction() \
+                        .set("wo-receipts", wo_id, input_json_str)
+                    add_to_indexes(transaction, wo_id, input_json_str)
+                    if transaction.execute() is None:
+                        raise JSONRPCDispatchException(
+                            JRPCErrorCodes.UNKNOWN_ERROR,
+                            "Failed to store the receipt")
                     raise JSONRPCDispatchException(
                         JRPCErrorCodes.SUCCESS,
                         "Receipt created successfully"
@@ -182,8 +222,7 @@ class TCSWorkOrderReceiptHandler:
         """
 
         wo_id = params["workOrderId"]
-        input_json_str = params["raw"]
-        input_value = json.loads(input_json_str)
+        input_value = params["json"]
 
         # Check if receipt for work order id is created or not
         value = self.kv_helper.get("wo-receipts", wo_id)
@@ -303,47 +342,116 @@ class TCSWorkOrderReceiptHandler:
 # -----------------------------------------------------------------------------
 
     def __lookup_basics(self, is_lookup_next, params):
-        receipt_pool = self.kv_helper.lookup("wo-receipts")
-
-        total_count = 0
-        ids = []
-        lookupTag = ""
-
-        for wo_id in receipt_pool:
-            if is_lookup_next:
-                is_lookup_next = (wo_id != params["lastLookUpTag"])
-                continue
-
-            value = self.kv_helper.get("wo-receipts", wo_id)
-            if not value:
-                continue
-
-            criteria = ["workerServiceId",
-                        "workerId", "requesterId", "requestCreateStatus"]
-
-            wo = json.loads(value)
-            matched = True
-            for c in criteria:
-                if c not in params:
-                    continue
-
-                matched = (wo["params"][c] == params[c])
-                if not matched:
-                    break
-
-            if matched:
-                total_count = total_count + 1
-                ids.append(wo_id)
-                lookupTag = wo_id
+        """
+        Function to look up the work order receipts matching the criteria
+        given in params through their indexes. Up to page_size ids are
+        returned, the lookupTag returned lets WorkOrderReceiptLookUpNext
+        continue with the next ones.
+        Parameters:
+            - is_lookup_next is True to return the ids following the
+              lastLookUpTag of params
+            - params holds the lookup criteria
+        Returns the lookup result with the total number of receipts
+        matching the criteria, or an upper bound of it for several criteria
+        """
+        indexes = [(table, str(params[criterion]))
+                   for criterion, (_, table) in RECEIPT_INDEXES.items()
+                   if criterion in params]
+        if len(indexes) == 0:
+            indexes = [(RECEIPT_LIST_TABLE, RECEIPT_LIST_KEY)]
+
+        if is_lookup_next:
+            cursor = self.__parse_lookup_tag(
+                params["lastLookUpTag"], len(indexes))
+            if cursor is None:
+                return {"totalCount": 0, "lookupTag": "", "ids": []}
+            driver, position, total = cursor
+        else:
+            driver, total = self.__shortest_index(indexes)
+            position = ""
 
+        ids, position, removed = self.__next_matches(
+            indexes, driver, position)
+        # Stale entries were counted in the total
+        total = max(0, total - removed)
         result = {
-            "totalCount": total_count,
-            "lookupTag": lookupTag,
+            "totalCount": total,
+            "lookupTag": "%x%s%x" % (driver, position, total)
+            if len(ids) != 0 else "",
             "ids": ids,
         }
 
         return result
 
+    def __parse_lookup_tag(self, tag, index_count):
+        """
+        Function to get the cursor a lookupTag returned earlier stands for.
+        The tag is the hex string made of the index iterated (one digit),
+        the position in its queue (16 digits) and the total count.
+        Returns the tuple (index, position, total count), None if the tag
+        is not one of ours
+        """
+        if tag[:2] in ("0x", "0X"):
+            tag = tag[2:]
+        if len(tag) < 18:
+            return None
+        try:
+            driver = int(tag[0], 16)
+            int(tag[1:17], 16)
+            total = int(tag[17:], 16)
+        except ValueError:
+            return None
+        if driver >= index_count:
+            return None
+        return driver, tag[1:17].lower(), total
+
+    def __shortest_index(self, indexes):
+        """
+        Function to pick the index to iterate, the shortest one
+        Returns the tuple (position of the shortest index in indexes,
+        its size). The size is the number of receipts matching a single
+        criterion, and an upper bound of it for several criteria.
+        """
+        batch = self.kv_helper.batch()
+        for table, key in indexes:
+            batch.queue_size(table, key)
+        sizes = [size or 0 for size in batch.execute()]
+        driver = sizes.index(min(sizes))
+        return driver, sizes[driver]
+
+    def __next_matches(self, indexes, driver, position):
+        """
+        Function to get up to page_size ids following a position of the
+        index at indexes[driver], whose receipt still exists and is listed
+        in every other index looked up. Ids of receipts removed without
+        their index entries are removed from the indexes looked up.
+        Returns the tuple (ids, position of the last id in the index,
+        number of ids found removed)
+        """
+        table, key = indexes[driver]
+        others = set(indexes)
+        ids = []
+        removed = 0
+        while len(ids) < self.page_size:
+            entries = self.kv_helper.queue_entries(
+                table, key, self.page_size - len(ids), position)
+            if len(entries) == 0:
+                break
+            batch = self.kv_helper.batch()
+            for _, wo_id in entries:
+                batch.get("wo-receipts", wo_id)
+            stale = self.kv_helper.batch()
+            for (position, wo_id), receipt in zip(entries, batch.execute()):
+                if receipt is None:
+                    removed += 1
+                    for index_table, index_key in indexes:
+                        stale.queue_remove(index_table, index_key, wo_id)
+                elif others.issubset(receipt_index_keys(receipt)):
+                    ids.append(wo_id)
+            if len(stale) != 0:
+                stale.execute()
+        return ids, position, removed
+
 # -----------------------------------------------------------------------------
 
     def WorkOrderReceiptLookUp(self, **params):
@@ -417,8 +525,7 @@ class TCSWorkOrderReceiptHandler:
             Jrpc response as defined in EEA spec 7.2.7
         """
         wo_id = params["workOrderId"]
-        input_json_str = params["raw"]
-        input_json = json.loads(input_json_str)
+        input_json = params["json"]
 
         input_params = input_json["params"]
         updater_id = None
@@ -0,0 +1,96 @@
+# Copyright 2020 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Secondary indexes of work order receipts. Each index is a table whose
+keys are the values of a receipt field, each holding a queue of the ids of
+the work orders whose receipt has that value, in creation order. All
+receipts are also listed in a queue of their own. Lookups read the queues
+of the criteria they are given instead of every receipt.
+
+Whoever creates or removes a receipt in wo-receipts updates the indexes
+through add_to_indexes() and remove_from_indexes().
+"""
+
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Lookup criterion -> (field of the receipt create request, index table)
+RECEIPT_INDEXES = {
+    "workerServiceId": ("workerServiceId", "receipt-by-service"),
+    "workerId": ("workerId", "receipt-by-worker"),
+    "requesterId": ("requesterId", "receipt-by-requester"),
+    "requestCreateStatus": ("receiptCreateStatus", "receipt-by-status")
+}
+# Queue of the ids of all work orders with a receipt
+RECEIPT_LIST_TABLE = "receipt-list"
+RECEIPT_LIST_KEY = "all"
+
+# -----------------------------------------------------------------------------
+
+
+def receipt_index_keys(receipt):
+    """
+    Function to get the index entries of a receipt
+    Parameters:
+        - receipt is the receipt create request as stored in wo-receipts
+    Returns the list of (index table, key) the receipt is listed under
+    """
+    keys = [(RECEIPT_LIST_TABLE, RECEIPT_LIST_KEY)]
+    try:
+        params = json.loads(receipt)["params"]
+    except (ValueError, KeyError, TypeError):
+        logger.error("Invalid receipt, only listed in %s",
+                     RECEIPT_LIST_TABLE)
+        return keys
+    for field, table in RECEIPT_INDEXES.values():
+        if field in params:
+            keys.append((table, str(params[field])))
+    return keys
+
+# -----------------------------------------------------------------------------
+
+
+def add_to_indexes(batch, wo_id, receipt):
+    """
+    Function to add the index entries of a receipt to a batch or
+    transaction
+    Parameters:
+        - batch is the LMDBBatch to add the commands to
+        - wo_id is the work order id of the receipt
+        - receipt is the receipt create request as stored in wo-receipts
+    """
+    for table, key in receipt_index_keys(receipt):
+        batch.queue_push(table, key, wo_id)
+    return batch
+
+# -----------------------------------------------------------------------------
+
+
+def remove_from_indexes(batch, wo_id, receipt):
+    """
+    Function to add the removal of the index entries of a receipt to a
+    batch or transaction
+    Parameters:
+        - batch is the LMDBBatch to add the commands to
+        - wo_id is the work order id of the receipt
+        - receipt is the receipt create request as stored in wo-receipts
+    """
+    for table, key in receipt_index_keys(receipt):
+        batch.queue_remove(table, key, wo_id)
+    return batch
+
+# -----------------------------------------------------------------------------
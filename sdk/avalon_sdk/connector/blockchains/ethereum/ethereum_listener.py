@@ -12,8 +12,11 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import json
 import asyncio
+import inspect
 import logging
+from urllib.parse import urlparse
 from utility.hex_utils import is_valid_hex_str
 from avalon_sdk.connector.blockchains.ethereum.ethereum_wrapper \
     import get_keccak_for_text
@@ -22,6 +25,10 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s', level=logging.INFO)
 
 LISTENER_SLEEP_DURATION = 5  # second
+# Default maximum number of events waiting to be handled
+EVENT_QUEUE_SIZE = 32
+# Default maximum number of blocks whose events are read at once
+EVENT_BATCH_BLOCKS = 1000
 
 
 class BlockchainInterface:
@@ -35,6 +42,163 @@ class BlockchainInterface:
         """Create a filter to get events from latest block by default."""
         return contract.events[event].createFilter(fromBlock=fromBlock)
 
+    def newLogListener(self, contract, event, checkpoint=None, drain=None):
+        """
+        Create a listener getting events block range by block range,
+        resuming after the last block processed as saved by checkpoint.
+        """
+        return LogListener(self._config, contract, event, checkpoint, drain)
+
+
+class LogListener:
+    """
+    Listener getting the events of a contract with eth_getLogs, over
+    ranges of at most event_batch_blocks blocks. New blocks are notified by
+    an eth_subscribe subscription if the event provider is a websocket one,
+    otherwise, or once the subscription failed, the block number is polled.
+
+    The number of the last block whose events were all handled is saved by
+    a checkpoint, an object with load() and save(block_number) methods, so
+    that a restarted listener resumes right after it. Without a checkpoint,
+    or if none was saved, events are got from the latest block on.
+
+    Events are handled once taken off the queue, unless a drain coroutine
+    function is given. It is called once the events of a range are taken
+    off and returns when their processing started so far is complete, and
+    the checkpoint is saved after it. The next ranges are got meanwhile.
+    """
+
+    def __init__(self, config, contract, event, checkpoint=None,
+                 drain=None):
+        self._contract = contract
+        self._event = event
+        self._checkpoint = checkpoint
+        self._drain = drain
+        self._provider_url = config["ethereum"]["event_provider"]
+        self._batch_blocks = max(1, int(config["ethereum"].get(
+            "event_batch_blocks", EVENT_BATCH_BLOCKS)))
+
+    async def run(self, queue):
+        """
+        Put the events got into queue forever. The checkpoint is saved
+        once the events of a block range have been handled.
+        """
+        loop = asyncio.get_event_loop()
+        next_block = None
+        # Saving of the checkpoint of the last range, saves are chained to
+        # keep their order
+        saved = None
+        async for head in self._new_heads():
+            try:
+                if next_block is None:
+                    next_block = await self._start_block(head)
+                    logging.info("Getting events from block {}"
+                                 .format(next_block))
+                while next_block <= head:
+                    to_block = min(head, next_block + self._batch_blocks - 1)
+                    events = await loop.run_in_executor(
+                        None, self._get_logs, next_block, to_block)
+                    for event in events:
+                        await queue.put(event)
+                        logging.debug("Event pushed into listener Queue")
+                    await queue.join()
+                    next_block = to_block + 1
+                    if self._checkpoint is not None:
+                        drained = None
+                        if self._drain is not None:
+                            drained = asyncio.ensure_future(self._drain())
+                        saved = asyncio.ensure_future(self._save_checkpoint(
+                            to_block, drained, saved))
+            except Exception as ex:
+                # The range is got again with the next block
+                logging.exception("Exception while getting events {}"
+                                  .format(ex))
+
+    async def _save_checkpoint(self, block_number, drained, previous):
+        """
+        Save the last block whose events were handled, once they are
+        drained and the previous checkpoint saved. A failure only means
+        that events may be handled again after a restart.
+        """
+        try:
+            if previous is not None:
+                await previous
+            if drained is not None:
+                await drained
+            await asyncio.get_event_loop().run_in_executor(
+                None, self._checkpoint.save, block_number)
+        except Exception as ex:
+            logging.error("Failed to save block {} checkpoint {}"
+                          .format(block_number, ex))
+
+    async def _start_block(self, head):
+        """
+        Get the block to get events from, right after the checkpoint if any
+        """
+        if self._checkpoint is not None:
+            last_block = await asyncio.get_event_loop().run_in_executor(
+                None, self._checkpoint.load)
+            if last_block is not None:
+                return last_block + 1
+        return head
+
+    def _get_logs(self, from_block, to_block):
+        return self._contract.events[self._event].getLogs(
+            fromBlock=from_block, toBlock=to_block)
+
+    def _block_number(self):
+        return self._contract.web3.eth.blockNumber
+
+    async def _new_heads(self):
+        """
+        Yield the latest block number, then again whenever new blocks are
+        added to the chain
+        """
+        loop = asyncio.get_event_loop()
+        subscribe = urlparse(self._provider_url).scheme in ("ws", "wss")
+        while True:
+            try:
+                yield await loop.run_in_executor(None, self._block_number)
+                if subscribe:
+                    try:
+                        async for head in self._subscribe_new_heads():
+                            yield head
+                    except Exception as ex:
+                        # Polled for the rest of the run rather than
+                        # failing to subscribe again and again
+                        subscribe = False
+                        logging.warning("Failed to subscribe to new blocks"
+                                        " {}, polling them instead"
+                                        .format(ex))
+                while True:
+                    await asyncio.sleep(LISTENER_SLEEP_DURATION)
+                    yield await loop.run_in_executor(
+                        None, self._block_number)
+            except Exception as ex:
+                logging.error("Failed to get new blocks {}".format(ex))
+            await asyncio.sleep(LISTENER_SLEEP_DURATION)
+
+    async def _subscribe_new_heads(self):
+        """
+        Yield the block number of the new heads notified by an
+        eth_subscribe subscription
+        """
+        # Installed along with web3 for its websocket provider
+        import websockets
+        async with websockets.connect(self._provider_url) as ws:
+            await ws.send(json.dumps({
+                "jsonrpc": "2.0", "id": 1,
+                "method": "eth_subscribe", "params": ["newHeads"]}))
+            reply = json.loads(await ws.recv())
+            if "error" in reply:
+                raise Exception(reply["error"])
+            logging.info("Subscribed to new blocks")
+            while True:
+                message = json.loads(await ws.recv())
+                head = message.get("params", {}).get("result", {})
+                if "number" in head:
+                    yield int(head["number"], 16)
+
 
 class EventProcessor:
     """
@@ -57,6 +221,9 @@ class EventProcessor:
         Although this method uses events, it is not fully asynchronous.
         """
         logging.info("Started listener for events from blockchain")
+        if isinstance(event_filter, LogListener):
+            await event_filter.run(self.queue)
+            return
         while True:
             # Check for any new event logs since the last poll
             # on this filter. Though using events, this is not
@@ -67,13 +234,23 @@ class EventProcessor:
             await asyncio.sleep(LISTENER_SLEEP_DURATION)
 
     async def handler(self, callback, *kargs, **kwargs):
-        """Start event handler to handle events."""
+        """
+        Start event handler to handle events. A callback returning an
+        awaitable is awaited before the next event is taken, so that it
+        can hold up the listener once the queue is full.
+        """
         logging.info("Started handler to handle events")
         while True:
             event = await self.queue.get()
             logging.debug("Event popped from listener queue")
 
-            callback(event, *kargs, **kwargs)
+            try:
+                result = callback(event, *kargs, **kwargs)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as ex:
+                logging.exception("Exception while handling event {}"
+                                  .format(ex))
             self.queue.task_done()
 
     async def sync_handler(self, check_event_callback=None, *kargs, **kwargs):
@@ -97,7 +274,9 @@ class EventProcessor:
 
     async def start(self, event_filter, callback, *kargs, **kwargs):
         """Start event processor in an infinite loop."""
-        self.queue = asyncio.Queue()
+        # The listener waits for room in the queue before polling again
+        self.queue = asyncio.Queue(maxsize=int(self._config.get(
+            "ethereum", {}).get("event_queue_size", EVENT_QUEUE_SIZE)))
         loop = asyncio.get_event_loop()
         self.listeners = [loop.create_task(
             self.listener(event_filter)) for _ in range(1)]
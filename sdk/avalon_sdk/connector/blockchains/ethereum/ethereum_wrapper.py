@@ -20,8 +20,7 @@ from solcx import compile_source, set_solc_version, get_solc_version
 from urllib.parse import urlparse
 import web3
 import json
-import random
-import time
+import threading
 
 logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s', level=logging.INFO)
@@ -33,6 +32,22 @@ PROVIDER_DICT = {
     'wss':   web3.WebsocketProvider,
     'ipc':   web3.IPCProvider,
 }
+# Number of attempts to commit a transaction
+TXN_ATTEMPTS = 3
+# Number of seconds to wait for a transaction to be mined. This being a
+# private network with minimum gas required being 0, there should not be
+# a huge delay in mining.
+TXN_RECEIPT_TIMEOUT = 10
+# Number of seconds between two polls for a transaction receipt, kept 0.2
+# (not default 0.1) to cut down excessive traffic when load is higher
+TXN_RECEIPT_POLL_LATENCY = 0.2
+# Account address -> [lock, nonce of the next transaction of the account or
+# None until read from the network]. Nonces are counted locally so that
+# transactions can be sent without waiting for the previous ones to be
+# mined, and shared by all the wrappers of an account in the process so
+# that no two of them hand out the same nonce.
+_account_nonces = {}
+_account_nonces_lock = threading.Lock()
 
 
 class EthereumWrapper():
@@ -64,6 +79,7 @@ class EthereumWrapper():
             self.__gas_limit = config["ethereum"]["gas_limit"]
             # Amount of Ether you are willing to pay for every unit of gas
             self.__gas_price = config["ethereum"]["gas_price"]
+            self.__nonce = _get_account_nonce(self.__eth_account_address)
             set_solc_version(config['ethereum']['solc_version'])
             logging.debug("Solidity compiler version being used : {}"
                           .format(get_solc_version()))
@@ -162,8 +178,7 @@ class EthereumWrapper():
         contract_object = self.__w3.eth.contract(
             abi=contract_interface['abi'],
             bytecode=contract_interface['bin'])
-        nonce = self.__w3.eth.getTransactionCount(self.__eth_account_address,
-                                                  'pending')
+        nonce = self.get_txn_nonce()
         tx_dict = contract_object.constructor().buildTransaction({
             'from': acct.address,
             'chainId': self._chain_id,
@@ -188,18 +203,7 @@ class EthereumWrapper():
         Returns:
         Transaction receipt on success or None on error.
         """
-        signed_tx = self.__w3.eth.account.signTransaction(
-            tx_dict, private_key=self.__eth_private_key)
-        tx_hash = self.__w3.eth.sendRawTransaction(signed_tx.rawTransaction)
-        # This being a private network with minimum gas required being 0,
-        # there should not be a huge delay in mining. Hence timeout is 10s.
-        # Poll latency is kept 0.2 (not default 0.1) to cut down excessive
-        # traffic when load is higher.
-        tx_receipt = self.__w3.eth.waitForTransactionReceipt(
-            tx_hash.hex(), timeout=10, poll_latency=0.2)
-        logging.debug("Executed transaction hash: %s, receipt: %s",
-                      format(tx_hash.hex()), format(tx_receipt))
-        return tx_receipt
+        return self.wait_for_txn_receipt(self.send_raw_transaction(tx_dict))
 
     def execute_unsigned_transaction(self, tx_dict):
         """
@@ -212,13 +216,51 @@ class EthereumWrapper():
         Returns:
         Transaction receipt on success or None on error.
         """
-        tx_hash = self.__w3.eth.sendTransaction(tx_dict)
-        # This being a private network with minimum gas required being 0,
-        # there should not be a huge delay in mining. Hence timeout is 10s.
-        # Poll latency is kept 0.2 (not default 0.1) to cut down excessive
-        # traffic when load is higher.
+        return self.wait_for_txn_receipt(
+            self.send_unsigned_transaction(tx_dict))
+
+    def send_raw_transaction(self, tx_dict):
+        """
+        Sign the raw transaction with a private key and send it without
+        waiting for it to be mined.
+
+        Parameters:
+        tx_dict     Raw transaction to sign
+
+        Returns:
+        Transaction hash.
+        """
+        signed_tx = self.__w3.eth.account.signTransaction(
+            tx_dict, private_key=self.__eth_private_key)
+        return self.__w3.eth.sendRawTransaction(signed_tx.rawTransaction)
+
+    def send_unsigned_transaction(self, tx_dict):
+        """
+        Send a transaction to be executed only with the account address,
+        without waiting for it to be mined.
+
+        Parameters:
+        tx_dict     Unsigned transaction to execute
+
+        Returns:
+        Transaction hash.
+        """
+        return self.__w3.eth.sendTransaction(tx_dict)
+
+    def wait_for_txn_receipt(self, tx_hash, timeout=TXN_RECEIPT_TIMEOUT):
+        """
+        Wait for a transaction sent to be mined.
+
+        Parameters:
+        tx_hash     Hash of the transaction
+        timeout     Maximum number of seconds to wait
+
+        Returns:
+        Transaction receipt. web3.exceptions.TimeExhausted is raised if
+        it is not mined in time.
+        """
         tx_receipt = self.__w3.eth.waitForTransactionReceipt(
-            tx_hash, timeout=10, poll_latency=0.2)
+            tx_hash, timeout=timeout, poll_latency=TXN_RECEIPT_POLL_LATENCY)
         logging.debug("Executed transaction hash: %s, receipt: %s",
                       format(tx_hash.hex()), format(tx_receipt))
         return tx_receipt
@@ -227,8 +269,10 @@ class EthereumWrapper():
         """
         Build transaction parameters and execute transaction. This function
         makes an attempt to commit transactions 3 times if it fails on the
-        first attempt. Between each attempt, it sleeps for a random time
-        period less than 5 seconds.
+        first attempt. Transactions built from any thread get consecutive
+        nonces so that many of them can be pending at once. The nonce is
+        read from the network again after a failed attempt, not to leave a
+        gap.
 
         Parameters:
         contract_func   Populated function instance to be invoked
@@ -240,19 +284,19 @@ class EthereumWrapper():
             try:
                 txn_dict = contract_func.buildTransaction(
                     self.get_transaction_params())
-                return self.execute_transaction(txn_dict)
+                return self.wait_for_txn_receipt(
+                    self.send_transaction(txn_dict))
             except Exception as ex:
                 # There is a possibility of timeout when a transaction is not
-                # mined. One of the reasons to not get mined could be that 2
-                # transactions had the same nonce (transaction sequence no.).
-                # So, a retry is worth doing at this point with a new nonce.
+                # mined. One of the reasons to not get mined could be that
+                # another client of the account used the same nonce
+                # (transaction sequence no.). So, a retry is worth doing at
+                # this point with a nonce read from the network.
                 retry_count += 1
-                # Sleep for random number of seconds less than 5
-                time.sleep(random.randint(0, 5))
+                self.reset_txn_nonce()
                 logging.warn("Exception in writing transaction to"
                              " blockchain: {}".format(ex))
-                # Retry 3 times only
-                if retry_count == 3:
+                if retry_count == TXN_ATTEMPTS:
                     if isinstance(ex, web3.exceptions.TimeExhausted):
                         raise TimeoutError(
                             "Transactions are being submitted at a faster "
@@ -268,11 +312,25 @@ class EthereumWrapper():
         Parameters:
         tx_dict     Transaction to execute
 
+        """
+        return self.wait_for_txn_receipt(self.send_transaction(tx_dict))
+
+    def send_transaction(self, tx_dict):
+        """
+        Wrapper function to choose appropriate function to send a
+        transaction based on provider (Ropsten vs other), without waiting
+        for it to be mined.
+
+        Parameters:
+        tx_dict     Transaction to send
+
+        Returns:
+        Transaction hash.
         """
         if self._is_ropsten_provider:
-            return self.sign_execute_raw_transaction(tx_dict)
+            return self.send_raw_transaction(tx_dict)
         else:
-            return self.execute_unsigned_transaction(tx_dict)
+            return self.send_unsigned_transaction(tx_dict)
 
     def get_chain_id(self):
         """Retrieve chain ID."""
@@ -334,10 +392,26 @@ class EthereumWrapper():
 
     def get_txn_nonce(self):
         """
-        Return a transaction nonce. Derived from the transaction address.
+        Allocate the nonce of the next transaction. Derived from the
+        transaction count of the account address, pending transactions
+        included, then counted locally until reset_txn_nonce() is called.
+        """
+        with self.__nonce[0]:
+            if self.__nonce[1] is None:
+                self.__nonce[1] = self.__w3.eth.getTransactionCount(
+                    web3.Web3.toChecksumAddress(self.__eth_account_address),
+                    'pending')
+            nonce = self.__nonce[1]
+            self.__nonce[1] += 1
+            return nonce
+
+    def reset_txn_nonce(self):
         """
-        return self.__w3.eth.getTransactionCount(web3.Web3.toChecksumAddress(
-            self.__eth_account_address))
+        Have the nonce of the next transaction read from the network
+        again, e.g.- after a transaction failed to be sent or mined.
+        """
+        with self.__nonce[0]:
+            self.__nonce[1] = None
 
     def get_transaction_params(self):
         """
@@ -370,6 +444,16 @@ class EthereumWrapper():
         return web3.Web3.toBytes(hexstr=hex_str)
 
 
+def _get_account_nonce(address):
+    """
+    Get the nonce entry of _account_nonces of an account address, created
+    if needed.
+    """
+    with _account_nonces_lock:
+        return _account_nonces.setdefault(
+            address.lower(), [threading.Lock(), None])
+
+
 def get_keccak_for_text(method_sign):
     """
     Get the Keccak hash of a method signature.
@@ -0,0 +1,103 @@
+# Copyright 2020 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import unittest
+from unittest import mock
+
+import avalon_sdk.connector.blockchains.ethereum.ethereum_wrapper \
+    as ethereum_wrapper
+
+ACCOUNT = "0x7085d4d4c6efea785edfba5880bb62574e115626"
+THREADS = 8
+NONCES_PER_THREAD = 50
+
+
+class TestEthereumWrapperNonce(unittest.TestCase):
+    """
+    Nonce allocation of EthereumWrapper, with the network mocked
+    """
+
+    def setUp(self):
+        self.w3 = mock.MagicMock()
+        self.w3.eth.getTransactionCount.return_value = 5
+        patches = [
+            mock.patch.object(ethereum_wrapper, "_account_nonces", {}),
+            mock.patch.object(ethereum_wrapper, "set_solc_version"),
+            mock.patch.object(ethereum_wrapper, "get_solc_version"),
+            mock.patch.object(ethereum_wrapper.EthereumWrapper,
+                              "_get_provider_for_url",
+                              return_value=self.w3)]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def __wrapper(self, account=ACCOUNT):
+        return ethereum_wrapper.EthereumWrapper({"ethereum": {
+            "eth_account": account,
+            "provider": "http://localhost:8545",
+            "event_provider": "http://localhost:8545",
+            "chain_id": 3,
+            "gas_limit": 3000000,
+            "gas_price": "100",
+            "solc_version": "v0.5.15"}})
+
+    def test_concurrent_allocation(self):
+        # Wrappers of the same account share the nonces allocated
+        wrappers = [self.__wrapper(), self.__wrapper(ACCOUNT.upper())]
+        nonces = []
+        lock = threading.Lock()
+
+        def allocate(wrapper):
+            allocated = [wrapper.get_txn_nonce()
+                         for _ in range(NONCES_PER_THREAD)]
+            with lock:
+                nonces.extend(allocated)
+
+        threads = [threading.Thread(target=allocate,
+                                    args=(wrappers[i % len(wrappers)],))
+                   for i in range(THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(nonces),
+                         list(range(5, 5 + THREADS * NONCES_PER_THREAD)),
+                         "Nonces allocated twice or skipped")
+        self.w3.eth.getTransactionCount.assert_called_once_with(
+            mock.ANY, "pending")
+
+    def test_reset(self):
+        wrapper = self.__wrapper()
+        other = self.__wrapper()
+        self.assertEqual(wrapper.get_txn_nonce(), 5)
+        self.assertEqual(other.get_txn_nonce(), 6)
+        # A reset by any wrapper has the next nonce of the account read
+        # from the network again
+        self.w3.eth.getTransactionCount.return_value = 6
+        other.reset_txn_nonce()
+        self.assertEqual(wrapper.get_txn_nonce(), 6)
+        self.assertEqual(other.get_txn_nonce(), 7)
+        self.assertEqual(self.w3.eth.getTransactionCount.call_count, 2)
+
+    def test_accounts_apart(self):
+        wrapper = self.__wrapper()
+        other = self.__wrapper("0x" + "1" * 40)
+        self.assertEqual(wrapper.get_txn_nonce(), 5)
+        self.assertEqual(other.get_txn_nonce(), 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
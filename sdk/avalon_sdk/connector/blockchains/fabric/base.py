@@ -57,6 +57,16 @@ async def get_stream_result(stream):
 class ClientBase:
     """Base class for a Hyperledger Fabric client."""
     def __init__(self, profile, channel_name, org_name, peer_name, user_name):
+        asyncio.get_event_loop().run_until_complete(self._init_client(
+            profile, channel_name, org_name, peer_name, user_name))
+
+    async def _init_client(self, profile, channel_name, org_name, peer_name,
+                           user_name):
+        """
+        Create the client and initialize it with discovery. The client is
+        bound to the event loop running this coroutine and must only be
+        used from it.
+        """
         self.client = Client(profile)
         self._channel_name = channel_name
         self._org_name = org_name
@@ -67,12 +77,11 @@ class ClientBase:
         endpoint = self.client.get_net_info('peers', self._peer_name, 'url')
         tlscert = self.client.get_net_info(
             'peers', self._peer_name, 'tlsCACerts', 'path')
-        loop = asyncio.get_event_loop()
 
         peer = create_peer(endpoint=endpoint, tls_cacerts=tlscert)
 
-        loop.run_until_complete(self.client.init_with_discovery(
-            self._user, peer, self._channel_name))
+        await self.client.init_with_discovery(
+            self._user, peer, self._channel_name)
 
         self._channel = self.client.new_channel(self._channel_name)
 
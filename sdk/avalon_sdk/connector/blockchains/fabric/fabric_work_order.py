@@ -24,7 +24,7 @@ from utility.hex_utils import is_valid_hex_str
 from avalon_sdk.connector.blockchains.common.contract_response \
     import ContractResponse
 from avalon_sdk.connector.blockchains.fabric.fabric_wrapper \
-    import FabricWrapper
+    import FabricWrapper, completed_future
 from avalon_sdk.connector.interfaces.work_order_proxy \
     import WorkOrderProxy
 
@@ -197,22 +197,38 @@ class FabricWorkOrderImpl(WorkOrderProxy):
         Returns:
         errorCode           0 on success or non-zero on error.
         """
+        return self.work_order_complete_async(
+            work_order_id, work_order_response).result()
+
+    def work_order_complete_async(self, work_order_id, work_order_response):
+        """
+        Same as work_order_complete, without waiting for the transaction
+        to be committed. Work orders completed meanwhile are endorsed and
+        committed together.
+
+        Parameters:
+        work_order_id       Unique ID to identify the work order request
+        work_order_response Work order response data in a string
+
+        Returns:
+        concurrent.futures.Future of ContractResponse.SUCCESS on success
+        or ContractResponse.ERROR on error.
+        """
         if (self.__fabric_wrapper is not None):
             if work_order_response is None:
                 logging.info("Work order response is empty")
-                return ContractResponse.ERROR
+                return completed_future(ContractResponse.ERROR)
             params = []
             params.append(work_order_id)
             params.append(work_order_response)
-            txn_status = self.__fabric_wrapper.invoke_chaincode(
+            return self.__fabric_wrapper.invoke_chaincode_async(
                 self.CHAIN_CODE,
                 'workOrderComplete',
                 params)
-            return txn_status
         else:
             logging.error(
                 "Fabric wrapper instance is not initialized")
-            return ContractResponse.ERROR
+            return completed_future(ContractResponse.ERROR)
 
     def encryption_key_start(self, tag):
         """
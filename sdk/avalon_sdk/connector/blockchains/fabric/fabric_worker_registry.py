@@ -23,7 +23,7 @@ from avalon_sdk.connector.blockchains.common.contract_response \
     import ContractResponse
 from avalon_sdk.worker.worker_details import WorkerStatus, WorkerType
 from avalon_sdk.connector.blockchains.fabric.fabric_wrapper \
-    import FabricWrapper
+    import FabricWrapper, completed_future
 from avalon_sdk.connector.interfaces.worker_registry \
     import WorkerRegistry
 from avalon_sdk.worker.worker_details import WorkerDetails
@@ -250,18 +250,29 @@ class FabricWorkerRegistryImpl(WorkerRegistry):
         ContractResponse.SUCCESS on success
         or ContractResponse.ERROR on error.
         """
+        return self.worker_set_status_async(worker_id, status, id).result()
+
+    def worker_set_status_async(self, worker_id, status, id=None):
+        """
+        Same as worker_set_status, without waiting for the transaction
+        to be committed. Worker changes made meanwhile are endorsed and
+        committed together.
+
+        Returns:
+        concurrent.futures.Future of ContractResponse.SUCCESS on success
+        or ContractResponse.ERROR on error.
+        """
         if (self.__fabric_wrapper is not None):
             params = []
             params.append(worker_id)
             params.append(str(status.value))
-            txn_status = self.__fabric_wrapper.invoke_chaincode(
+            return self.__fabric_wrapper.invoke_chaincode_async(
                 self.CHAIN_CODE,
                 'workerSetStatus',
                 params)
-            return txn_status
         else:
             logging.error("Fabric wrapper instance is not initialized")
-            return ContractResponse.ERROR
+            return completed_future(ContractResponse.ERROR)
 
     def worker_update(self, worker_id, details, id=None):
         """
@@ -276,15 +287,26 @@ class FabricWorkerRegistryImpl(WorkerRegistry):
         ContractResponse.SUCCESS on success
         or ContractResponse.ERROR on error.
         """
+        return self.worker_update_async(worker_id, details, id).result()
+
+    def worker_update_async(self, worker_id, details, id=None):
+        """
+        Same as worker_update, without waiting for the transaction
+        to be committed. Worker changes made meanwhile are endorsed and
+        committed together.
+
+        Returns:
+        concurrent.futures.Future of ContractResponse.SUCCESS on success
+        or ContractResponse.ERROR on error.
+        """
         if (self.__fabric_wrapper is not None):
             params = []
             params.append(worker_id)
             params.append(details)
-            txn_status = self.__fabric_wrapper.invoke_chaincode(
+            return self.__fabric_wrapper.invoke_chaincode_async(
                 self.CHAIN_CODE,
                 'workerUpdate',
                 params)
-            return txn_status
         else:
             logging.error("Fabric wrapper instance is not initialized")
-            return ContractResponse.ERROR
+            return completed_future(ContractResponse.ERROR)
@@ -17,6 +17,7 @@ from os import environ
 from os.path import exists, realpath
 import json
 import random
+import concurrent.futures
 
 from avalon_sdk.connector.blockchains.common.contract_response \
     import ContractResponse
@@ -31,6 +32,21 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s', level=logging.INFO)
 
 
+def completed_future(result):
+    """
+    Create a future already done.
+
+    Parameters:
+    result    Result of the future
+
+    Returns:
+    concurrent.futures.Future of result.
+    """
+    future = concurrent.futures.Future()
+    future.set_result(result)
+    return future
+
+
 class FabricWrapper():
     """
     Fabric wrapper class to interact with Fabric blockchain.
@@ -70,7 +86,12 @@ class FabricWrapper():
             self.__txn_committer = tx_committer.TxCommitter(
                 self.__network_conf_file,
                 self.__channel_name, self.__orgname,
-                self.__peername, 'Admin')
+                self.__peername, 'Admin',
+                batch_size=config["fabric"].get(
+                    "batch_size", tx_committer.DEFAULT_BATCH_SIZE),
+                batch_wait_msecs=config["fabric"].get(
+                    "batch_wait_msecs",
+                    tx_committer.DEFAULT_BATCH_WAIT_MSECS))
             cc_methods = ValidChainCodeMethods()
             self.__valid_calls = cc_methods.get_valid_cc_methods()
         else:
@@ -118,18 +139,8 @@ class FabricWrapper():
         returns ContractResponse.SUCCESS on success
         and ContractResponse.ERROR on failure.
         """
-        if chaincode_name in self.__valid_calls:
-            cc_methods = self.__valid_calls[chaincode_name]
-        else:
-            logging.error("Invalid chain code name")
-            return False
-        if method_name in cc_methods:
-            the_call = cc_methods[method_name]
-        else:
-            logging.error("Please specify a valid method name. \
-                Valid ones for chaincode " +
-                          chaincode_name + " are " +
-                          ",".join(cc_methods.keys()))
+        the_call = self.__get_valid_call(chaincode_name, method_name)
+        if the_call is None:
             return False
         resp = self.__txn_committer.cc_invoke(params, chaincode_name,
                                               method_name, '',
@@ -151,7 +162,82 @@ class FabricWrapper():
                 return result
             else:
                 return None
-        elif len(resp) > 0:
+        return self.__invoke_status(resp)
+
+    def invoke_chaincode_async(self, chaincode_name, method_name, params):
+        """
+        This is wrapper method to invoke chain code without waiting
+        for the transaction to be committed. Invocations made
+        meanwhile, from any thread, are endorsed and committed
+        together.
+
+        Parameters:
+        chaincode_name Name of the chain code
+        method_name    Chain code method name, must not be a query
+        params         List of arguments to method
+
+        Returns:
+        concurrent.futures.Future of ContractResponse.SUCCESS on
+        success and ContractResponse.ERROR on failure.
+        """
+        the_call = self.__get_valid_call(chaincode_name, method_name)
+        if the_call is None:
+            return completed_future(ContractResponse.ERROR)
+        if the_call['isQuery'] is True:
+            logging.error("Chain code method {} is a query".format(
+                method_name))
+            return completed_future(ContractResponse.ERROR)
+
+        result = concurrent.futures.Future()
+
+        def on_committed(future):
+            try:
+                resp = future.result()
+            except Exception as ex:
+                logging.error("Chain code {} call failed: {}".format(
+                    method_name, ex))
+                result.set_result(ContractResponse.ERROR)
+                return
+            logging.debug("Response of chain code {} call: {}".format(
+                method_name, resp
+            ))
+            result.set_result(self.__invoke_status(resp))
+
+        self.__txn_committer.cc_invoke_async(
+            params, chaincode_name, method_name, '').add_done_callback(
+                on_committed)
+        return result
+
+    def __get_valid_call(self, chaincode_name, method_name):
+        """
+        Look up a chain code method.
+
+        Parameters:
+        chaincode_name Name of the chain code
+        method_name    Chain code method name
+
+        Returns:
+        Dictionary describing the method or None if it is not valid.
+        """
+        if chaincode_name in self.__valid_calls:
+            cc_methods = self.__valid_calls[chaincode_name]
+        else:
+            logging.error("Invalid chain code name")
+            return None
+        if method_name in cc_methods:
+            return cc_methods[method_name]
+        logging.error("Please specify a valid method name. \
+            Valid ones for chaincode " +
+                      chaincode_name + " are " +
+                      ",".join(cc_methods.keys()))
+        return None
+
+    def __invoke_status(self, resp):
+        """
+        Map the response of the orderers to a chain code invocation
+        to ContractResponse.
+        """
+        if len(resp) > 0:
             # If it is invoke chain code call then response
             # has status SUCCESS otherwise it is an error
             if hasattr(resp[0], "status") and \
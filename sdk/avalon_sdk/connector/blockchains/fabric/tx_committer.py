@@ -17,6 +17,8 @@ import asyncio
 import logging
 import json
 import random
+import threading
+import concurrent.futures
 from hfc.fabric.transaction.tx_context import create_tx_context
 from hfc.fabric.transaction.tx_proposal_request \
     import create_tx_prop_req, CC_INVOKE, CC_TYPE_GOLANG, TXProposalRequest
@@ -28,16 +30,53 @@ from avalon_sdk.connector.blockchains.fabric import base
 
 logger = logging.getLogger(__name__)
 
+# Default maximum number of chaincode invocations endorsed and committed
+# together
+DEFAULT_BATCH_SIZE = 16
+# Default number of milliseconds to wait for more invocations to join the
+# first one of a batch
+DEFAULT_BATCH_WAIT_MSECS = 20
+# Maximum number of batches being committed while the next one is endorsed
+MAX_COMMITTING_BATCHES = 4
+
 
 class TxCommitter(base.ClientBase):
     """
     Utility class to invoke Fabric chain code and query
     chain code.
+
+    Invocations are batched: the ones made at about the same time, from
+    any thread, have their proposals sent to the endorsing peers
+    concurrently, then their transactions sent to the orderers
+    concurrently while the next batch is being endorsed. The client is
+    created and all chain code calls run on an event loop of the
+    committer's own thread.
     """
     def __init__(self, profile, channel_name,
-                 org_name, peer_name, user_name):
-        super().__init__(profile, channel_name,
-                         org_name, peer_name, user_name)
+                 org_name, peer_name, user_name,
+                 batch_size=DEFAULT_BATCH_SIZE,
+                 batch_wait_msecs=DEFAULT_BATCH_WAIT_MSECS):
+        """
+        Parameters:
+        batch_size       Maximum number of invocations endorsed and
+                         committed together
+        batch_wait_msecs Number of milliseconds to wait for more
+                         invocations to join the first one of a batch
+        """
+        self.__batch_size = max(1, int(batch_size))
+        self.__batch_wait = int(batch_wait_msecs) / 1000.0
+        self.__requests = None
+        self.__loop = asyncio.new_event_loop()
+        started = threading.Event()
+        threading.Thread(
+            target=self.__run_loop, args=(self.__loop, started),
+            name="TxCommitter", daemon=True).start()
+        started.wait()
+        # The client is bound to the loop it is created on
+        asyncio.run_coroutine_threadsafe(
+            self._init_client(profile, channel_name,
+                              org_name, peer_name, user_name),
+            self.__loop).result()
 
     def _get_endorsers(self, queryonly=False):
         """
@@ -62,7 +101,8 @@ class TxCommitter(base.ClientBase):
 
     def cc_invoke(self, args, cc_name, fcn, cc_version, queryonly=False):
         """
-        Invoke a chaincode method.
+        Invoke a chaincode method and wait for the transaction to be
+        committed.
 
         Parameters:
         args       JSON RPC serialized data used as the
@@ -78,10 +118,98 @@ class TxCommitter(base.ClientBase):
         if queryonly:
             return self.cc_query(args, cc_name, fcn)
 
+        return self.cc_invoke_async(args, cc_name, fcn, cc_version).result()
+
+    def cc_invoke_async(self, args, cc_name, fcn, cc_version):
+        """
+        Invoke a chaincode method without waiting for the transaction to
+        be committed. The invocation is batched with the other ones made
+        meanwhile.
+
+        Parameters:
+        args       JSON RPC serialized data used as the
+                   sole parameter to invoke the chaincode
+        cc_name    chaincode name
+        fcn        chaincode function name to be invoked
+        cc_version chaincode version to be used
+
+        Returns:
+        concurrent.futures.Future of the responses of the orderers
+        """
+        future = concurrent.futures.Future()
+        self.__loop.call_soon_threadsafe(
+            self.__requests.put_nowait,
+            ((args, cc_name, fcn, cc_version), future))
+        return future
+
+    def cc_query(self, args, cc_name, fcn):
+        """
+        Invoke a chaincode query method. If there is no query method from the
+        chaincode, then this will fail.
+
+        Parameters:
+        args     Array of the strings used as the parameters to query method
+        cc_name  Chaincode name
+        fcn      Chaincode function name
+        """
+        try:
+            responses = asyncio.run_coroutine_threadsafe(
+                self.client.chaincode_query(
+                    requestor=self.user, channel_name=self.channel_name,
+                    peers=[self.peer_name], args=args, cc_name=cc_name,
+                    fcn=fcn),
+                self.__loop).result()
+            logger.debug('Tx response: {0}'.format(responses))
+            return json.loads(responses)
+        except Exception as ex:
+            # In case of invalid input catch exception
+            # return empty dict.
+            logger.debug('Query response: {0}'.format(ex))
+            return {}
+
+    def __run_loop(self, loop, started):
+        asyncio.set_event_loop(loop)
+        self.__requests = asyncio.Queue()
+        loop.create_task(self.__batcher())
+        loop.call_soon(started.set)
+        loop.run_forever()
+
+    async def __batcher(self):
+        """
+        Gather invocations into batches, endorse each batch and have it
+        committed while the next one is being endorsed
+        """
         loop = asyncio.get_event_loop()
+        committing = asyncio.Semaphore(MAX_COMMITTING_BATCHES)
+        while True:
+            batch = [await self.__requests.get()]
+            deadline = loop.time() + self.__batch_wait
+            while len(batch) < self.__batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(
+                        self.__requests.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            logger.debug('Endorsing a batch of {} invocations'
+                         .format(len(batch)))
+            tran_reqs = await asyncio.gather(
+                *[self.__endorse(*request) for request, _ in batch],
+                return_exceptions=True)
+            await committing.acquire()
+            task = loop.create_task(self.__commit_batch(batch, tran_reqs))
+            task.add_done_callback(lambda _: committing.release())
+
+    async def __endorse(self, args, cc_name, fcn, cc_version):
+        """
+        Send the proposal of an invocation to the endorsing peers
+        concurrently and build its transaction from their responses
+        """
         crypto = ecies()
 
-        endorses = self._get_endorsers(queryonly)
+        endorses = self._get_endorsers()
 
         tran_prop_req = create_tx_prop_req(
             prop_type=CC_INVOKE,
@@ -93,39 +221,38 @@ class TxCommitter(base.ClientBase):
         responses, proposal, header = self.channel.send_tx_proposal(
             tx_context, endorses.values())
 
-        res = loop.run_until_complete(asyncio.gather(*responses))
+        res = await asyncio.gather(*responses)
 
-        tran_req = build_tx_req((res, proposal, header))
+        return build_tx_req((res, proposal, header))
+
+    async def __commit(self, tran_req):
+        """
+        Send an endorsed transaction to the orderers
+        """
+        if isinstance(tran_req, Exception):
+            # Endorsement failed
+            raise tran_req
 
         tx_context_tx = create_tx_context(self.user,
-                                          crypto,
+                                          ecies(),
                                           TXProposalRequest())
 
-        responses = loop.run_until_complete(base.get_stream_result(
-            send_transaction(self.client.orderers, tran_req, tx_context_tx)))
+        responses = await base.get_stream_result(
+            send_transaction(self.client.orderers, tran_req, tx_context_tx))
 
         logger.debug('Tx response: {}'.format(responses))
         return responses
 
-    def cc_query(self, args, cc_name, fcn):
+    async def __commit_batch(self, batch, tran_reqs):
         """
-        Invoke a chaincode query method. If there is no query method from the
-        chaincode, then this will fail.
-
-        Parameters:
-        args     Array of the strings used as the parameters to query method
-        cc_name  Chaincode name
-        fcn      Chaincode function name
+        Commit the transactions of a batch concurrently and hand their
+        outcome to the callers
         """
-        loop = asyncio.get_event_loop()
-        try:
-            responses = loop.run_until_complete(self.client.chaincode_query(
-                requestor=self.user, channel_name=self.channel_name,
-                peers=[self.peer_name], args=args, cc_name=cc_name, fcn=fcn))
-            logger.debug('Tx response: {0}'.format(responses))
-            return json.loads(responses)
-        except Exception as ex:
-            # In case of invalid input catch exception
-            # return empty dict.
-            logger.debug('Query response: {0}'.format(ex))
-            return {}
+        results = await asyncio.gather(
+            *[self.__commit(tran_req) for tran_req in tran_reqs],
+            return_exceptions=True)
+        for (_, future), result in zip(batch, results):
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
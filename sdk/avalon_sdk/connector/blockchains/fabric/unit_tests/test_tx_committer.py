@@ -0,0 +1,149 @@
+# Copyright 2020 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import threading
+import unittest
+from unittest import mock
+
+from avalon_sdk.connector.blockchains.fabric import base, tx_committer
+
+BATCH_SIZE = 4
+INVOCATIONS = 10
+
+
+class FakeChannel():
+    """
+    Channel whose endorsing peers answer once the endorsement of a whole
+    batch has started
+    """
+    def __init__(self, client):
+        self.client = client
+
+    def send_tx_proposal(self, tx_context, peers):
+        args = tx_context["args"]
+        self.client.endorsing.append(args)
+
+        async def response():
+            self.client.max_endorsing = max(
+                self.client.max_endorsing, len(self.client.endorsing))
+            # Let the rest of the batch be sent
+            await asyncio.sleep(0.01)
+            self.client.endorsing.remove(args)
+            return args
+        return [response()], args, None
+
+
+class FakeClient():
+    """
+    Stand-in for the Fabric client, records which thread it is used from
+    """
+    def __init__(self, profile):
+        self.threads = {threading.current_thread().name}
+        self.organizations = {}
+        self.orderers = {}
+        self.endorsing = []
+        self.max_endorsing = 0
+        self.committed = []
+
+    def get_user(self, org_name, user_name):
+        return user_name
+
+    def get_net_info(self, *key_path):
+        return None
+
+    async def init_with_discovery(self, user, peer, channel_name):
+        self.threads.add(threading.current_thread().name)
+
+    def new_channel(self, channel_name):
+        return FakeChannel(self)
+
+    async def chaincode_query(self, **kwargs):
+        self.threads.add(threading.current_thread().name)
+        return '{"args": "%s"}' % kwargs["args"][0]
+
+
+class TestTxCommitter(unittest.TestCase):
+    def setUp(self):
+        patches = [
+            mock.patch.object(base, "Client", FakeClient),
+            mock.patch.object(base, "create_peer"),
+            mock.patch.object(tx_committer, "ecies"),
+            mock.patch.object(tx_committer, "TXProposalRequest"),
+            mock.patch.object(tx_committer, "create_tx_prop_req",
+                              lambda **kwargs: kwargs),
+            mock.patch.object(tx_committer, "create_tx_context",
+                              lambda user, crypto, request: request),
+            mock.patch.object(tx_committer, "build_tx_req",
+                              lambda responses: responses[1]),
+            mock.patch.object(tx_committer, "send_transaction",
+                              self.__send_transaction)]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.committer = tx_committer.TxCommitter(
+            "profile", "channel", "org", "peer", "user",
+            batch_size=BATCH_SIZE, batch_wait_msecs=100)
+
+    def __send_transaction(self, orderers, tran_req, tx_context):
+        client = self.committer.client
+
+        async def responses():
+            client.threads.add(threading.current_thread().name)
+            client.committed.append(tran_req)
+            yield "committed " + tran_req[0]
+        return responses()
+
+    def test_client_on_committer_loop(self):
+        self.assertEqual(self.committer.cc_query(["a"], "cc", "query"),
+                         {"args": "a"})
+        self.assertEqual(self.committer.client.threads, {"TxCommitter"},
+                         "Client used out of the committer thread")
+
+    def test_batching_and_order(self):
+        futures = [self.committer.cc_invoke_async([str(i)], "cc", "fcn", "")
+                   for i in range(INVOCATIONS)]
+        results = [future.result(timeout=10) for future in futures]
+
+        # Each caller gets the outcome of its own invocation
+        self.assertEqual(results,
+                         [["committed %d" % i] for i in range(INVOCATIONS)])
+        # Transactions are sent to the orderers in invocation order
+        self.assertEqual(self.committer.client.committed,
+                         [[str(i)] for i in range(INVOCATIONS)])
+        # Invocations made together are endorsed together, up to the
+        # batch size
+        self.assertEqual(self.committer.client.max_endorsing, BATCH_SIZE)
+        self.assertEqual(self.committer.client.threads, {"TxCommitter"})
+
+    def test_invocations_from_threads(self):
+        results = {}
+
+        def invoke(i):
+            results[i] = self.committer.cc_invoke([str(i)], "cc", "fcn", "")
+
+        threads = [threading.Thread(target=invoke, args=(i,))
+                   for i in range(INVOCATIONS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, {i: ["committed %d" % i]
+                                   for i in range(INVOCATIONS)})
+        self.assertEqual(sorted(self.committer.client.committed),
+                         sorted([str(i)] for i in range(INVOCATIONS)))
+
+
+if __name__ == "__main__":
+    unittest.main()
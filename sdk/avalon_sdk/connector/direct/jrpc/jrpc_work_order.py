@@ -23,6 +23,12 @@ from error_code.error_status import WorkOrderStatus, JRPCErrorCodes
 logging.basicConfig(
     format="%(asctime)s - %(levelname)s - %(message)s", level=logging.INFO)
 
+# Milliseconds the listener is asked to wait for a pending result, below
+# the HTTP timeout of the client
+RESULT_WAIT_MSECS = 8000
+# Seconds between polls of a listener unable to wait for results
+RESULT_POLL_INTERVAL = 2
+
 
 class JRPCWorkOrderImpl(WorkOrder):
     """
@@ -55,13 +61,17 @@ class JRPCWorkOrderImpl(WorkOrder):
         response = self.__uri_client._postmsg(json.dumps(json_rpc_request))
         return response
 
-    def work_order_get_result_nonblocking(self, work_order_id, id=None):
+    def work_order_get_result_nonblocking(self, work_order_id, id=None,
+                                          wait_msecs=0):
         """
         Get the work order result in non-blocking way.
 
         Parameters:
         work_order_id     Work order ID
         id                Optional JSON RPC request ID
+        wait_msecs        Optional number of milliseconds the listener
+                          waits for the result of a pending work order
+                          before responding
 
         Returns:
         JSON RPC response of dictionary type
@@ -74,6 +84,8 @@ class JRPCWorkOrderImpl(WorkOrder):
                 "workOrderId": work_order_id
             }
         }
+        if wait_msecs:
+            json_rpc_request["params"]["waitMsecs"] = wait_msecs
         response = self.__uri_client._postmsg(json.dumps(json_rpc_request))
         return response
 
@@ -89,23 +101,26 @@ class JRPCWorkOrderImpl(WorkOrder):
         Returns:
         JSON RPC response of dictionary type
         """
-        response = self.work_order_get_result_nonblocking(work_order_id, id)
-        if "error" in response:
-            if response["error"]["code"] != WorkOrderStatus.PENDING:
-                return response
-            else:
-                while "error" in response and \
-                        response["error"]["code"] == WorkOrderStatus.PENDING:
-                    response = self.work_order_get_result_nonblocking(
-                        work_order_id, id)
-                    # TODO: currently pooling after every 2 sec interval
-                    # forever.
-                    # We should implement feature to timeout after
-                    # responseTimeoutMsecs in the request.
-                    time.sleep(2)
-                return response
-        else:
-            return response
+        wait_msecs = RESULT_WAIT_MSECS
+        response = self.work_order_get_result_nonblocking(
+            work_order_id, id, wait_msecs)
+        if "error" in response and response["error"]["code"] == \
+                WorkOrderStatus.INVALID_PARAMETER_FORMAT_OR_VALUE:
+            # Listener may not support waiting for the result, poll instead
+            wait_msecs = 0
+            response = self.work_order_get_result_nonblocking(
+                work_order_id, id)
+
+        while "error" in response and \
+                response["error"]["code"] == WorkOrderStatus.PENDING:
+            # TODO: currently waiting forever.
+            # We should implement feature to timeout after
+            # responseTimeoutMsecs in the request.
+            if not wait_msecs:
+                time.sleep(RESULT_POLL_INTERVAL)
+            response = self.work_order_get_result_nonblocking(
+                work_order_id, id, wait_msecs)
+        return response
 
     def encryption_key_get(self, worker_id, requester_id,
                            last_used_key_nonce=None, tag=None,
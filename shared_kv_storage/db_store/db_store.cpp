@@ -99,3 +99,25 @@ void DbStore::db_store_del(
 }
 
 // XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+void DbStore::db_store_write_batch(
+    const std::vector<std::string>& ops,
+    const std::vector<std::string>& tables_b64,
+    const std::vector<std::string>& keys_b64,
+    const std::vector<std::string>& values_b64) {
+    tcf_err_t presult = db_store::db_store_write_batch(ops, tables_b64, keys_b64, values_b64);
+    db_error::ThrowIf<db_error::RuntimeError>(presult, "db store write batch failed");
+}
+
+// XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+std::vector<std::string> DbStore::db_store_scan(
+    const std::string& table_b64,
+    const std::string& start_key_b64,
+    const std::string& end_key_b64,
+    const size_t limit) {
+    std::vector<std::string> pairs;
+    tcf_err_t presult = db_store::db_store_scan(table_b64, start_key_b64, end_key_b64, limit, pairs);
+    db_error::ThrowIf<db_error::RuntimeError>(presult, "db store scan failed");
+    return pairs;
+}
+
+// XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
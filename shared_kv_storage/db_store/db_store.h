@@ -16,6 +16,7 @@
 
 #include <string>
 #include <map>
+#include <vector>
 
 class DbStore {
     public:
@@ -99,4 +100,46 @@ class DbStore {
             const std::string& table_b64,
             const std::string& key_b64,
             const std::string& value_b64);
+
+        // XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+        /**
+         * Applies a batch of puts and deletes atomically in a single write
+         * transaction. Entry i of every vector describes one operation.
+         * Deleting a key that is not present is not an error.
+         *
+         * @param ops           "S" to put or "R" to delete
+         * @param tables_b64    base64 encoded table names
+         * @param keys_b64      base64 encoded key strings
+         * @param values_b64    base64 encoded value strings, ignored for deletes
+         *
+         * @return
+         *  Success: void/no return
+         *  Failure: throws exception, database store unchanged
+         */
+        void db_store_write_batch(
+            const std::vector<std::string>& ops,
+            const std::vector<std::string>& tables_b64,
+            const std::vector<std::string>& keys_b64,
+            const std::vector<std::string>& values_b64);
+
+        // XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+        /**
+         * Gets the key->value pairs of a table in key order, starting at the
+         * first key greater than or equal to start_key_b64.
+         *
+         * @param table_b64     base64 encoded table name
+         * @param start_key_b64 base64 encoded first key of the range
+         * @param end_key_b64   base64 encoded key ending the range (excluded),
+         *                      empty for no end
+         * @param limit         maximum number of pairs, 0 for no limit
+         *
+         * @return
+         *  Success: keys and values, alternately
+         *  Failure: throws exception
+         */
+        std::vector<std::string> db_store_scan(
+            const std::string& table_b64,
+            const std::string& start_key_b64,
+            const std::string& end_key_b64,
+            const size_t limit);
 };
@@ -15,6 +15,9 @@
 
 #pragma once
 
+#include <string>
+#include <vector>
+
 #include "tcf_error.h"
 #include "types.h"
 
@@ -276,5 +279,51 @@ namespace db_store {
         const ByteArray& inId,
         const ByteArray& inValue);
 
+    // XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+    /**
+     * Applies a batch of puts and deletes in a single write transaction.
+     * Either all of the operations are persisted or none of them is.
+     * Deleting a key that is not present is not an error.
+     * Primary expected use: python / untrusted side
+     *
+     * @param ops       operation per entry, "S" to put or "R" to delete
+     * @param tables    table name per entry
+     * @param inIds     id per entry
+     * @param inValues  value per entry, ignored for deletes
+     *
+     * @return
+     *  TCF_SUCCESS  all operations applied
+     *  else         failed, data store unchanged
+     */
+    tcf_err_t db_store_write_batch(
+        const std::vector<std::string>& ops,
+        const std::vector<std::string>& tables,
+        const std::vector<std::string>& inIds,
+        const std::vector<std::string>& inValues);
+
+    // XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+    /**
+     * Gets the key->value pairs of a table in key order, starting from
+     * the first key greater than or equal to startId and stopping before
+     * endId.
+     * Primary expected use: python / untrusted side
+     *
+     * @param table     table name
+     * @param startId   first key of the range
+     * @param endId     key ending the range (excluded), empty for no end
+     * @param limit     maximum number of pairs to return, 0 for no limit
+     * @param outPairs  [output] keys and values, alternately
+     *
+     * @return
+     *  TCF_SUCCESS  outPairs holds the pairs found, possibly none
+     *  else         failed, outPairs undefined
+     */
+    tcf_err_t db_store_scan(
+        const std::string& table,
+        const std::string& startId,
+        const std::string& endId,
+        const size_t limit,
+        std::vector<std::string>& outPairs);
+
 }  /* namespace db_store */
 
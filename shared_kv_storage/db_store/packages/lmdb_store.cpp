@@ -611,6 +611,148 @@ tcf_err_t db_store::db_store_csv_search_delete(
     return db_store_put(table, inId.data(), inId.size(), valueBuffer.data(), valueBuffer.size());
 }
 
+// XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+tcf_err_t db_store::db_store_write_batch(
+    const std::vector<std::string>& ops,
+    const std::vector<std::string>& tables,
+    const std::vector<std::string>& inIds,
+    const std::vector<std::string>& inValues) {
+    MDB_dbi dbi;
+    MDB_val lmdb_id;
+    MDB_val lmdb_data;
+    MDB_txn* txn;
+    int ret;
+
+    if (ops.size() != tables.size() || ops.size() != inIds.size() ||
+        ops.size() != inValues.size()) {
+        return TCF_ERR_VALUE;
+    }
+
+    // Serialize with csv updates as well, they read and write back values
+    SafeUpdateLock ulock;
+    SafeThreadLock slock;
+
+    ret = mdb_txn_begin(lmdb_store_env, NULL, 0, &txn);
+    if (ret != MDB_SUCCESS) {
+        // SAFE_LOG(TCF_LOG_ERROR, "Failed to initialize LMDB transaction; %d", ret);
+        return TCF_ERR_SYSTEM;
+    }
+
+    tcf_err_t result = TCF_SUCCESS;
+    for (size_t i = 0; i < ops.size() && result == TCF_SUCCESS; i++) {
+        ret = mdb_dbi_open(txn, tables[i].c_str(), MDB_CREATE, &dbi);
+        if (ret != 0) {
+            // SAFE_LOG(TCF_LOG_ERROR, "Failed to open LMDB transaction : %d", ret);
+            result = TCF_ERR_SYSTEM;
+            break;
+        }
+
+        lmdb_id.mv_size = inIds[i].size();
+        lmdb_id.mv_data = (void*)inIds[i].data();
+
+        if (ops[i] == "S") {
+            lmdb_data.mv_size = inValues[i].size();
+            lmdb_data.mv_data = (void*)inValues[i].data();
+            ret = mdb_put(txn, dbi, &lmdb_id, &lmdb_data, 0);
+        }
+        else if (ops[i] == "R") {
+            ret = mdb_del(txn, dbi, &lmdb_id, NULL);
+            // A key already absent leaves the store in the desired state
+            if (ret == MDB_NOTFOUND)
+                ret = 0;
+        }
+        else {
+            result = TCF_ERR_VALUE;
+            break;
+        }
+
+        if (ret != 0) {
+            // SAFE_LOG(TCF_LOG_ERROR, "Failed to write to LMDB database : %d", ret);
+            result = TCF_ERR_SYSTEM;
+        }
+    }
+
+    if (result != TCF_SUCCESS) {
+        mdb_txn_abort(txn);
+        return result;
+    }
+
+    ret = mdb_txn_commit(txn);
+    if (ret != 0) {
+        // SAFE_LOG(TCF_LOG_ERROR, "Failed to commit LMDB transaction : %d", ret);
+        return TCF_ERR_SYSTEM;
+    }
+
+    return TCF_SUCCESS;
+}
+
+// XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
+tcf_err_t db_store::db_store_scan(
+    const std::string& table,
+    const std::string& startId,
+    const std::string& endId,
+    const size_t limit,
+    std::vector<std::string>& outPairs) {
+    MDB_dbi dbi;
+    MDB_val lmdb_id;
+    MDB_val lmdb_data;
+    MDB_cursor* cursor;
+    int ret;
+
+    outPairs.clear();
+
+    SafeThreadLock slock;
+    SafeTransaction stxn(MDB_RDONLY);
+
+    if (stxn.txn == NULL)
+        return TCF_ERR_SYSTEM;
+
+    ret = mdb_dbi_open(stxn.txn, table.c_str(), 0, &dbi);
+    if (ret == MDB_NOTFOUND) {
+        // A table never written to holds no keys
+        return TCF_SUCCESS;
+    }
+    else if (ret != 0) {
+        // SAFE_LOG(TCF_LOG_ERROR, "Failed to open LMDB transaction : %d", ret);
+        return TCF_ERR_SYSTEM;
+    }
+
+    ret = mdb_cursor_open(stxn.txn, dbi, &cursor);
+    if (ret != 0) {
+        // SAFE_LOG(TCF_LOG_ERROR, "Failed to open LMDB cursor : %d", ret);
+        return TCF_ERR_SYSTEM;
+    }
+
+    // Position the cursor at the first key >= startId. LMDB rejects empty
+    // keys, an empty startId starts from the first key of the table.
+    if (startId.empty()) {
+        ret = mdb_cursor_get(cursor, &lmdb_id, &lmdb_data, MDB_FIRST);
+    }
+    else {
+        lmdb_id.mv_size = startId.size();
+        lmdb_id.mv_data = (void*)startId.data();
+        ret = mdb_cursor_get(cursor, &lmdb_id, &lmdb_data, MDB_SET_RANGE);
+    }
+    while (ret == 0) {
+        std::string key((char*)lmdb_id.mv_data, lmdb_id.mv_size);
+        if (!endId.empty() && key.compare(endId) >= 0)
+            break;
+        outPairs.push_back(key);
+        outPairs.push_back(std::string((char*)lmdb_data.mv_data, lmdb_data.mv_size));
+        if (limit != 0 && outPairs.size() >= 2 * limit)
+            break;
+        ret = mdb_cursor_get(cursor, &lmdb_id, &lmdb_data, MDB_NEXT);
+    }
+    mdb_cursor_close(cursor);
+
+    if (ret != 0 && ret != MDB_NOTFOUND) {
+        // SAFE_LOG(TCF_LOG_ERROR, "Failed to read LMDB cursor : %d", ret);
+        return TCF_ERR_SYSTEM;
+    }
+
+    return TCF_SUCCESS;
+}
+
 // XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
 std::string db_store::db_store_get_all(
     const std::string& table,
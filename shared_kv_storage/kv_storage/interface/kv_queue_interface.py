@@ -0,0 +1,140 @@
+# Copyright 2020 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from abc import ABC, abstractmethod
+
+
+class KvQueueStorage(ABC):
+    """KvQueueStorage interface provides APIs to manipulate queues of
+       unique values stored in KV Storage."""
+
+    @abstractmethod
+    def queue_push(self, table, key, value):
+        """
+        Function to add a value to the tail of a queue.
+
+        Parameters:
+           @param table - Name of the lmdb table holding the queue.
+           @param key - The key of the queue in the table.
+           @param value - The value to be added.
+        Returns:
+           @returns True if added, False if the value is already queued.
+        """
+        pass
+
+# ---------------------------------------------------------------------------------------------------
+    @abstractmethod
+    def queue_pop(self, table, key):
+        """
+        Function to remove the value at the head of a queue.
+
+        Parameters:
+           @param table - Name of the lmdb table holding the queue.
+           @param key - The key of the queue in the table.
+        Returns:
+           @returns value - Value removed, None if the queue is empty.
+        """
+        pass
+
+# ---------------------------------------------------------------------------------------------------
+    @abstractmethod
+    def queue_match_pop(self, table, key, value):
+        """
+        Function to remove the value at the head of a queue if it matches
+        the value passed in.
+
+        Parameters:
+           @param table - Name of the lmdb table holding the queue.
+           @param key - The key of the queue in the table.
+           @param value - Value to be compared against.
+        Returns:
+           @returns value - value if the head of the queue matches.
+                            None, otherwise.
+        """
+        pass
+
+# ---------------------------------------------------------------------------------------------------
+    @abstractmethod
+    def queue_remove(self, table, key, value):
+        """
+        Function to remove a value anywhere in a queue.
+
+        Parameters:
+           @param table - Name of the lmdb table holding the queue.
+           @param key - The key of the queue in the table.
+           @param value - Value to be removed.
+        Returns:
+           @returns True if the value was found, False otherwise.
+        """
+        pass
+
+# ---------------------------------------------------------------------------------------------------
+    @abstractmethod
+    def queue_list(self, table, key, limit=0):
+        """
+        Function to get the values of a queue from head to tail.
+
+        Parameters:
+           @param table - Name of the lmdb table holding the queue.
+           @param key - The key of the queue in the table.
+           @param limit - Maximum number of values, 0 for no limit.
+        Returns:
+           @returns list of values, empty if the queue is empty.
+        """
+        pass
+
+# ---------------------------------------------------------------------------------------------------
+    @abstractmethod
+    def queue_entries(self, table, key, limit=0, after=""):
+        """
+        Function to get the values of a queue with their position, from
+        head to tail.
+
+        Parameters:
+           @param table - Name of the lmdb table holding the queue.
+           @param key - The key of the queue in the table.
+           @param limit - Maximum number of values, 0 for no limit.
+           @param after - Position returned by an earlier call, only the
+                          values queued after it are returned. "" to start
+                          at the head.
+        Returns:
+           @returns list of (position, value) tuples, empty if there are
+                    none.
+        """
+        pass
+
+# ---------------------------------------------------------------------------------------------------
+    @abstractmethod
+    def queue_size(self, table, key):
+        """
+        Function to get the number of values in a queue.
+
+        Parameters:
+           @param table - Name of the lmdb table holding the queue.
+           @param key - The key of the queue in the table.
+        """
+        pass
+
+# ---------------------------------------------------------------------------------------------------
+    @abstractmethod
+    def queue_clear(self, table, key):
+        """
+        Function to remove all the values of a queue.
+
+        Parameters:
+           @param table - Name of the lmdb table holding the queue.
+           @param key - The key of the queue in the table.
+        Returns:
+           @returns True if the queue had any value, False otherwise.
+        """
+        pass
@@ -0,0 +1,395 @@
+# Copyright 2020 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+This file implements a transaction over KvDBStore.
+
+Writes made through a KvTransaction are staged in memory and reads see
+them, so a sequence of commands behaves exactly as if it was run against
+the store directly. On commit all staged writes are applied in a single
+LMDB write transaction: either every one of them is persisted or none is.
+
+Queues are kept under a key of a table as separate LMDB entries, so that
+pushing, popping and removing a value never rewrites the whole queue:
+
+    <key><SEP>m             -> "<next sequence number>,<size>"
+    <key><SEP>e<SEP><seq>   -> value, seq being 16 hex digits
+    <key><SEP>i<SEP><value> -> seq of the value, to find it by value
+
+where SEP is QUEUE_SEPARATOR. Keys and values of a queue must not contain
+it. Values are unique within a queue. The sequence number only grows, the m
+entry is kept once the queue is empty, so that the position of a value
+is never given to a later one.
+"""
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Separates the queue key from the fields of its entries
+QUEUE_SEPARATOR = "\x1f"
+
+# ---------------------------------------------------------------------------------------------------
+
+
+class KvTransaction():
+    """
+    KvTransaction offers the get/set/remove/lookup, csv and queue APIs of
+    KvDBStore with writes deferred until commit() is called.
+    """
+
+    def __init__(self, kv_store):
+        """
+        Parameters:
+           - kv_store is the KvDBStore the transaction is committed to
+        """
+        self._kv_store = kv_store
+        # (table, key) -> staged value, None if staged for deletion.
+        # Insertion order is kept so that writes are applied in order.
+        self._staged = {}
+
+# ---------------------------------------------------------------------------------------------------
+    def get(self, table, key):
+        """
+        Function to get the value for a key, staged writes included
+        Parameters:
+           - table is the name of lmdb table.
+           - key is the primary key of the table.
+        """
+        if (table, key) in self._staged:
+            value = self._staged[(table, key)]
+            return value if value else None
+        return self._kv_store.get(table, key)
+
+# ---------------------------------------------------------------------------------------------------
+    def set(self, table, key, value):
+        """
+        Function to stage a key-value pair to be set on commit
+        Parameters:
+           - table is the name of lmdb table.
+           - key is the primary key of the table.
+           - value is the value that needs to be inserted in the table.
+        """
+        self._staged[(table, key)] = value
+        return True
+
+# ---------------------------------------------------------------------------------------------------
+    def remove(self, table, key, value=None):
+        """
+        Function to stage the removal of a key on commit
+        Parameters:
+           - table is the name of lmdb table.
+           - key is the primary key of the table.
+           - value is ignored as tables do not hold duplicate data items.
+        Returns False if the key is not present, like KvDBStore.remove.
+        """
+        if self.get(table, key) is None:
+            return False
+        self._staged[(table, key)] = None
+        return True
+
+# ---------------------------------------------------------------------------------------------------
+    def lookup(self, table):
+        """
+        Function to get all the keys in a lmdb table, staged writes included
+        Parameters:
+           - table is the name of lmdb table.
+        """
+        keys = set(self._kv_store.lookup(table))
+        for (staged_table, key), value in self._staged.items():
+            if staged_table != table:
+                continue
+            if value is None:
+                keys.discard(key)
+            else:
+                keys.add(key)
+        return sorted(keys)
+
+# ---------------------------------------------------------------------------------------------------
+    def csv_append(self, table, key, value):
+        """
+        Function to stage appending a string to a comma-separated value
+        """
+        current = self.get(table, key)
+        if current is not None:
+            value = current + "," + value
+        return self.set(table, key, value)
+
+# ---------------------------------------------------------------------------------------------------
+    def csv_prepend(self, table, key, value):
+        """
+        Function to stage prepending a string to a comma-separated value
+        """
+        current = self.get(table, key)
+        if current is not None:
+            value = value + "," + current
+        return self.set(table, key, value)
+
+# ---------------------------------------------------------------------------------------------------
+    def csv_pop(self, table, key):
+        """
+        Function to stage removing the first string of a comma-separated
+        value. The key is removed along with the last string.
+        Returns the string removed, None if the key is not present.
+        """
+        current = self.get(table, key)
+        if current is None:
+            return None
+        first, separator, rest = current.partition(",")
+        if separator:
+            self.set(table, key, rest)
+        else:
+            self.remove(table, key)
+        return first
+
+# ---------------------------------------------------------------------------------------------------
+    def csv_match_pop(self, table, key, value):
+        """
+        Function to stage removing the first string of a comma-separated
+        value if it matches the value passed in.
+        Returns value if it matched, None otherwise.
+        """
+        current = self.get(table, key)
+        if current is None or current.partition(",")[0] != value:
+            return None
+        return self.csv_pop(table, key)
+
+# ---------------------------------------------------------------------------------------------------
+    def csv_search_delete(self, table, key, value):
+        """
+        Function to stage removing a string anywhere in a comma-separated
+        value. The key is removed along with the last string.
+        Returns True if the value was found, False otherwise.
+        """
+        current = self.get(table, key)
+        if current is None:
+            return False
+        values = current.split(",")
+        if value not in values:
+            return False
+        values.remove(value)
+        if len(values) == 0:
+            return self.remove(table, key)
+        return self.set(table, key, ",".join(values))
+
+# ---------------------------------------------------------------------------------------------------
+    def scan(self, table, start, end="", limit=0):
+        """
+        Function to get key-value pairs in key order, staged writes included
+        Parameters:
+           - table is the name of lmdb table.
+           - start is the first key of the range.
+           - end is the key ending the range (excluded), "" for no end.
+           - limit is the maximum number of pairs, 0 for no limit.
+        """
+        if limit:
+            # Committed keys staged for deletion are dropped below, fetch
+            # enough of them to still fill the limit
+            limit_store = limit + sum(
+                1 for (staged_table, _), value in self._staged.items()
+                if staged_table == table and value is None)
+        else:
+            limit_store = 0
+        pairs = dict(self._kv_store.scan(table, start, end, limit_store))
+        for (staged_table, key), value in self._staged.items():
+            if staged_table != table or key < start or (end and key >= end):
+                continue
+            if value is None:
+                pairs.pop(key, None)
+            else:
+                pairs[key] = value
+        pairs = sorted(pairs.items())
+        return pairs[:limit] if limit else pairs
+
+# ---------------------------------------------------------------------------------------------------
+    def queue_push(self, table, key, value):
+        """
+        Function to add a value to the tail of a queue
+        Returns True if added, False if the value is already queued.
+        """
+        index_key = self.__queue_field(key, "i", value)
+        if not value or self.get(table, index_key) is not None:
+            return False
+        seq, size = self.__queue_meta(table, key)
+        self.set(table, self.__queue_field(key, "e", "%016x" % seq), value)
+        self.set(table, index_key, "%016x" % seq)
+        self.__set_queue_meta(table, key, seq + 1, size + 1)
+        return True
+
+# ---------------------------------------------------------------------------------------------------
+    def queue_pop(self, table, key):
+        """
+        Function to remove the value at the head of a queue
+        Returns the value removed, None if the queue is empty.
+        """
+        head = self.queue_list(table, key, 1)
+        if len(head) == 0:
+            return None
+        self.queue_remove(table, key, head[0])
+        return head[0]
+
+# ---------------------------------------------------------------------------------------------------
+    def queue_match_pop(self, table, key, value):
+        """
+        Function to remove the value at the head of a queue if it matches
+        the value passed in.
+        Returns value if it matched, None otherwise.
+        """
+        head = self.queue_list(table, key, 1)
+        if len(head) == 0 or head[0] != value:
+            return None
+        self.queue_remove(table, key, value)
+        return value
+
+# ---------------------------------------------------------------------------------------------------
+    def queue_remove(self, table, key, value):
+        """
+        Function to remove a value anywhere in a queue
+        Returns True if the value was found, False otherwise.
+        """
+        index_key = self.__queue_field(key, "i", value)
+        seq = self.get(table, index_key)
+        if seq is None:
+            return False
+        self.remove(table, self.__queue_field(key, "e", seq))
+        self.remove(table, index_key)
+        next_seq, size = self.__queue_meta(table, key)
+        self.__set_queue_meta(table, key, next_seq, size - 1)
+        return True
+
+# ---------------------------------------------------------------------------------------------------
+    def queue_list(self, table, key, limit=0):
+        """
+        Function to get the values of a queue from head to tail
+        Parameters:
+           - limit is the maximum number of values, 0 for no limit.
+        """
+        return [value for _, value in self.queue_entries(table, key, limit)]
+
+# ---------------------------------------------------------------------------------------------------
+    def queue_entries(self, table, key, limit=0, after=""):
+        """
+        Function to get the values of a queue with their position, from
+        head to tail
+        Parameters:
+           - limit is the maximum number of values, 0 for no limit.
+           - after is a position returned earlier, only the values
+             queued after it are returned. "" to start at the head.
+        Returns the list of (position, value) tuples.
+        """
+        # Positions are the sequence numbers the values were queued with
+        first = "%016x" % (int(after, 16) + 1) if after else ""
+        start = self.__queue_field(key, "e", first)
+        end = key + QUEUE_SEPARATOR + "e" + chr(ord(QUEUE_SEPARATOR) + 1)
+        prefix = len(self.__queue_field(key, "e", ""))
+        return [(entry_key[prefix:], value) for entry_key, value
+                in self.scan(table, start, end, limit)]
+
+# ---------------------------------------------------------------------------------------------------
+    def queue_size(self, table, key):
+        """Function to get the number of values in a queue"""
+        return self.__queue_meta(table, key)[1]
+
+# ---------------------------------------------------------------------------------------------------
+    def queue_clear(self, table, key):
+        """
+        Function to remove all the values of a queue
+        Returns True if the queue had any, False otherwise.
+        """
+        seq, size = self.__queue_meta(table, key)
+        start = key + QUEUE_SEPARATOR
+        end = key + chr(ord(QUEUE_SEPARATOR) + 1)
+        meta_key = key + QUEUE_SEPARATOR + "m"
+        cleared = False
+        for queue_key, _ in self.scan(table, start, end):
+            if queue_key != meta_key:
+                self.remove(table, queue_key)
+                cleared = True
+        if cleared:
+            self.__set_queue_meta(table, key, seq, 0)
+        return cleared
+
+# ---------------------------------------------------------------------------------------------------
+    def queue_claim(self, table, key, count, claim_table, claim_key,
+                    value_table):
+        """
+        Function to stage removing up to count values from the head of a
+        queue and appending them to the comma-separated value of claim_key
+        in claim_table
+        Returns the list of (value removed, value of it as a key in
+        value_table or None) tuples.
+        """
+        values = self.queue_list(table, key, count)
+        if len(values) == 0:
+            return []
+        for value in values:
+            self.queue_remove(table, key, value)
+        self.csv_append(claim_table, claim_key, ",".join(values))
+        return [(value, self.get(value_table, value)) for value in values]
+
+# ---------------------------------------------------------------------------------------------------
+    def counter_add(self, table, key, delta):
+        """
+        Function to add delta to the integer counter held by a key, an
+        absent counter being 0
+        Returns the new value, None if the key holds no integer.
+        """
+        value = self.get(table, key)
+        try:
+            count = int(value) if value is not None else 0
+        except ValueError:
+            return None
+        count += delta
+        self.set(table, key, str(count))
+        return count
+
+# ---------------------------------------------------------------------------------------------------
+    def __queue_field(self, key, field, suffix):
+        return key + QUEUE_SEPARATOR + field + QUEUE_SEPARATOR + suffix
+
+    def __queue_meta(self, table, key):
+        meta = self.get(table, key + QUEUE_SEPARATOR + "m")
+        if meta is None:
+            return 0, 0
+        seq, size = meta.split(",")
+        return int(seq), int(size)
+
+    def __set_queue_meta(self, table, key, seq, size):
+        # Kept once the queue is empty, sequence numbers never go back so
+        # that positions handed out stay valid
+        self.set(table, key + QUEUE_SEPARATOR + "m", "{},{}".format(seq, size))
+
+# ---------------------------------------------------------------------------------------------------
+    def commit(self):
+        """
+        Function to apply all staged writes in a single LMDB transaction
+        Returns True if they were persisted, False if none of them was.
+        """
+        ops = []
+        for (table, key), value in self._staged.items():
+            if value is None:
+                ops.append(("R", table, key, ""))
+            else:
+                ops.append(("S", table, key, value))
+        self._staged = {}
+        if len(ops) == 0:
+            return True
+        return self._kv_store.write_batch(ops)
+
+# ---------------------------------------------------------------------------------------------------
+    def abort(self):
+        """Function to drop all staged writes"""
+        self._staged = {}
+
+# ---------------------------------------------------------------------------------------------------
@@ -13,8 +13,13 @@
 # limitations under the License.
 
 from os import sys, environ
+from string import hexdigits
+from twisted.internet import reactor
 from twisted.web import resource, http
+from twisted.web.server import NOT_DONE_YET
 from kv_storage.remote_lmdb.string_escape import escape, unescape
+from database.binary_frame import \
+    FRAME_CONTENT_TYPE, encode_frames, decode_frames
 from kv_storage.remote_lmdb.shared_kv_dbstore import KvDBStore
 
 
@@ -27,6 +32,10 @@ logger = logging.getLogger(__name__)
 TCFHOME = environ.get("TCF_HOME", "../../../../")
 lookup_flag = False
 
+# Commands that may wait for a write -> (command retried once woken,
+# command whose write wakes them)
+WAIT_COMMANDS = {"QW": ("QR", "QA"), "GW": ("G", "S")}
+
 
 class LMDBRequestHandler(resource.Resource):
     """LMDBRequestHandler is comprised of HTTP interface which listens for
@@ -52,169 +61,568 @@ class LMDBRequestHandler(resource.Resource):
             logger.error("Failed to open KV Storage DB")
             sys.exit(-1)
 
+        # (retried command, table, key) -> list of [request, timer] of the
+        # clients blocked by QW or GW, in arrival order
+        self.__waiters = {}
+
     def __del__(self):
         self.kv_helper.close()
 
     def _process_request(self, request):
-        response = ""
+        """
+        Process a request in the legacy text protocol. Requests are
+        serialized as <cmd>\n<arg1>\n<arg2>... with every field escaped.
+
+        Parameters:
+           - request is the decoded request str
+        Returns:
+           - response str in the same format
+        """
         logger.info(request.encode('utf-8'))
         args = request.split('\n')
         for i in range(len(args)):
             args[i] = unescape(args[i])
         logger.info(args)
+
+        fields = self._execute_command(args)
+        self.__wake_waiters([args])
+        response = fields[0]
+        for field in fields[1:]:
+            response = response + "\n" + escape(field)
+        return response
+
+    def _process_frames(self, data, request=None):
+        """
+        Process a binary framed request. A request carries one or more
+        commands, each framed as [<cmd>, <arg1>, <arg2>...], and they are
+        executed in order. The response holds one framed result per
+        command.
+
+        Parameters:
+           - data is the raw request body
+           - request is the HTTP request, needed to respond later to a
+             request made only of a QW or GW command
+        Returns:
+           - binary framed response bytes, NOT_DONE_YET if the request
+             waits for a value to be written
+        """
+        try:
+            commands = decode_frames(data)
+        except ValueError as err:
+            logger.error("Invalid binary frame: %s", str(err))
+            return encode_frames([["e", "Invalid binary frame"]])
+
+        if request is not None and len(commands) == 1 and \
+                self.__is_wait(commands[0]):
+            return self._wait(request, commands[0])
+
+        logger.debug("Batch of %d commands", len(commands))
+        results = []
+        index = 0
+        while index < len(commands):
+            args = commands[index]
+            if len(args) == 0:
+                results.append(["e", "Empty command"])
+            elif args == ["TB"]:
+                # Run all commands up to the matching commit atomically
+                end = index + 1
+                while end < len(commands) and commands[end] != ["TC"]:
+                    end += 1
+                results.extend(
+                    self._execute_transaction(commands[index + 1:end],
+                                              end < len(commands)))
+                index = end
+            else:
+                results.append(self._execute_command(args))
+            index += 1
+        self.__wake_waiters(commands)
+        return encode_frames(results)
+
+    # -----------------------------------------------------------------
+    def _wait(self, request, args):
+        """
+        Execute a QW(queue wait pop) or GW(get wait) command: pop the
+        value at the head of a queue or get the value of a key. If there
+        is none, hold the request until a value is pushed to the queue,
+        respectively set for the key, or the wait expires.
+
+        Parameters:
+           - request is the HTTP request to respond to
+           - args is the list [<cmd>, <table>, <key>, <wait in msecs>]
+        Returns:
+           - binary framed response bytes, NOT_DONE_YET if waiting
+        """
+        retry = WAIT_COMMANDS[args[0]][0]
+        table, key, wait = args[1], args[2], int(args[3])
+        response = self._execute_command([retry, table, key])
+        if response[0] != "n" or wait == 0:
+            return encode_frames([response])
+
+        target = (retry, table, key)
+        waiter = [request, None]
+        waiter[1] = reactor.callLater(
+            wait / 1000.0, self.__end_wait, target, waiter, ["n"])
+        self.__waiters.setdefault(target, []).append(waiter)
+        # Forget the waiter if the client goes away before it is served
+        request.notifyFinish().addErrback(
+            lambda _: self.__cancel_wait(target, waiter))
+        return NOT_DONE_YET
+
+    def __is_wait(self, args):
+        return len(args) == 4 and args[0] in WAIT_COMMANDS and \
+            args[3].isdigit()
+
+    def __wake_waiters(self, commands):
+        """
+        Serve the clients waiting on the queues pushed to and the keys set
+        by commands
+        """
+        if not self.__waiters:
+            return
+        wakers = {waker: retry for retry, waker in WAIT_COMMANDS.values()}
+        targets = {(wakers[args[0]], args[1], args[2]) for args in commands
+                   if len(args) >= 3 and args[0] in wakers}
+        for target in targets:
+            waiters = self.__waiters.get(target)
+            while waiters:
+                if self.__is_gone(waiters[0][0]):
+                    # Not to pop a value for a client that went away
+                    self.__cancel_wait(target, waiters[0])
+                    continue
+                response = self._execute_command(list(target))
+                if response[0] != "v":
+                    break
+                self.__end_wait(target, waiters[0], response)
+
+    def __end_wait(self, target, waiter, response):
+        """
+        Respond to a waiting client and forget it
+        """
+        request = waiter[0]
+        if not self.__cancel_wait(target, waiter) or \
+                self.__is_gone(request):
+            # Already responded to or the client went away
+            return
+        request.write(encode_frames([response]))
+        request.finish()
+
+    def __cancel_wait(self, target, waiter):
+        """
+        Forget a waiting client and stop its timer
+        Returns:
+           - True if the client was waiting
+        """
+        timer = waiter[1]
+        if timer.active():
+            timer.cancel()
+        waiters = self.__waiters.get(target, [])
+        waiting = waiter in waiters
+        if waiting:
+            waiters.remove(waiter)
+        if len(waiters) == 0:
+            self.__waiters.pop(target, None)
+        return waiting
+
+    @staticmethod
+    def __is_gone(request):
+        return request.finished or getattr(request, "_disconnected", False)
+
+    def _execute_transaction(self, commands, has_commit):
+        """
+        Execute commands enclosed in TB(transaction begin) and
+        TC(transaction commit) in a single LMDB write transaction.
+        Commands see the writes of the ones before them. If any of them
+        fails with an error, or a set-new finds its key already set,
+        nothing is written.
+
+        Parameters:
+           - commands is the list of commands between TB and TC
+           - has_commit is False if the closing TC is missing
+        Returns:
+           - list of response fields for TB, each command and TC. TC
+             responds t(true) if the transaction was committed and
+             f(false) otherwise.
+        """
+        if not has_commit:
+            logger.error("Transaction is missing commit")
+            error = ["e", "Transaction is missing commit"]
+            return [error] * (len(commands) + 1)
+
+        transaction = self.kv_helper.transaction()
+        results = [["t"]]
+        for args in commands:
+            if len(args) == 0 or args[0] in ("TB", "TC"):
+                results.append(["e", "Invalid command in transaction"])
+            else:
+                results.append(self._execute_command(args, transaction))
+
+        if any(result[0] == "e" for result in results) or \
+                any(args[:1] == ["SN"] and result == ["f"]
+                    for args, result in zip(commands, results[1:])):
+            logger.error("Transaction aborted")
+            transaction.abort()
+            results.append(["f"])
+        elif transaction.commit():
+            results.append(["t"])
+        else:
+            results.append(["f"])
+        return results
+
+    def _execute_command(self, args, store=None):
+        """
+        Execute a single command against the KV storage
+
+        Parameters:
+           - args is the list [<cmd>, <arg1>, <arg2>...]
+           - store is the KvTransaction to run the command in, the
+             KV storage itself if None
+        Returns:
+           - list of response fields [<status>, <value>...] where status is
+             one of l(lookup result), a(array of values), v(value),
+             t(true), f(false), n(not found) or e(error)
+        """
+        if store is None:
+            store = self.kv_helper
         cmd = args[0]
 
         # Lookup
         if (cmd == "L"):
             if len(args) == 2:
-                result_list = self.kv_helper.lookup(args[1])
-                result = ""
-                for key in result_list:
-                    if result == "":
-                        result = key
-                    else:
-                        result = result + "," + key
+                result_list = store.lookup(args[1])
+                result = ",".join(result_list)
                 # Lookup result found
                 if result != "":
-                    response = "l\n" + escape(result)
+                    response = ["l", result]
                 # No result found
                 else:
-                    response = "n"
+                    response = ["n"]
             # Error
             else:
                 logger.error("Invalid args for cmd Lookup")
-                response = "e\nInvalid args for cmd Lookup"
+                response = ["e", "Invalid args for cmd Lookup"]
 
         # Get
         elif (cmd == "G"):
             if len(args) == 3:
-                result = self.kv_helper.get(args[1], args[2])
+                result = store.get(args[1], args[2])
                 # Value found
                 if result is not None:
-                    response = "v\n" + escape(result)
+                    response = ["v", result]
                 # Value not found
                 else:
-                    response = "n"
+                    response = ["n"]
             # Error
             else:
                 logger.error("Invalid args for cmd Get")
-                response = "e\nInvalid args for cmd Get"
+                response = ["e", "Invalid args for cmd Get"]
+
+        # Get, without waiting for a value unless sent alone in a binary
+        # framed request
+        elif (cmd == "GW"):
+            if self.__is_wait(args):
+                result = store.get(args[1], args[2])
+                # Value found
+                if result is not None:
+                    response = ["v", result]
+                # Value not found
+                else:
+                    response = ["n"]
+            # Error
+            else:
+                logger.error("Invalid args for cmd get_wait")
+                response = ["e", "Invalid args for cmd get_wait"]
 
         # Set
         elif (cmd == "S"):
             if len(args) == 4:
-                result = self.kv_helper.set(args[1], args[2], args[3])
+                result = store.set(args[1], args[2], args[3])
                 # Set successful (returned True)
                 if result:
-                    response = "t"
+                    response = ["t"]
                 # Set unsuccessful (returned False)
                 else:
-                    response = "f"
+                    response = ["f"]
             # Error
             else:
                 logger.error("Invalid args for cmd Set")
-                response = "e\nInvalid args for cmd Set"
+                response = ["e", "Invalid args for cmd Set"]
+
+        # Set a key that is not set yet
+        elif (cmd == "SN"):
+            if len(args) == 4:
+                # Key already set
+                if store.get(args[1], args[2]) is not None:
+                    response = ["f"]
+                # Set successful
+                elif store.set(args[1], args[2], args[3]):
+                    response = ["t"]
+                # Error
+                else:
+                    response = ["e", "Failed to set for cmd set_new"]
+            # Error
+            else:
+                logger.error("Invalid args for cmd set_new")
+                response = ["e", "Invalid args for cmd set_new"]
 
         # Remove
         elif (cmd == "R"):
             if len(args) == 3 or len(args) == 4:
                 if len(args) == 3:
-                    result = self.kv_helper.remove(args[1], args[2])
+                    result = store.remove(args[1], args[2])
                 else:
-                    result = self.kv_helper.remove(
+                    result = store.remove(
                         args[1], args[2], value=args[3])
                 # Remove successful (returned True)
                 if result:
-                    response = "t"
+                    response = ["t"]
                 # Remove unsuccessful (returned False)
                 else:
-                    response = "f"
+                    response = ["f"]
             # Error
             else:
                 logger.error("Invalid args for cmd Remove")
-                response = "e\nInvalid args for cmd Remove"
+                response = ["e", "Invalid args for cmd Remove"]
 
         # Append to csv
         elif (cmd == "CA"):
             if len(args) == 4:
-                result = self.kv_helper.csv_append(args[1], args[2], args[3])
+                result = store.csv_append(args[1], args[2], args[3])
                 # Append to csv successful (returned True)
                 if result:
-                    response = "t"
+                    response = ["t"]
                 # Append to csv unsuccessful (returned False)
                 else:
-                    response = "f"
+                    response = ["f"]
             # Error
             else:
                 logger.error("Invalid args for cmd csv_append")
-                response = "e\nInvalid args for cmd csv_append"
+                response = ["e", "Invalid args for cmd csv_append"]
 
         # Prepend to csv
         elif (cmd == "CP"):
             if len(args) == 4:
-                result = self.kv_helper.csv_prepend(args[1], args[2], args[3])
+                result = store.csv_prepend(args[1], args[2], args[3])
                 # Prepend to csv successful (returned True)
                 if result:
-                    response = "t"
+                    response = ["t"]
                 # Prepend to csv unsuccessful (returned False)
                 else:
-                    response = "f"
+                    response = ["f"]
             # Error
             else:
                 logger.error("Invalid args for cmd csv_prepend")
-                response = "e\nInvalid args for cmd csv_prepend"
+                response = ["e", "Invalid args for cmd csv_prepend"]
 
         # Pop/retrieve from CSV
         elif (cmd == "CR"):
             if len(args) == 3:
-                result = self.kv_helper.csv_pop(args[1], args[2])
+                result = store.csv_pop(args[1], args[2])
                 # Value found
                 if result is not None:
-                    response = "v\n" + escape(result)
+                    response = ["v", result]
                 # Value not found
                 else:
-                    response = "n"
+                    response = ["n"]
             # Error
             else:
                 logger.error("Invalid args for cmd csv_pop")
-                response = "e\nInvalid args for cmd csv_pop"
+                response = ["e", "Invalid args for cmd csv_pop"]
 
         # Pop/retrieve from CSV if a match is found
         elif (cmd == "CM"):
             if len(args) == 4:
-                result = self.kv_helper.csv_match_pop(
+                result = store.csv_match_pop(
                     args[1], args[2], args[3])
                 # Value found
                 if result is not None:
-                    response = "v\n" + escape(result)
+                    response = ["v", result]
                 # Value not found
                 else:
-                    response = "n"
+                    response = ["n"]
             # Error
             else:
                 logger.error("Invalid args for cmd csv_match_pop")
-                response = "e\nInvalid args for cmd csv_match_pop"
+                response = ["e", "Invalid args for cmd csv_match_pop"]
 
         # Delete from CSV if a match is found
         elif (cmd == "CD"):
             if len(args) == 4:
-                result = self.kv_helper.csv_search_delete(
+                result = store.csv_search_delete(
                     args[1], args[2], args[3])
                 # Value found
                 if result:
-                    response = "t"
+                    response = ["t"]
                 # Value not found
                 else:
-                    response = "f"
+                    response = ["f"]
             # Error
             else:
                 logger.error("Invalid args for cmd csv_search_delete")
-                response = "e\nInvalid args for cmd csv_search_delete"
+                response = ["e", "Invalid args for cmd csv_search_delete"]
+
+        # Push to the tail of a queue
+        elif (cmd == "QA"):
+            if len(args) == 4:
+                result = store.queue_push(args[1], args[2], args[3])
+                # Value added
+                if result:
+                    response = ["t"]
+                # Value already queued or could not be added
+                else:
+                    response = ["f"]
+            # Error
+            else:
+                logger.error("Invalid args for cmd queue_push")
+                response = ["e", "Invalid args for cmd queue_push"]
+
+        # Pop/retrieve from the head of a queue
+        elif (cmd == "QR"):
+            if len(args) == 3:
+                result = store.queue_pop(args[1], args[2])
+                # Value found
+                if result is not None:
+                    response = ["v", result]
+                # Queue empty
+                else:
+                    response = ["n"]
+            # Error
+            else:
+                logger.error("Invalid args for cmd queue_pop")
+                response = ["e", "Invalid args for cmd queue_pop"]
+
+        # Pop/retrieve from the head of a queue, without waiting for a
+        # value unless sent alone in a binary framed request
+        elif (cmd == "QW"):
+            if self.__is_wait(args):
+                result = store.queue_pop(args[1], args[2])
+                # Value found
+                if result is not None:
+                    response = ["v", result]
+                # Queue empty
+                else:
+                    response = ["n"]
+            # Error
+            else:
+                logger.error("Invalid args for cmd queue_wait_pop")
+                response = ["e", "Invalid args for cmd queue_wait_pop"]
+
+        # Pop/retrieve from the head of a queue if a match is found
+        elif (cmd == "QM"):
+            if len(args) == 4:
+                result = store.queue_match_pop(args[1], args[2], args[3])
+                # Value found
+                if result is not None:
+                    response = ["v", result]
+                # Value not found
+                else:
+                    response = ["n"]
+            # Error
+            else:
+                logger.error("Invalid args for cmd queue_match_pop")
+                response = ["e", "Invalid args for cmd queue_match_pop"]
+
+        # Delete a value anywhere in a queue
+        elif (cmd == "QD"):
+            if len(args) == 4:
+                result = store.queue_remove(args[1], args[2], args[3])
+                # Value found
+                if result:
+                    response = ["t"]
+                # Value not found
+                else:
+                    response = ["f"]
+            # Error
+            else:
+                logger.error("Invalid args for cmd queue_remove")
+                response = ["e", "Invalid args for cmd queue_remove"]
+
+        # List values of a queue, optionally up to a limit
+        elif (cmd == "QL"):
+            if (len(args) == 3 or len(args) == 4) and \
+                    (len(args) == 3 or args[3].isdigit()):
+                limit = int(args[3]) if len(args) == 4 else 0
+                response = ["a"] + store.queue_list(args[1], args[2], limit)
+            # Error
+            else:
+                logger.error("Invalid args for cmd queue_list")
+                response = ["e", "Invalid args for cmd queue_list"]
+
+        # List values of a queue with their position, optionally after a
+        # position and up to a limit
+        elif (cmd == "QE"):
+            if 3 <= len(args) <= 5 and \
+                    (len(args) == 3 or args[3].isdigit()) and \
+                    (len(args) < 5 or
+                     all(c in hexdigits for c in args[4])):
+                limit = int(args[3]) if len(args) >= 4 else 0
+                after = args[4] if len(args) == 5 else ""
+                response = ["a"]
+                for position, value in store.queue_entries(
+                        args[1], args[2], limit, after):
+                    response += [position, value]
+            # Error
+            else:
+                logger.error("Invalid args for cmd queue_entries")
+                response = ["e", "Invalid args for cmd queue_entries"]
+
+        # Size of a queue
+        elif (cmd == "QS"):
+            if len(args) == 3:
+                response = ["v", str(store.queue_size(args[1], args[2]))]
+            # Error
+            else:
+                logger.error("Invalid args for cmd queue_size")
+                response = ["e", "Invalid args for cmd queue_size"]
+
+        # Remove all values of a queue
+        elif (cmd == "QC"):
+            if len(args) == 3:
+                result = store.queue_clear(args[1], args[2])
+                # Queue cleared
+                if result:
+                    response = ["t"]
+                # Queue was empty
+                else:
+                    response = ["f"]
+            # Error
+            else:
+                logger.error("Invalid args for cmd queue_clear")
+                response = ["e", "Invalid args for cmd queue_clear"]
+
+        # Claim values from the head of a queue along with the value each
+        # of them is the key of in another table, "" if it has none
+        elif (cmd == "QK"):
+            if len(args) == 7 and args[3].isdigit() and int(args[3]) > 0:
+                claimed = store.queue_claim(args[1], args[2], int(args[3]),
+                                            args[4], args[5], args[6])
+                response = ["a"]
+                for value, claimed_value in claimed:
+                    response.extend([value, claimed_value or ""])
+            # Error
+            else:
+                logger.error("Invalid args for cmd queue_claim")
+                response = ["e", "Invalid args for cmd queue_claim"]
+
+        # Add to an integer counter
+        elif (cmd == "IC"):
+            if len(args) == 4 and args[3].lstrip("-").isdigit():
+                result = store.counter_add(args[1], args[2], int(args[3]))
+                # Counter updated
+                if result is not None:
+                    response = ["v", str(result)]
+                # Key holds no integer
+                else:
+                    logger.error("Invalid counter for cmd counter_add")
+                    response = ["e", "Invalid counter for cmd counter_add"]
+            # Error
+            else:
+                logger.error("Invalid args for cmd counter_add")
+                response = ["e", "Invalid args for cmd counter_add"]
 
         # Error
         else:
             logger.error("Unknown cmd")
-            response = "e\nUnknown cmd"
+            response = ["e", "Unknown cmd"]
         return response
 
     def render_GET(self, request):
@@ -232,10 +640,13 @@ class LMDBRequestHandler(resource.Resource):
         try:
             # Process the message encoding
             encoding = request.getHeader('Content-Type')
-            data = request.content.read().decode('utf-8')
+            data = request.content.read()
 
             if encoding == 'text/plain; charset=utf-8':
-                response = self._process_request(data)
+                response = self._process_request(
+                    data.decode('utf-8')).encode('utf-8')
+            elif encoding == FRAME_CONTENT_TYPE:
+                response = self._process_frames(data, request)
             else:
                 response = 'UNKNOWN_ERROR: unknown message encoding'
                 return response
@@ -248,10 +659,11 @@ class LMDBRequestHandler(resource.Resource):
 
         # Send back the results
         try:
-            logger.info('response[%s]: %s', encoding, response.encode('utf-8'))
+            if encoding == 'text/plain; charset=utf-8':
+                logger.info('response[%s]: %s', encoding, response)
             request.setHeader('content-type', encoding)
             request.setResponseCode(http.OK)
-            return response.encode('utf-8')
+            return response
 
         except Exception:
             logger.exception('unknown exception while processing request %s',
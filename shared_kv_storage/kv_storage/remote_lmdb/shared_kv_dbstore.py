@@ -27,6 +27,8 @@ import logging
 import kv_storage.remote_lmdb.db_store_csv as db_store_csv
 from kv_storage.interface.shared_kv_interface import KvStorage
 from kv_storage.interface.kv_csv_interface import KvCsvStorage
+from kv_storage.interface.kv_queue_interface import KvQueueStorage
+from kv_storage.remote_lmdb.kv_transaction import KvTransaction
 
 logger = logging.getLogger(__name__)
 lookup_flag = False
@@ -34,7 +36,7 @@ lookup_flag = False
 # ---------------------------------------------------------------------------------------------------
 
 
-class KvDBStore(KvStorage, KvCsvStorage):
+class KvDBStore(KvStorage, KvCsvStorage, KvQueueStorage):
     """KvStorage interface maintains information about registries supported by
     the TCS in direct model."""
 
@@ -303,4 +305,226 @@ class KvDBStore(KvStorage, KvCsvStorage):
             logger.debug("Could not search/delete value from csv in database.")
             return False
 
+# ---------------------------------------------------------------------------------------------------
+    def transaction(self):
+        """
+        Function to start a transaction on the database. Writes made
+        through it are applied atomically on commit.
+        Returns:
+           @returns KvTransaction instance bound to this store
+        """
+        return KvTransaction(self)
+
+# ---------------------------------------------------------------------------------------------------
+    def write_batch(self, ops):
+        """
+        Function to apply a batch of sets and removes in a single LMDB
+        write transaction. Either all of them are applied or none is.
+
+        Parameters:
+           @param ops - List of (op, table, key, value) tuples where op is
+                        "S" to set the value or "R" to remove the key.
+                        Removing an absent key is not an error.
+        Returns:
+           @returns True if the batch was committed, False otherwise.
+        """
+        try:
+            self._db_store.db_store_write_batch(
+                [op[0] for op in ops], [op[1] for op in ops],
+                [op[2] for op in ops], [op[3] for op in ops])
+            return True
+        except Exception:
+            logger.error("Could not commit write batch to database.")
+            return False
+
+# ---------------------------------------------------------------------------------------------------
+    def scan(self, table, start, end="", limit=0):
+        """
+        Function to get the key-value pairs of a lmdb table in key order
+        Parameters:
+           @param table - Name of the lmdb table.
+           @param start - First key of the range.
+           @param end - Key ending the range (excluded), "" for no end.
+           @param limit - Maximum number of pairs, 0 for no limit.
+        Returns:
+           @returns list of (key, value) tuples
+        """
+        try:
+            result = self._db_store.db_store_scan(table, start, end, limit)
+        except Exception:
+            logger.debug("Could not scan keys in database.")
+            return []
+        return list(zip(result[0::2], result[1::2]))
+
+# ---------------------------------------------------------------------------------------------------
+    def queue_push(self, table, key, value):
+        """
+        Function to add a value to the tail of a queue.
+
+        Parameters:
+           @param table - Name of the lmdb table holding the queue.
+           @param key - The key of the queue in the table.
+           @param value - The value to be added.
+        Returns:
+           @returns True if added, False if the value is already queued.
+        """
+        transaction = self.transaction()
+        result = transaction.queue_push(table, key, value)
+        return result and transaction.commit()
+
+# ---------------------------------------------------------------------------------------------------
+    def queue_pop(self, table, key):
+        """
+        Function to remove the value at the head of a queue.
+
+        Parameters:
+           @param table - Name of the lmdb table holding the queue.
+           @param key - The key of the queue in the table.
+        Returns:
+           @returns value - Value removed, None if the queue is empty.
+        """
+        transaction = self.transaction()
+        value = transaction.queue_pop(table, key)
+        return value if transaction.commit() else None
+
+# ---------------------------------------------------------------------------------------------------
+    def queue_match_pop(self, table, key, value):
+        """
+        Function to remove the value at the head of a queue if it matches
+        the value passed in.
+
+        Parameters:
+           @param table - Name of the lmdb table holding the queue.
+           @param key - The key of the queue in the table.
+           @param value - Value to be compared against.
+        Returns:
+           @returns value - value if the head of the queue matches.
+                            None, otherwise.
+        """
+        transaction = self.transaction()
+        value = transaction.queue_match_pop(table, key, value)
+        return value if transaction.commit() else None
+
+# ---------------------------------------------------------------------------------------------------
+    def queue_remove(self, table, key, value):
+        """
+        Function to remove a value anywhere in a queue.
+
+        Parameters:
+           @param table - Name of the lmdb table holding the queue.
+           @param key - The key of the queue in the table.
+           @param value - Value to be removed.
+        Returns:
+           @returns True if the value was found, False otherwise.
+        """
+        transaction = self.transaction()
+        result = transaction.queue_remove(table, key, value)
+        return result and transaction.commit()
+
+# ---------------------------------------------------------------------------------------------------
+    def queue_list(self, table, key, limit=0):
+        """
+        Function to get the values of a queue from head to tail.
+
+        Parameters:
+           @param table - Name of the lmdb table holding the queue.
+           @param key - The key of the queue in the table.
+           @param limit - Maximum number of values, 0 for no limit.
+        Returns:
+           @returns list of values, empty if the queue is empty.
+        """
+        return self.transaction().queue_list(table, key, limit)
+
+# ---------------------------------------------------------------------------------------------------
+    def queue_entries(self, table, key, limit=0, after=""):
+        """
+        Function to get the values of a queue with their position, from
+        head to tail.
+
+        Parameters:
+           @param table - Name of the lmdb table holding the queue.
+           @param key - The key of the queue in the table.
+           @param limit - Maximum number of values, 0 for no limit.
+           @param after - Position returned by an earlier call, only the
+                          values queued after it are returned. "" to start
+                          at the head.
+        Returns:
+           @returns list of (position, value) tuples, empty if there are
+                    none.
+        """
+        return self.transaction().queue_entries(table, key, limit, after)
+
+# ---------------------------------------------------------------------------------------------------
+    def queue_size(self, table, key):
+        """
+        Function to get the number of values in a queue.
+
+        Parameters:
+           @param table - Name of the lmdb table holding the queue.
+           @param key - The key of the queue in the table.
+        """
+        return self.transaction().queue_size(table, key)
+
+# ---------------------------------------------------------------------------------------------------
+    def queue_clear(self, table, key):
+        """
+        Function to remove all the values of a queue.
+
+        Parameters:
+           @param table - Name of the lmdb table holding the queue.
+           @param key - The key of the queue in the table.
+        Returns:
+           @returns True if the queue had any value, False otherwise.
+        """
+        transaction = self.transaction()
+        result = transaction.queue_clear(table, key)
+        return result and transaction.commit()
+
+# ---------------------------------------------------------------------------------------------------
+    def queue_claim(self, table, key, count, claim_table, claim_key,
+                    value_table):
+        """
+        Function to remove up to count values from the head of a queue,
+        record them in a comma-separated value and read the value each of
+        them is the key of, in a single transaction.
+
+        Parameters:
+           @param table - Name of the lmdb table holding the queue.
+           @param key - The key of the queue in the table.
+           @param count - Maximum number of values to remove.
+           @param claim_table - Name of the lmdb table to record them in.
+           @param claim_key - Key of the comma-separated value they are
+                              appended to.
+           @param value_table - Name of the lmdb table to read from.
+        Returns:
+           @returns list of (value removed, value read or None) tuples,
+                    empty if the queue is empty or on error.
+        """
+        transaction = self.transaction()
+        claimed = transaction.queue_claim(
+            table, key, count, claim_table, claim_key, value_table)
+        if len(claimed) == 0 or not transaction.commit():
+            return []
+        return claimed
+
+# ---------------------------------------------------------------------------------------------------
+    def counter_add(self, table, key, delta):
+        """
+        Function to add a number to the integer counter held by a key.
+        An absent counter counts as 0.
+
+        Parameters:
+           @param table - Name of the lmdb table.
+           @param key - The key of the counter in the table.
+           @param delta - Number to be added, may be negative.
+        Returns:
+           @returns value - New value of the counter, None if the key
+                            holds no integer or on error.
+        """
+        transaction = self.transaction()
+        count = transaction.counter_add(table, key, delta)
+        if count is None or not transaction.commit():
+            return None
+        return count
+
 # ---------------------------------------------------------------------------------------------------
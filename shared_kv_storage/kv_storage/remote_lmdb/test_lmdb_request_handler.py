@@ -0,0 +1,124 @@
+# Copyright 2020 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+from unittest import mock
+
+from twisted.internet import task
+from twisted.internet.error import ConnectionDone
+from twisted.python.failure import Failure
+from twisted.web.server import NOT_DONE_YET
+from twisted.web.test.requesthelper import DummyRequest
+
+import kv_storage.remote_lmdb.lmdb_request_handler as lmdb_request_handler
+from database.binary_frame import encode_frames, decode_frames
+
+# -----------------------------------------------------------------
+
+
+class FakeKvStore():
+    """
+    In memory stand-in for KvDBStore, enough for the wait commands
+    """
+    def __init__(self):
+        self.values = {}
+        self.queues = {}
+
+    def open(self, path, size):
+        return True
+
+    def close(self):
+        pass
+
+    def get(self, table, key):
+        return self.values.get((table, key))
+
+    def set(self, table, key, value):
+        self.values[(table, key)] = value
+        return True
+
+    def queue_push(self, table, key, value):
+        self.queues.setdefault((table, key), []).append(value)
+        return True
+
+    def queue_pop(self, table, key):
+        queue = self.queues.get((table, key))
+        return queue.pop(0) if queue else None
+
+# -----------------------------------------------------------------
+
+
+class TestLMDBRequestHandlerWait(unittest.TestCase):
+    def setUp(self):
+        self.clock = task.Clock()
+        patches = [
+            mock.patch.object(lmdb_request_handler, "reactor", self.clock),
+            mock.patch.object(lmdb_request_handler, "KvDBStore",
+                              FakeKvStore)]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.handler = lmdb_request_handler.LMDBRequestHandler(
+            {"KvStorage": {"StoragePath": "unused", "StorageSize": "1 MB"}})
+
+    def __wait(self, cmd, table, key, wait_msecs):
+        request = DummyRequest([b""])
+        result = self.handler._process_frames(
+            encode_frames([[cmd, table, key, str(wait_msecs)]]), request)
+        self.assertEqual(result, NOT_DONE_YET, "Request was not held")
+        return request
+
+    def __run(self, *commands):
+        return decode_frames(self.handler._process_frames(
+            encode_frames(list(commands))))
+
+    def test_wait_expires(self):
+        request = self.__wait("GW", "t", "k", 1000)
+        self.clock.advance(1)
+        self.assertEqual(request.finished, 1, "Request not finished")
+        self.assertEqual(decode_frames(b"".join(request.written)), [["n"]])
+
+    def test_wait_woken(self):
+        request = self.__wait("QW", "q", "k", 1000)
+        self.__run(["QA", "q", "k", "v1"])
+        self.assertEqual(decode_frames(b"".join(request.written)),
+                         [["v", "v1"]])
+        self.assertEqual(self.clock.getDelayedCalls(), [],
+                         "Timer of a served request still pending")
+
+    def test_client_disconnects(self):
+        request = self.__wait("QW", "q", "k", 1000)
+        request.processingFailed(Failure(ConnectionDone()))
+        self.assertEqual(self.clock.getDelayedCalls(), [],
+                         "Timer of a gone client still pending")
+        # Neither the timer nor a push respond to the gone client
+        self.clock.advance(2)
+        self.__run(["QA", "q", "k", "v1"])
+        self.assertEqual(request.written, [])
+        self.assertEqual(request.finished, 0)
+        # The value pushed is left for the next client
+        self.assertEqual(self.__run(["QR", "q", "k"]), [["v", "v1"]])
+
+    def test_disconnected_waiter_not_served(self):
+        request = self.__wait("QW", "q", "k", 1000)
+        # Connection lost without the finish notification fired yet
+        request._disconnected = True
+        self.__run(["QA", "q", "k", "v1"])
+        self.assertEqual(request.written, [])
+        self.assertEqual(self.clock.getDelayedCalls(), [])
+        self.assertEqual(self.__run(["QR", "q", "k"]), [["v", "v1"]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -106,6 +106,7 @@ setup(name='kv_storage',
       packages=find_packages(),
       install_requires=[
           'requests',
+          'avalon_common',
       ],
       ext_modules=[
           dbstore_module,